@@ -0,0 +1,48 @@
+from actuator_data import actuators_data
+from modbus_protocol import ModbusProtocol
+
+
+class Actuator(ModbusProtocol):
+    def __init__(self, atuador_id: int = 1, default_port: str = "COM5", **serial_settings):
+        super().__init__(atuador_id, **serial_settings)
+        self.default_port = default_port
+        self.device_id = 1  # Default device ID
+
+    def open_valve(self, actuator_name: str, force: bool = False):
+        """Open the valve completely for the specified actuator."""
+        self.health.check(self.default_port, self.device_id)
+        if actuator_name in actuators_data:
+            return self.sendRequest(
+                port=self.default_port,
+                device_id=self.device_id,
+                function=0x06,
+                address=actuators_data[actuator_name]["address"],
+                data=actuators_data[actuator_name]["data_open"],
+                force=force
+            )
+
+    def close_valve(self, actuator_name: str, force: bool = False):
+        """Close the valve completely for the specified actuator."""
+        self.health.check(self.default_port, self.device_id)
+        if actuator_name in actuators_data:
+            return self.sendRequest(
+                port=self.default_port,
+                device_id=self.device_id,
+                function=0x06,
+                address=actuators_data[actuator_name]["address"],
+                data=actuators_data[actuator_name]["data_close"],
+                force=force
+            )
+
+    def send_custom_request(self, device_id: int, function: int, address: int, data: int,
+                            force: bool = False):
+        """Send a custom request with the provided parameters (repeated writes are skipped unless forced)."""
+        self.health.check(self.default_port, device_id)
+        return self.sendRequest(
+            port=self.default_port,
+            device_id=device_id,
+            function=function,
+            address=address,
+            data=data,
+            force=force
+        )
@@ -3,4 +3,14 @@ actuators_data = {
     "Grey-Q Evolution": {"address": 0x00, "data_open": 0x00, "data_close": 0x00},
     "White-E Evolution": {"address": 0x0B, "data_open": 0x68, "data_close": 0x67},
     "TOP-E Module": {"address": 0x01, "data_open": 0xBB7, "data_close": 0x7CF},
-}
\ No newline at end of file
+}
+
+# Registradores de leitura (função 3) usados pelo poller e pelas tendências.
+# ATENÇÃO: endereços provisórios, ainda não conferidos com os manuais dos fabricantes.
+# Ajustar conforme o mapa de registradores do manual de cada modelo antes de usar em campo.
+actuators_registers = {
+    "Grey-M Multivoltas": {"position": 0x02, "torque": 0x03},
+    "Grey-Q Evolution": {"position": 0x02, "torque": 0x03},
+    "White-E Evolution": {"position": 0x0C, "torque": 0x0D},
+    "TOP-E Module": {"position": 0x02, "torque": 0x03},
+}
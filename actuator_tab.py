@@ -0,0 +1,197 @@
+import flet as ft
+
+from device_health import OFFLINE, ONLINE, SUSPECT, UNKNOWN
+
+_STATUS_STYLE = {
+    UNKNOWN: ("STATUS: Aguardando", ft.Colors.GREY_400),
+    ONLINE: ("STATUS: Conectado", ft.Colors.GREEN_400),
+    SUSPECT: ("STATUS: Instável", ft.Colors.AMBER_400),
+    OFFLINE: ("STATUS: Desconectado", ft.Colors.RED_400),
+}
+
+
+class ActuatorTab:
+    """Controller of one actuator tab: owns its controls and builds them on first use.
+
+    State changes (position, device status) are kept on the controller and applied
+    to the controls only if the tab has been built and the value actually changed,
+    so hidden tabs cost nothing and updates send only the controls that differ.
+    """
+
+    def __init__(self, actuator_name: str, on_open, on_close, on_position, state: str = UNKNOWN):
+        self.actuator_name = actuator_name
+        self.on_open = on_open
+        self.on_close = on_close
+        self.on_position = on_position  # Chamado com (tab, porcentagem)
+        self.position = 0
+        self.state = state  # Estado de saúde atual do dispositivo (desconhecido até a primeira transação)
+        self.content = None
+        self.slider = None
+        self.position_value_text = None
+        self.status_indicator = None
+
+    @property
+    def built(self) -> bool:
+        return self.content is not None
+
+    def build(self) -> ft.Container:
+        """Create the tab's controls (once) and return its content."""
+        if self.content is not None:
+            return self.content
+
+        self.slider = ft.Slider(
+            min=0,
+            max=100,
+            divisions=10,
+            label="{value}%",
+            value=self.position,
+            width=300,
+            on_change=lambda e: self.set_position(int(float(e.data)), update=True)
+        )
+
+        self.position_value_text = ft.Text(
+            value=f"{self.position}%",
+            size=16,
+            weight=ft.FontWeight.BOLD,
+            color=ft.Colors.BLUE
+        )
+
+        # Corrigido: text_align movido para o Text, não para o Container
+        text, color = _STATUS_STYLE[self.state]
+        self.status_indicator = ft.Container(
+            content=ft.Text(text, color=ft.Colors.WHITE, text_align=ft.TextAlign.CENTER),
+            bgcolor=color,
+            border_radius=4,
+            padding=8,
+            width=200
+        )
+
+        # Create controls with improved styling
+        self.content = ft.Container(
+            content=ft.Column([
+                # Header with logo and status
+                ft.Container(
+                    content=ft.Row([
+                        ft.Icon(ft.Icons.DEVICE_HUB, size=36, color=ft.Colors.BLUE),
+                        ft.Column([
+                            ft.Text(f"{self.actuator_name} Controller", size=20, weight=ft.FontWeight.BOLD),
+                            ft.Text(f"Controlador para módulo {self.actuator_name}", size=14, color=ft.Colors.GREY_700)
+                        ]),
+                        self.status_indicator
+                    ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                    padding=10,
+                    bgcolor=ft.Colors.BLUE_50,
+                    border_radius=8,
+                    border=ft.border.all(1, ft.Colors.BLUE_200),
+                ),
+
+                # Divider
+                ft.Divider(height=1, color=ft.Colors.BLUE_100),
+
+                # Main controls section
+                ft.Container(
+                    content=ft.Column([
+                        ft.Text("Controle de Posição da Válvula", size=16, weight=ft.FontWeight.W_500),
+
+                        # Position control with slider
+                        ft.Container(
+                            content=ft.Column([
+                                ft.Row([
+                                    ft.Text("Posição Atual:", size=14),
+                                    self.position_value_text
+                                ]),
+                                ft.Row([
+                                    ft.Icon(ft.Icons.CLOSE, color=ft.Colors.RED),
+                                    self.slider,
+                                    ft.Icon(ft.Icons.CHECK_CIRCLE, color=ft.Colors.GREEN)
+                                ], alignment=ft.MainAxisAlignment.CENTER,
+                                    vertical_alignment=ft.CrossAxisAlignment.CENTER),
+                            ]),
+                            padding=15,
+                            border=ft.border.all(1, ft.Colors.GREY_300),
+                            border_radius=8,
+                            bgcolor=ft.Colors.WHITE,
+                            margin=10
+                        ),
+
+                        # Quick action buttons
+                        ft.Row([
+                            ft.ElevatedButton(
+                                text="Fechar Totalmente",
+                                icon=ft.Icons.CLOSE,
+                                on_click=lambda e: self.on_close(self.actuator_name),
+                                bgcolor=ft.Colors.RED_400,
+                                color=ft.Colors.WHITE,
+                                style=ft.ButtonStyle(
+                                    shape=ft.RoundedRectangleBorder(radius=8)
+                                ),
+                            ),
+                            ft.ElevatedButton(
+                                text="Posição 50%",
+                                icon=ft.Icons.TUNE,
+                                on_click=lambda e: self.on_position(self, 50),
+                                bgcolor=ft.Colors.AMBER_400,
+                                color=ft.Colors.WHITE,
+                                style=ft.ButtonStyle(
+                                    shape=ft.RoundedRectangleBorder(radius=8)
+                                ),
+                            ),
+                            ft.ElevatedButton(
+                                text="Abrir Totalmente",
+                                icon=ft.Icons.CHECK_CIRCLE,
+                                on_click=lambda e: self.on_open(self.actuator_name),
+                                bgcolor=ft.Colors.GREEN_400,
+                                color=ft.Colors.WHITE,
+                                style=ft.ButtonStyle(
+                                    shape=ft.RoundedRectangleBorder(radius=8)
+                                ),
+                            ),
+                        ], alignment=ft.MainAxisAlignment.SPACE_AROUND),
+                    ], spacing=15, horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                    padding=20,
+                ),
+
+                # Status and information section
+                ft.Container(
+                    content=ft.Column([
+                        ft.Text("Informações do Dispositivo", weight=ft.FontWeight.BOLD),
+                        ft.Row([
+                            ft.Text("ID do Dispositivo: 1", size=14),
+                            ft.Text("Endereço: 5", size=14),
+                            ft.Text("Status: Operacional", size=14),
+                        ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                    ]),
+                    padding=10,
+                    border=ft.border.all(1, ft.Colors.GREY_300),
+                    border_radius=8,
+                    bgcolor=ft.Colors.GREY_50,
+                )
+            ], spacing=15, horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+            padding=20,
+            bgcolor=ft.Colors.WHITE,
+        )
+        return self.content
+
+    def set_position(self, percent: int, update: bool = False):
+        """Show a new valve position; returns the changed control (or None)."""
+        if percent == self.position:
+            return None
+        self.position = percent
+        if not self.built:
+            return None
+        self.position_value_text.value = f"{percent}%"
+        if update:
+            self.position_value_text.update()
+        return self.position_value_text
+
+    def set_state(self, state: str):
+        """Show the device health state; returns the changed control (or None)."""
+        if state == self.state:
+            return None
+        self.state = state
+        if not self.built:
+            return None
+        text, color = _STATUS_STYLE[state]
+        self.status_indicator.content.value = text
+        self.status_indicator.bgcolor = color
+        return self.status_indicator
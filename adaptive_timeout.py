@@ -0,0 +1,67 @@
+import threading
+
+
+class AdaptiveTimeouts:
+    """Per-device response timeouts learned from observed round-trip times (RFC 6298 style).
+
+    Each sample is the device's turnaround time: the measured RTT minus the time the
+    request and response take on the wire at the current baudrate. The timeout for a
+    request is the turnaround RTO (srtt + 4 * rttvar, within the configured bounds) plus
+    the wire time of that particular request/response, so long reads at low baudrates
+    are not cut short. Consecutive timeouts double the RTO, up to `max_backoff` times
+    the learned value (the default 4 allows two doublings), which keeps a device that
+    stopped answering from costing a full `max_timeout`.
+    """
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+
+    def __init__(self, min_timeout: float = 0.02, max_timeout: float = 1.0,
+                 initial_timeout: float = 1.0, max_backoff: int = 4):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.initial_timeout = initial_timeout
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._estimates = {}  # (port, device) -> [srtt, rttvar, multiplicador do RTO: 1, 2, 4... até max_backoff]
+
+    def timeout(self, port, device_id, wire_time: float = 0.0) -> float:
+        """Timeout (s) for the next request to a device, given its wire time."""
+        estimate = self._estimates.get((port, device_id))
+        if estimate is None:
+            return self.initial_timeout + wire_time
+        srtt, rttvar, backoff = estimate
+        rto = min(max(srtt + 4 * rttvar, self.min_timeout), self.max_timeout)
+        return min(rto * backoff, self.max_timeout) + wire_time
+
+    def observe(self, port, device_id, turnaround: float) -> None:
+        """Record a successful exchange's turnaround time (s)."""
+        turnaround = max(turnaround, 0.0)
+        with self._lock:
+            estimate = self._estimates.get((port, device_id))
+            if estimate is None:
+                self._estimates[(port, device_id)] = [turnaround, turnaround / 2, 1]
+                return
+            srtt, rttvar, _ = estimate
+            rttvar = (1 - self.BETA) * rttvar + self.BETA * abs(srtt - turnaround)
+            srtt = (1 - self.ALPHA) * srtt + self.ALPHA * turnaround
+            self._estimates[(port, device_id)] = [srtt, rttvar, 1]
+
+    def observe_timeout(self, port, device_id) -> None:
+        with self._lock:
+            estimate = self._estimates.get((port, device_id))
+            if estimate is not None:
+                estimate[2] = min(estimate[2] * 2, self.max_backoff)
+
+    def reset(self, port=None, device_id=None) -> None:
+        with self._lock:
+            if port is None:
+                self._estimates.clear()
+            else:
+                self._estimates.pop((port, device_id), None)
+
+    def snapshot(self) -> dict:
+        """{(port, device): (srtt, rttvar, current timeout without wire time)} in seconds."""
+        with self._lock:
+            keys = list(self._estimates)
+        return {key: (*self._estimates[key][:2], self.timeout(*key)) for key in keys if key in self._estimates}
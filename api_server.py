@@ -0,0 +1,507 @@
+"""API HTTP/WebSocket local (somente biblioteca padrão).
+
+    GET  /api/devices                       dispositivos e estado de saúde
+    POST /api/devices/<nome>/open|close     comando de válvula ({"force": true} opcional)
+    GET  /api/read?device=V-101&register=position   ou ?port=COM5&slave=1&address=2&count=2
+    POST /api/write                         {"device": "V-101", "address": 5, "value": 100}
+    POST /api/batch                         {"operations": [...], "max_age": 0.1}
+    GET  /api/stream                        WebSocket: valores e estados atuais, depois as mudanças
+
+Cada operação de um lote é um objeto com "op" ("read", "write", "open" ou "close")
+e o destino ("device" do registro, ou "port" e "slave"):
+
+    {"op": "read", "device": "V-101", "register": "position"}
+    {"op": "read", "port": "COM5", "slave": 3, "address": 2, "count": 2, "function": 4}
+    {"op": "write", "device": "V-102", "address": 5, "value": 100, "force": true}
+    {"op": "close", "device": "V-103"}
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from actuator_data import actuators_data, actuators_registers
+from modbus_frames import check_crc, decode_register_values, exception_code, exception_name
+from modbus_logging import get_logger
+from poller import PollTag, merge_tags
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+_MAX_BODY = 1 << 20
+_MAX_OPERATIONS = 1000
+_MAX_CLIENT_BUFFER = 1 << 20  # Bytes pendentes para um cliente do fluxo antes de desconectá-lo
+_COMMANDS = {"open": "data_open", "close": "data_close"}
+
+
+class ApiError(Exception):
+    """A request the API rejects before sending anything to the devices."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class _Operation:
+    __slots__ = ("index", "kind", "port", "slave", "function", "address", "value", "force")
+
+    def __init__(self, index, kind, port, slave, function, address, value, force=False):
+        self.index = index
+        self.kind = kind
+        self.port = port
+        self.slave = slave
+        self.function = function
+        self.address = address
+        self.value = value  # Quantidade nas leituras
+        self.force = force
+
+
+def _int(spec: dict, key: str, where: str, default=None) -> int:
+    value = spec.get(key, default)
+    if isinstance(value, bool) or value is None:
+        raise ApiError(f"{where}: \"{key}\" é obrigatório e deve ser inteiro")
+    try:
+        return int(value, 0) if isinstance(value, str) else int(value)
+    except (TypeError, ValueError):
+        raise ApiError(f"{where}: \"{key}\" deve ser inteiro, não {value!r}") from None
+
+
+def _address(spec: dict, where: str) -> int:
+    # O frame só leva 16 bits: fora da faixa o endereço seria truncado para outro registrador
+    address = _int(spec, "address", where)
+    if not 0 <= address <= 0xFFFF:
+        raise ApiError(f"{where}: endereço {address} fora da faixa 0-65535")
+    return address
+
+
+class ApiServer:
+    """HTTP API and WebSocket stream over a ModbusProtocol, served by asyncio in a background thread.
+
+    Batches are validated as a whole, then split by port: each bus runs its
+    operations in list order on its own thread, so buses work in parallel.
+    Consecutive reads of a bus are merged into block reads (merge_tags) and go
+    through the protocol's read cache, so reads already fresh cost nothing.
+
+    publish()/publish_state() are meant as Poller/DeviceHealth callbacks: changed
+    values are collected and pushed to every WebSocket client once per event-loop
+    pass, in a single message. `on_watch(active)` is called when the first stream
+    client connects and after the last one leaves, to start and stop polling.
+    """
+
+    def __init__(self, protocol, registry=None, host: str = "127.0.0.1", port: int = 8080, default_port=None,
+                 on_watch=None):
+        self.protocol = protocol
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.default_port = default_port or getattr(protocol, "default_port", None)
+        self.on_watch = on_watch
+
+        self.values = {}  # tag -> último valor publicado
+        self._changes = {}
+        self._changes_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._clients = set()  # Conexões WebSocket do fluxo
+        self._connections = set()
+        self._bus_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="api-bus")
+        self._server = None
+        self._loop = None
+        self._stopping = None
+        self._started = threading.Event()
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.sockets[0].getsockname()[:2] if self._server else (self.host, self.port)
+
+    @property
+    def stream_clients(self) -> int:
+        return len(self._clients)
+
+    # Ciclo de vida (mesmo modelo do ModbusGateway)
+
+    async def serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        get_logger().info("API HTTP em http://%s:%d/api", *self.address)
+        self._started.set()
+        try:
+            await self._stopping.wait()
+        finally:
+            self._server.close()
+            await _close_connections(self._connections)
+            await self._server.wait_closed()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=asyncio.run, args=(self.serve(),), name="api-http", daemon=True)
+        self._thread.start()
+        while not self._started.wait(0.1):
+            if not self._thread.is_alive():
+                raise OSError(f"Não foi possível iniciar a API em {self.host}:{self.port}")
+
+    def stop(self) -> None:
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread is not None:
+            self._thread.join()
+        self._bus_executor.shutdown(wait=False)
+
+    # Lotes
+
+    def _target(self, spec: dict, where: str):
+        """(port, slave, device or None) of an operation."""
+        if "device" in spec:
+            device = self.registry.devices.get(spec["device"]) if self.registry else None
+            if device is None:
+                raise ApiError(f"{where}: dispositivo desconhecido {spec['device']!r}", 404)
+            return device.port, device.slave_id, device
+        port = spec.get("port", self.default_port)
+        if not port:
+            raise ApiError(f"{where}: informe \"device\" ou \"port\" e \"slave\"")
+        slave = _int(spec, "slave", where)
+        if not 1 <= slave <= 247:
+            raise ApiError(f"{where}: escravo {slave} fora da faixa 1-247")
+        return port, slave, None
+
+    def parse_operation(self, index: int, spec) -> _Operation:
+        where = f"operations[{index}]"
+        if not isinstance(spec, dict):
+            raise ApiError(f"{where}: operação deve ser um objeto")
+        kind = spec.get("op")
+        port, slave, device = self._target(spec, where)
+
+        if kind == "read":
+            function = _int(spec, "function", where, 3)
+            if function not in (3, 4):
+                raise ApiError(f"{where}: leitura só pelas funções 3 e 4")
+            if "register" in spec:
+                registers = actuators_registers.get(device.model, {}) if device else {}
+                if spec["register"] not in registers:
+                    raise ApiError(f"{where}: registrador desconhecido {spec['register']!r}")
+                address = registers[spec["register"]]
+            else:
+                address = _address(spec, where)
+            count = _int(spec, "count", where, 1)
+            if not 1 <= count <= 125:
+                raise ApiError(f"{where}: quantidade {count} fora da faixa 1-125")
+            if address + count > 0x10000:
+                raise ApiError(f"{where}: {count} registradores a partir de {address} ultrapassam o endereço 65535")
+            return _Operation(index, kind, port, slave, function, address, count)
+
+        if kind == "write":
+            function = _int(spec, "function", where, 6)
+            if function not in (5, 6):
+                raise ApiError(f"{where}: escrita só pelas funções 5 e 6")
+            address = _address(spec, where)
+            value = _int(spec, "value", where)
+            if not 0 <= value <= 0xFFFF:
+                raise ApiError(f"{where}: valor {value} fora da faixa 0-65535")
+            if function == 5 and value not in (0x0000, 0xFF00):
+                raise ApiError(f"{where}: função 5 aceita apenas 0x0000 ou 0xFF00, não {value:#06x}")
+            return _Operation(index, kind, port, slave, function, address, value, bool(spec.get("force", False)))
+
+        if kind in _COMMANDS:
+            if device is None or device.model not in actuators_data:
+                raise ApiError(f"{where}: \"{kind}\" requer um \"device\" de modelo conhecido")
+            model = actuators_data[device.model]
+            return _Operation(index, "write", port, slave, 6, model["address"], model[_COMMANDS[kind]],
+                              bool(spec.get("force", False)))
+        raise ApiError(f"{where}: \"op\" deve ser read, write, open ou close")
+
+    def execute(self, specs, max_age: float = None) -> list:
+        """Validate and run a list of operations; returns one result dict per operation, in order."""
+        if not isinstance(specs, list):
+            raise ApiError("\"operations\" deve ser uma lista")
+        if len(specs) > _MAX_OPERATIONS:
+            raise ApiError(f"Lote com mais de {_MAX_OPERATIONS} operações", 413)
+        operations = [self.parse_operation(index, spec) for index, spec in enumerate(specs)]
+
+        by_port = {}
+        for operation in operations:
+            by_port.setdefault(operation.port, []).append(operation)
+        results = [None] * len(operations)
+        # Um barramento por thread; as operações de uma porta mantêm a ordem do lote
+        futures = [self._bus_executor.submit(self._run_port, port_operations, max_age, results)
+                   for port_operations in by_port.values()]
+        for future in futures:
+            future.result()
+        return results
+
+    def _run_port(self, operations, max_age, results) -> None:
+        reads = []
+        for operation in operations:
+            if operation.kind == "read":
+                reads.append(operation)
+                continue
+            self._run_reads(reads, max_age, results)
+            reads = []
+            results[operation.index] = self._write(operation)
+        self._run_reads(reads, max_age, results)
+
+    def _run_reads(self, reads, max_age, results) -> None:
+        tags = [PollTag(str(operation.index), operation.port, operation.slave, operation.address, operation.value,
+                        operation.function) for operation in reads]
+        for block, members in merge_tags(tags):
+            response = self.protocol.read_response(block.port, block.device_id, block.address, block.count,
+                                                   block.function, max_age)
+            error = self._error(response)
+            values = [] if error else decode_register_values(response)
+            for tag, offset in members:
+                if error:
+                    results[int(tag.name)] = {"ok": False, "error": error}
+                else:
+                    results[int(tag.name)] = {"ok": True, "values": values[offset:offset + tag.count]}
+
+    def _write(self, operation: _Operation) -> dict:
+        response = self.protocol.exchange(operation.port, operation.slave, operation.function, operation.address,
+                                          operation.value, force=operation.force)
+        error = self._error(response)
+        return {"ok": False, "error": error} if error else {"ok": True}
+
+    def _error(self, response):
+        if not response:
+            return "sem resposta do dispositivo"
+        if not check_crc(response):
+            return "CRC inválido na resposta"
+        code = exception_code(response)
+        if code is not None:
+            return f"exceção Modbus {code:#04x}: {exception_name(code)}"
+        return None
+
+    # Fluxo de valores
+
+    def publish(self, tag, values, timestamp: float) -> None:
+        """Poller callback (any thread): queue the value for the stream clients if it changed."""
+        name = tag.name if hasattr(tag, "name") else tag
+        value = values[0] if len(values) == 1 else list(values)
+        with self._changes_lock:
+            if self.values.get(name) == value:
+                return
+            self.values[name] = value
+            self._changes[name] = {"type": "sample", "tag": name, "value": value, "ts": timestamp}
+            schedule = not self._flush_scheduled and self._loop is not None and bool(self._clients)
+            self._flush_scheduled |= schedule
+        if schedule:
+            self._loop.call_soon_threadsafe(self._flush)
+
+    def publish_state(self, port, device_id, state: str) -> None:
+        """DeviceHealth.on_change callback."""
+        with self._changes_lock:
+            self._changes[(port, device_id)] = {"type": "state", "port": port, "slave": device_id, "state": state}
+            schedule = not self._flush_scheduled and self._loop is not None and bool(self._clients)
+            self._flush_scheduled |= schedule
+        if schedule:
+            self._loop.call_soon_threadsafe(self._flush)
+
+    def _flush(self) -> None:
+        with self._changes_lock:
+            changes, self._changes = list(self._changes.values()), {}
+            self._flush_scheduled = False
+        if not changes:
+            return
+        frame = _ws_frame(json.dumps({"type": "changes", "changes": changes}).encode("utf-8"))
+        for writer in list(self._clients):
+            if writer.transport.get_write_buffer_size() > _MAX_CLIENT_BUFFER:
+                # Cliente parado: descarta em vez de acumular mensagens na memória sem limite
+                get_logger().warning("API: cliente do fluxo não acompanha as mudanças; conexão encerrada")
+                self._clients.discard(writer)
+                writer.transport.abort()
+                continue
+            writer.write(frame)
+
+    # HTTP
+
+    async def _handle_connection(self, reader, writer) -> None:
+        self._connections.add(writer)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 413, {"error": "cabeçalho muito grande"}, close=True)
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, {"error": "Content-Length inválido"}, close=True)
+                    return
+                if length > _MAX_BODY:
+                    await self._respond(writer, 413, {"error": "corpo muito grande"}, close=True)
+                    return
+                body = await reader.readexactly(length) if length else b""
+
+                url = urlsplit(target)
+                if url.path == "/api/stream" and headers.get("upgrade", "").lower() == "websocket":
+                    await self._stream(reader, writer, headers)
+                    return
+                try:
+                    status, payload = 200, await self._route(method, url.path, dict(parse_qsl(url.query)), body)
+                except ApiError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    get_logger().exception("Erro na API")
+                    status, payload = 500, {"error": str(e)}
+                # HTTP/1.1 mantém a conexão salvo "close"; HTTP/1.0 só com "keep-alive" explícito
+                connection = headers.get("connection", "").lower()
+                if version.strip().upper() == "HTTP/1.0":
+                    keep_alive = connection == "keep-alive"
+                else:
+                    keep_alive = connection != "close"
+                await self._respond(writer, status, payload, close=not keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _respond(self, writer, status: int, payload, close: bool = False) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {_STATUS.get(status, '')}\r\n"
+                     f"Content-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(body)}\r\n"
+                     f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    async def _route(self, method: str, path: str, query: dict, body: bytes):
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if parts[:1] != ["api"]:
+            raise ApiError("Recurso não encontrado", 404)
+        parts = parts[1:]
+
+        if parts == ["devices"] and method == "GET":
+            return self._devices()
+        if len(parts) == 3 and parts[0] == "devices" and parts[2] in _COMMANDS and method == "POST":
+            options = self._json(body) if body else {}
+            return (await self._execute([{**options, "op": parts[2], "device": parts[1]}]))[0]
+        if parts == ["read"] and method == "GET":
+            return (await self._execute([{**query, "op": "read"}], query.get("max_age")))[0]
+        if parts == ["write"] and method == "POST":
+            return (await self._execute([{**self._json(body), "op": "write"}]))[0]
+        if parts == ["batch"] and method == "POST":
+            request = self._json(body)
+            return {"results": await self._execute(request.get("operations"), request.get("max_age"))}
+        if parts and parts[0] in ("devices", "read", "write", "batch"):
+            raise ApiError(f"Método {method} não permitido em {path}", 405)
+        raise ApiError("Recurso não encontrado", 404)
+
+    async def _execute(self, specs, max_age=None) -> list:
+        if max_age is not None:
+            try:
+                max_age = float(max_age)
+            except (TypeError, ValueError):
+                raise ApiError(f"max_age inválido: {max_age!r}") from None
+            if math.isnan(max_age) or max_age < 0:
+                raise ApiError(f"max_age deve ser um número não negativo, não {max_age!r}")
+        started = time.perf_counter()
+        # Operações bloqueiam nas portas seriais: rodam fora do loop para não atrasar os demais clientes
+        results = await asyncio.get_running_loop().run_in_executor(None, self.execute, specs, max_age)
+        get_logger().debug("API: %d operações em %.1f ms", len(results), (time.perf_counter() - started) * 1000)
+        return results
+
+    def _json(self, body: bytes) -> dict:
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError as e:
+            raise ApiError(f"JSON inválido: {e}") from None
+        if not isinstance(data, dict):
+            raise ApiError("O corpo deve ser um objeto JSON")
+        return data
+
+    def _devices(self) -> dict:
+        states = self.protocol.health.states()
+        devices = self.registry.devices.values() if self.registry else ()
+        return {"devices": [{"name": device.name, "port": device.port, "slave": device.slave_id,
+                             "model": device.model, "state": states.get((device.port, device.slave_id))}
+                            for device in devices]}
+
+    # WebSocket (RFC 6455, somente mensagens de texto)
+
+    async def _stream(self, reader, writer, headers: dict) -> None:
+        key = headers.get("sec-websocket-key", "")
+        accept = base64.b64encode(hashlib.sha1((key + _WS_GUID).encode("ascii")).digest()).decode("ascii")
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("latin-1"))
+        with self._changes_lock:
+            snapshot = dict(self.values)
+        states = [{"port": port, "slave": slave, "state": state}
+                  for (port, slave), state in self.protocol.health.states().items()]
+        writer.write(_ws_frame(json.dumps({"type": "snapshot", "values": snapshot, "states": states})
+                               .encode("utf-8")))
+        await writer.drain()
+
+        self._clients.add(writer)
+        if len(self._clients) == 1 and self.on_watch:
+            await asyncio.get_running_loop().run_in_executor(None, self.on_watch, True)
+        try:
+            while True:
+                opcode, payload = await _ws_read(reader)
+                if opcode == 0x8:
+                    writer.write(_ws_frame(payload[:2], 0x8))
+                    break
+                if opcode == 0x9:
+                    writer.write(_ws_frame(payload, 0xA))
+                # Mensagens do cliente são ignoradas: o fluxo envia todas as mudanças
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            if not self._clients and self.on_watch:
+                await asyncio.get_running_loop().run_in_executor(None, self.on_watch, False)
+
+
+async def _close_connections(writers, timeout: float = 1.0) -> None:
+    """Close the open connections and give their handlers time to finish (they see end of stream)."""
+    for writer in list(writers):
+        writer.close()
+    deadline = time.monotonic() + timeout
+    while writers and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+
+def _ws_frame(payload: bytes, opcode: int = 0x1) -> bytes:
+    """Unmasked (server-to-client) WebSocket frame."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack(">BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def _ws_read(reader):
+    """(opcode, payload) of the next client frame (fragments are not reassembled)."""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack(">H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", await reader.readexactly(8))[0]
+    if length > _MAX_BODY:
+        raise ConnectionError("Mensagem WebSocket muito grande")
+    mask = await reader.readexactly(4) if second & 0x80 else b"\0\0\0\0"
+    payload = await reader.readexactly(length)
+    return first & 0x0F, bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
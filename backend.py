@@ -0,0 +1,312 @@
+import atexit
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from actuator import Actuator
+from actuator_data import actuators_registers
+from bus_sniffer import BusSniffer
+from cloud_sync import ChunkedLogWriter, LocalDirectoryRemote, SyncEngine
+from data_export import TransactionRecorder
+from device_table import DeviceTableModel
+from devices import Device, DeviceRegistry
+from metrics import BusMetrics, MetricsServer
+from modbus_logging import get_logger
+from poller import Poller, PollTag
+from traffic_capture import CaptureWriter
+
+
+class Backend:
+    """Everything that talks to the buses, shared by every UI session of the process.
+
+    There is one Actuator, one Poller and one command queue per serial port no
+    matter how many browsers are connected: sessions subscribe to the samples
+    and health changes they display, and ask for polling instead of running
+    their own. Bus load therefore does not grow with the number of operators.
+    The cloud sync engine and the bus monitor are also one per process, since
+    they share the chunk directory, the sync checkpoint and the monitored port.
+    """
+
+    def __init__(self):
+        self.actuator = Actuator()
+        self.recorder = TransactionRecorder()
+        self.actuator.add_transaction_listener(self.recorder)
+        self.chunk_writer = ChunkedLogWriter()
+        self.actuator.add_transaction_listener(self.chunk_writer)
+        self.capture_writer = CaptureWriter()
+        self.actuator.add_transaction_listener(self.capture_writer)
+        self.metrics = BusMetrics(self.actuator)
+        self.actuator.add_transaction_listener(self.metrics)
+        self.actuator.on_retry = self.metrics.count_retry
+        self.metrics_server = None
+        self.api_server = None
+        self.process_image = None
+        self.sync_engine = None
+        self.sniffer = None
+
+        self._lock = threading.Lock()
+        self._services_lock = threading.Lock()  # Início e parada do sincronizador e do monitor
+        self._sample_listeners = []
+        self._state_listeners = []
+        self._sync_listeners = []
+        self._frame_listeners = []
+        self._sniffer_error_listeners = []
+        self._polling_sessions = set()
+        self._sessions = set()
+        self._queues = {}  # port -> executor de uma thread (fila de comandos da porta)
+
+        self.load_devices()
+        self.actuator.health.on_change = self._dispatch_state
+        self.create_poller()
+        self.start_metrics_server()
+        self.start_api_server()
+        self.start_process_image()
+        atexit.register(self.close)
+
+    def load_devices(self) -> None:
+        """Devices shown in the dashboard: MODBUS_DEVICES (JSON, see DeviceRegistry) or the default device."""
+        path = os.environ.get("MODBUS_DEVICES")
+        self.devices = None
+        if path:
+            try:
+                self.devices = DeviceRegistry.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                get_logger().error("Não foi possível carregar os dispositivos de %s: %s", path, e)
+        if self.devices is None:
+            self.devices = DeviceRegistry([Device("Atuador 1", self.actuator.default_port,
+                                                  self.actuator.device_id, "TOP-E Module")])
+        self.device_table = DeviceTableModel(self.devices.devices.values(), self.actuator.health)
+
+    def create_poller(self) -> None:
+        """Create the poller that feeds the trend charts and the dashboard (started on demand).
+
+        The trend charts show the device at the default port and slave id, so only the
+        register map of the model registered there is polled (see trend_models).
+        """
+        default_address = (self.actuator.default_port, self.actuator.device_id)
+        self.trend_models = sorted({device.model for device in self.devices.devices.values()
+                                    if (device.port, device.slave_id) == default_address
+                                    and device.model in actuators_registers})
+        tags = [
+            PollTag(f"{model}/{quantity}", self.actuator.default_port, self.actuator.device_id, address)
+            for model in self.trend_models
+            for quantity, address in actuators_registers[model].items()
+        ]
+        # Posição e torque de cada dispositivo do painel
+        tags += [
+            PollTag(f"{device.name}/{quantity}", device.port, device.slave_id, address)
+            for device in self.devices.devices.values()
+            for quantity, address in actuators_registers.get(device.model, {}).items()
+        ]
+        self.tags = tags
+        self.poller = Poller(self.actuator, tags, interval=0.1, on_sample=self._dispatch_sample,
+                             on_scan=self._dispatch_scan)
+
+    def start_metrics_server(self) -> None:
+        """Serve /metrics (Prometheus) when MODBUS_METRICS_PORT is set."""
+        self.metrics.add_gauge(
+            "modbus_scan_cycle_seconds", "Duração do último ciclo de leitura do poller.",
+            lambda: {(("port", port),): round(duration, 6)
+                     for port, duration in list(self.poller.last_scan_duration.items())})
+        self.metrics.add_gauge(
+            "modbus_read_cache_requests", "Leituras atendidas pelo cache (hit), pela rede (miss) ou "
+                                          "compartilhadas com uma leitura em andamento (coalesced).",
+            lambda: {(("result", result),): self.actuator.read_cache.stats()[result]
+                     for result in ("hit", "miss", "coalesced")})
+        self.metrics.add_gauge(
+            "modbus_suppressed_writes", "Escritas não enviadas por repetirem um valor já confirmado.",
+            lambda: {(): self.actuator.writes.suppressed})
+        self.metrics.add_gauge(
+            "modbus_ui_sessions", "Sessões conectadas ao backend (interfaces e API).",
+            lambda: {(): len(self._sessions)})
+
+        metrics_port = os.environ.get("MODBUS_METRICS_PORT")
+        if not metrics_port:
+            return
+        try:
+            self.metrics_server = MetricsServer(self.metrics, os.environ.get("MODBUS_METRICS_HOST", "127.0.0.1"),
+                                                int(metrics_port))
+            self.metrics_server.start()
+        except (OSError, ValueError) as e:
+            get_logger().error("Não foi possível iniciar o endpoint de métricas: %s", e)
+
+    def start_api_server(self) -> None:
+        """Serve the HTTP/WebSocket API (api_server.py) when MODBUS_API_PORT is set."""
+        api_port = os.environ.get("MODBUS_API_PORT")
+        if not api_port:
+            return
+        from api_server import ApiServer
+        try:
+            self.api_server = ApiServer(self.actuator, self.devices, os.environ.get("MODBUS_API_HOST", "127.0.0.1"),
+                                        int(api_port))
+            # Clientes do fluxo contam como uma sessão que pede leitura contínua
+            self.api_server.on_watch = lambda active: self.set_polling(self.api_server, active)
+            self.subscribe(self.api_server, on_sample=self.api_server.publish, on_state=self.api_server.publish_state)
+            self.api_server.start()
+        except (OSError, ValueError) as e:
+            get_logger().error("Não foi possível iniciar a API: %s", e)
+
+    def start_process_image(self) -> None:
+        """Publish every polled tag to shared memory (process_image.py) when MODBUS_PROCESS_IMAGE is set."""
+        name = os.environ.get("MODBUS_PROCESS_IMAGE")
+        if not name:
+            return
+        from process_image import ProcessImageWriter
+        try:
+            self.process_image = ProcessImageWriter(name, self.tags)
+        except (OSError, ValueError) as e:
+            get_logger().error("Não foi possível criar a imagem de processo %s: %s", name, e)
+            return
+        atexit.register(self.process_image.close)
+        self.subscribe(self.process_image, on_sample=self.process_image.update)
+        self.set_polling(self.process_image, True)  # Outros processos dependem da leitura contínua
+
+    # Sessões
+
+    def subscribe(self, session, on_sample=None, on_state=None, on_sync_status=None, on_frames=None,
+                  on_sniffer_error=None) -> None:
+        """Register a UI session; callbacks are called from the poller/I-O threads.
+
+        `on_state` is called right away with the current state of every device
+        seen so far, so a session that connects late does not show stale status.
+        """
+        with self._lock:
+            self._sessions.add(session)
+            for name, listener in self._listener_lists(on_sample, on_state, on_sync_status, on_frames,
+                                                       on_sniffer_error):
+                if listener is not None:
+                    # Lista nova a cada mudança: as threads de E/S percorrem a anterior sem lock
+                    setattr(self, name, getattr(self, name) + [listener])
+        if on_state is not None:
+            for (port, device_id), state in self.actuator.health.states().items():
+                on_state(port, device_id, state)
+
+    def unsubscribe(self, session, on_sample=None, on_state=None, on_sync_status=None, on_frames=None,
+                    on_sniffer_error=None) -> None:
+        self.set_polling(session, False)
+        with self._lock:
+            self._sessions.discard(session)
+            for name, listener in self._listener_lists(on_sample, on_state, on_sync_status, on_frames,
+                                                       on_sniffer_error):
+                setattr(self, name, [other for other in getattr(self, name) if other != listener])
+            monitored = bool(self._frame_listeners)
+        if not monitored:
+            self.stop_sniffer()  # Ninguém mais exibe o monitor
+
+    @staticmethod
+    def _listener_lists(on_sample, on_state, on_sync_status, on_frames, on_sniffer_error):
+        return (("_sample_listeners", on_sample), ("_state_listeners", on_state),
+                ("_sync_listeners", on_sync_status), ("_frame_listeners", on_frames),
+                ("_sniffer_error_listeners", on_sniffer_error))
+
+    def close(self) -> None:
+        """Stop the background services (poller, monitor, cloud sync) and close the log writers at process exit."""
+        with self._lock:
+            self._polling_sessions.clear()
+            if self.poller.running:
+                self.poller.stop()
+        self.recorder.flush()
+        self.stop_sniffer()
+        with self._services_lock:
+            engine, self.sync_engine = self.sync_engine, None
+        if engine is not None:
+            engine.stop()
+        # Fecha o chunk e o arquivo de captura abertos (o chunk fica pronto para a próxima sincronização)
+        for writer in (self.chunk_writer, self.capture_writer):
+            self.actuator.remove_transaction_listener(writer)
+            writer.close()
+
+    def set_polling(self, session, enabled: bool) -> None:
+        """The shared poller runs while at least one session asks for it."""
+        with self._lock:
+            if enabled:
+                self._polling_sessions.add(session)
+            else:
+                self._polling_sessions.discard(session)
+            if self._polling_sessions:
+                self.poller.start()
+            elif self.poller.running:
+                self.poller.stop()
+
+    def _dispatch_sample(self, tag, values, timestamp: float) -> None:
+        name, quantity = tag.name.rsplit("/", 1)
+        self.device_table.set_reading(name, quantity, values[0], timestamp)
+        for listener in self._sample_listeners:  # Lista substituída (não alterada) ao (des)inscrever
+            listener(tag, values, timestamp)
+
+    def _dispatch_scan(self, port) -> None:
+        if self.process_image is not None:
+            self.process_image.publish()
+
+    def _dispatch_state(self, port, device_id, state: str) -> None:
+        self.device_table.set_state(port, device_id, state)
+        for listener in self._state_listeners:
+            listener(port, device_id, state)
+
+    # Sincronização e monitor
+
+    def sync(self, folder: str) -> None:
+        """Start syncing to `folder` (replacing the engine of another folder) or sync now if already running."""
+        with self._services_lock:
+            engine = self.sync_engine
+            if engine is not None and engine.remote.path == folder:
+                engine.sync_now()
+                return
+            if engine is not None:
+                engine.stop()  # Antes de criar o novo: os dois usariam o mesmo checkpoint
+            self.sync_engine = SyncEngine(LocalDirectoryRemote(folder), on_status=self._dispatch_sync_status)
+            self.sync_engine.start()
+
+    def start_sniffer(self, port: str, baudrate: int) -> BusSniffer:
+        """Start the listen-only monitor (shared by every session; returns the running one if any)."""
+        with self._services_lock:
+            if self.sniffer is None:
+                self.sniffer = BusSniffer(port, baudrate=baudrate, capture=self.capture_writer,
+                                          on_frames=self._dispatch_frames, on_error=self._dispatch_sniffer_error)
+                self.sniffer.start()
+            return self.sniffer
+
+    def stop_sniffer(self) -> None:
+        with self._services_lock:
+            sniffer, self.sniffer = self.sniffer, None
+            if sniffer is not None:
+                sniffer.stop()
+
+    def _dispatch_sync_status(self, message: str) -> None:
+        for listener in self._sync_listeners:
+            listener(message)
+
+    def _dispatch_frames(self, frames) -> None:
+        for listener in self._frame_listeners:
+            listener(frames)
+
+    def _dispatch_sniffer_error(self, error: Exception) -> None:
+        for listener in self._sniffer_error_listeners:
+            listener(error)
+
+    # Comandos
+
+    def run_command(self, port, command, /, *args, **kwargs):
+        """Run `command(*args, **kwargs)` on the port's command queue and return its result.
+
+        Commands of all sessions for one bus execute in arrival order, one at a time;
+        exceptions (e.g. DeviceOfflineError) are re-raised in the caller.
+        """
+        with self._lock:
+            queue = self._queues.get(port)
+            if queue is None:
+                queue = self._queues[port] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"cmd-{port}")
+        return queue.submit(command, *args, **kwargs).result()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> Backend:
+    """The process-wide Backend, created on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = Backend()
+        return _backend
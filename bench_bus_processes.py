@@ -0,0 +1,119 @@
+"""Benchmark: amostras por segundo com Poller (threads) e ProcessPoller (um processo por barramento).
+
+    python bench_bus_processes.py --buses 1 2 4 --duration 5
+    python bench_bus_processes.py --buses 4 --main-load   # simula UI/log ocupando o processo principal
+
+Cada barramento é um pseudo-terminal com escravos emulados (FakeSlave) num processo
+próprio, sem atraso de linha: o limite medido é a CPU do mestre, não a taxa serial.
+Só funciona onde há pty (Linux/macOS).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+from modbus_frames import crc16
+from modbus_protocol import ModbusProtocol
+from poller import Poller, PollTag
+
+
+def _serve_slaves(master_fd: int, slave_count: int) -> None:
+    from fake_slave import FakeSlave
+
+    slave = FakeSlave(slave_ids=range(1, slave_count + 1), registers={2: 500, 3: 20})
+    buffer = b""
+    while True:
+        try:
+            buffer += os.read(master_fd, 4096)
+        except OSError:
+            return
+        while len(buffer) >= 8:  # O benchmark só envia leituras (frames de 8 bytes)
+            response = slave.handle(buffer[:8])
+            buffer = buffer[8:]
+            if response:
+                os.write(master_fd, response)
+
+
+def _open_bus(slave_count: int):
+    import pty
+    import tty
+
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(master_fd)
+    tty.setraw(slave_fd)
+    # fork: o processo do escravo herda o descritor do pty
+    process = multiprocessing.get_context("fork").Process(target=_serve_slaves, args=(master_fd, slave_count),
+                                                          daemon=True)
+    process.start()
+    return os.ttyname(slave_fd), process, slave_fd
+
+
+def _main_load(stop: threading.Event, counter: list) -> None:
+    """Work the GUI process also does: formatting and checking frames."""
+    frame = bytes(range(64))
+    while not stop.is_set():
+        json.dumps({"tag": "V-101/position", "values": list(frame[:8])})
+        crc16(frame)
+        counter[0] += 1
+
+
+def run(mode: str, buses: int, devices: int, duration: float, main_load: bool) -> dict:
+    opened = [_open_bus(devices) for _ in range(buses)]
+    tags = [PollTag(f"{port}/{slave}", port, slave, 2, 2) for port, _, _ in opened for slave in range(1, devices + 1)]
+    protocol = ModbusProtocol(parity="N")
+    protocol.timeouts.initial_timeout = protocol.timeouts.max_timeout = 0.5
+    protocol.read_cache.default_ttl = 0  # Toda leitura vai ao barramento
+
+    samples = [0]
+
+    def on_sample(tag, values, timestamp):
+        samples[0] += 1
+
+    if mode == "process":
+        from bus_process import ProcessPoller
+        poller = ProcessPoller(protocol, tags, interval=0, on_sample=on_sample)
+    else:
+        poller = Poller(protocol, tags, interval=0, on_sample=on_sample)
+
+    stop_load = threading.Event()
+    load_counter = [0]
+    load = threading.Thread(target=_main_load, args=(stop_load, load_counter), daemon=True)
+    if main_load:
+        load.start()
+
+    poller.start()
+    time.sleep(min(1.0, duration / 4))  # Aquecimento (inicialização dos processos)
+    first_samples, first_load, started = samples[0], load_counter[0], time.perf_counter()
+    time.sleep(duration)
+    elapsed = time.perf_counter() - started
+    result = {"mode": mode, "buses": buses, "samples_per_s": (samples[0] - first_samples) / elapsed,
+              "main_load_per_s": (load_counter[0] - first_load) / elapsed if main_load else None}
+    poller.stop()
+    stop_load.set()
+    for _, process, slave_fd in opened:
+        process.terminate()
+        os.close(slave_fd)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buses", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--devices", type=int, default=10, help="escravos por barramento")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--main-load", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'modo':<8} {'portas':>6} {'amostras/s':>12} {'por porta':>10} {'carga principal/s':>18}")
+    for buses in args.buses:
+        for mode in ("thread", "process"):
+            result = run(mode, buses, args.devices, args.duration, args.main_load)
+            load = "-" if result["main_load_per_s"] is None else f"{result['main_load_per_s']:.0f}"
+            print(f"{mode:<8} {buses:>6} {result['samples_per_s']:>12.0f} {result['samples_per_s'] / buses:>10.0f} "
+                  f"{load:>18}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
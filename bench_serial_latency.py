@@ -0,0 +1,83 @@
+"""Benchmark: tempo de ida e volta (RTT) de leituras com e sem o ajuste de latência do kernel.
+
+    python bench_serial_latency.py                               # pty com escravo emulado
+    python bench_serial_latency.py --port /dev/ttyUSB0 --slave 3 --baudrate 115200
+
+Mede exchange() (abre a porta a cada transação) e o SerialEventLoop (porta sempre
+aberta), cada um sem ajuste e com SerialTuning(low_latency=True), e mostra a
+configuração efetiva da porta. Num pty o kernel não implementa TIOCSSERIAL nem
+latency_timer: os números servem de linha de base; a diferença aparece em
+adaptadores USB (FTDI: latency_timer de 16 ms por padrão).
+"""
+import argparse
+import statistics
+import time
+
+from modbus_protocol import ModbusProtocol
+from serial_tuning import SerialTuning
+
+
+def _percentiles(samples) -> str:
+    samples = sorted(samples)
+    p99 = samples[min(int(len(samples) * 0.99), len(samples) - 1)]
+    return f"{statistics.median(samples) * 1000:8.3f} {p99 * 1000:8.3f} {samples[-1] * 1000:8.3f}"
+
+
+def run(mode: str, tuned: bool, port: str, slave: int, count: int, baudrate: int, parity: str):
+    protocol = ModbusProtocol(baudrate=baudrate, parity=parity)
+    protocol.read_cache.default_ttl = 0
+    protocol.timeouts.initial_timeout = protocol.timeouts.max_timeout = 0.5
+    protocol.tuning = SerialTuning(low_latency=tuned)
+    loop = None
+    if mode == "loop":
+        from serial_loop import SerialEventLoop
+        loop = SerialEventLoop(protocol)
+        loop.start()
+
+    samples, missing = [], 0
+    for _ in range(count):
+        time.sleep(0.005)  # Fora da medição: o silêncio entre frames do loop não entra no RTT
+        started = time.perf_counter()
+        if loop is not None:
+            response = loop.request(port, slave, 3, 2, 2)
+        else:
+            response = protocol.exchange(port, slave, 3, 2, 2)
+        if response:
+            samples.append(time.perf_counter() - started)
+        else:
+            missing += 1
+    if loop is not None:
+        loop.stop()
+    return samples, missing, protocol.tuning.effective(port)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", help="porta com um escravo real (padrão: pty com FakeSlave)")
+    parser.add_argument("--slave", type=int, default=1)
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--parity", choices="NEO", default="N")
+    parser.add_argument("--count", type=int, default=500)
+    args = parser.parse_args()
+
+    process = None
+    port = args.port
+    if port is None:
+        from bench_bus_processes import _open_bus
+        port, process, _ = _open_bus(args.slave)
+
+    print(f"{'modo':<9} {'ajuste':<12} {'p50 ms':>8} {'p99 ms':>8} {'máx ms':>8} {'sem resposta':>12}")
+    effective = None
+    for mode in ("exchange", "loop"):
+        for tuned in (False, True):
+            samples, missing, settings = run(mode, tuned, port, args.slave, args.count, args.baudrate, args.parity)
+            effective = settings or effective
+            print(f"{mode:<9} {'low_latency' if tuned else 'padrão':<12} {_percentiles(samples)} {missing:>12}",
+                  flush=True)
+    print(f"configuração efetiva: {effective}")
+    if process is not None:
+        process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import itertools
+import multiprocessing
+import struct
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing.connection import wait
+
+from modbus_logging import get_logger, setup_logging, stop_logging
+
+# Mensagens no pipe (o primeiro byte é o tipo):
+#   S  amostras de uma varredura: _BATCH seguido de _RECORD + valores u16 por amostra
+#   H  mudança de saúde: _HEALTH + estado (UTF-8)
+#   C  comando do processo principal: _COMMAND; R  resposta: _REPLY + frame RTU (vazio = sem resposta)
+#   Q  encerrar o processo
+_BATCH = struct.Struct("<cdfH")  # tipo, horário base, duração da varredura (s), quantidade de amostras
+_RECORD = struct.Struct("<HIB")  # índice do tag, microssegundos desde o horário base, quantidade de valores
+_HEALTH = struct.Struct("<cB")
+_COMMAND = struct.Struct("<cIBBHH?")  # tipo, id, escravo, função, endereço, dado, force
+_REPLY = struct.Struct("<cI")
+
+
+def encode_batch(samples, scan_duration: float) -> bytes:
+    """Samples of one scan, [(tag index, timestamp, values), ...], as one compact message."""
+    base = samples[0][1] if samples else time.time()
+    parts = [_BATCH.pack(b"S", base, scan_duration, len(samples))]
+    for index, timestamp, values in samples:
+        parts.append(_RECORD.pack(index, max(int((timestamp - base) * 1e6), 0), len(values)))
+        parts.append(struct.pack(f"<{len(values)}H", *values))
+    return b"".join(parts)
+
+
+def decode_batch(message: bytes):
+    """(scan duration, [(tag index, timestamp, values), ...]) of an encode_batch message."""
+    _, base, scan_duration, count = _BATCH.unpack_from(message, 0)
+    offset = _BATCH.size
+    samples = []
+    for _ in range(count):
+        index, micros, value_count = _RECORD.unpack_from(message, offset)
+        offset += _RECORD.size
+        values = list(struct.unpack_from(f"<{value_count}H", message, offset))
+        offset += 2 * value_count
+        samples.append((index, base + micros / 1e6, values))
+    return scan_duration, samples
+
+
+def _bus_main(port, tags, settings, tuning, serial_tuning, interval, connection, log_level) -> None:
+    """Entry point of a bus process: poll `tags` of `port` and stream the results to the parent."""
+    from modbus_protocol import ModbusProtocol
+    from poller import Poller
+    from serial_tuning import SerialTuning
+
+    setup_logging(log_level)
+    protocol = ModbusProtocol(**settings)
+    protocol.timeouts.initial_timeout, protocol.timeouts.max_timeout, protocol.read_cache.default_ttl = tuning
+    protocol.tuning = SerialTuning(**serial_tuning)
+    send_lock = threading.Lock()
+    indexes = {id(tag): index for index, tag in enumerate(tags)}
+    samples = []
+
+    def send(message: bytes) -> None:
+        with send_lock:
+            connection.send_bytes(message)
+
+    def on_sample(tag, values, timestamp):
+        samples.append((indexes[id(tag)], timestamp, values))
+
+    def on_scan(port):
+        batch = encode_batch(samples, poller.last_scan_duration.get(port, 0.0))
+        samples.clear()
+        send(batch)
+
+    protocol.health.on_change = lambda port, device_id, state: send(
+        _HEALTH.pack(b"H", device_id) + state.encode("utf-8"))
+    poller = Poller(protocol, tags, interval, on_sample=on_sample, on_scan=on_scan)
+    poller.start()
+    try:
+        while True:
+            message = connection.recv_bytes()
+            if message[:1] == b"C":
+                _, request_id, slave, function, address, data, force = _COMMAND.unpack(message)
+                response = protocol.exchange(port, slave, function, address, data, force=force)
+                send(_REPLY.pack(b"R", request_id) + (response or b""))
+            elif message[:1] == b"Q":
+                break
+    except (EOFError, OSError):
+        pass  # Processo principal terminou
+    finally:
+        poller.stop()
+        stop_logging()
+
+
+class ProcessPoller:
+    """Poller with one OS process per serial port, for high poll rates on several buses.
+
+    Each child process owns its port: it polls the port's tags with a regular
+    Poller and sends every scan to the parent as one binary message (tag index,
+    time offset and u16 values per sample), so bus I/O, timing and CRC checks of
+    different buses no longer compete for the parent's GIL. The parent decodes
+    the batches in one thread and calls `on_sample`/`on_scan` like Poller does;
+    health changes are reported through `on_state(port, device_id, state)`.
+
+    While it runs, the children are the only masters of their ports: other
+    requests must go through exchange(). Transaction listeners, the read cache
+    and the health breaker of `protocol` do not see the children's traffic.
+    """
+
+    def __init__(self, protocol, tags, interval: float = 0.1, on_sample=None, on_scan=None, on_state=None):
+        self.protocol = protocol
+        self.interval = interval
+        self.on_sample = on_sample
+        self.on_scan = on_scan
+        self.on_state = on_state
+        self.last_scan_duration = {}
+        self.batches = 0
+
+        self._context = multiprocessing.get_context("spawn")  # Igual no Windows e no Linux; sem fork com threads
+        self._tags_by_port = {}
+        self._processes = {}
+        self._connections = {}
+        self._send_locks = {}
+        self._replies = {}
+        self._request_ids = itertools.count()
+        self._receiver = None
+        self._stop = threading.Event()
+        self.set_tags(tags)
+
+    def set_tags(self, tags) -> None:
+        tags_by_port = {}
+        for tag in tags:
+            tags_by_port.setdefault(tag.port, []).append(tag)
+        self._tags_by_port = tags_by_port
+
+    @property
+    def running(self) -> bool:
+        return any(process.is_alive() for process in self._processes.values())
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        settings = self.protocol.serial_settings
+        tuning = (self.protocol.timeouts.initial_timeout, self.protocol.timeouts.max_timeout,
+                  self.protocol.read_cache.default_ttl)
+        log_level = get_logger().getEffectiveLevel()
+        for port, tags in self._tags_by_port.items():
+            parent, child = self._context.Pipe()
+            process = self._context.Process(
+                target=_bus_main, args=(port, tags, settings, tuning, self.protocol.tuning.options(), self.interval,
+                                        child, log_level),
+                name=f"bus-{port}", daemon=True)
+            process.start()
+            child.close()
+            self._processes[port] = process
+            self._connections[port] = parent
+            self._send_locks[port] = threading.Lock()
+        self._receiver = threading.Thread(target=self._receive, name="bus-process-receiver", daemon=True)
+        self._receiver.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for port, connection in self._connections.items():
+            try:
+                with self._send_locks[port]:
+                    connection.send_bytes(b"Q")
+            except OSError:
+                pass
+        for process in self._processes.values():
+            process.join(5.0)
+            if process.is_alive():
+                process.terminate()
+        if self._receiver is not None:
+            self._receiver.join()
+        for connection in self._connections.values():
+            connection.close()
+        for future in self._replies.values():
+            if not future.done():
+                future.set_result(None)
+        self._processes, self._connections, self._replies = {}, {}, {}
+
+    def exchange(self, port, device_id, function, address, data, force=False, timeout: float = 10.0):
+        """Send a request through the port's process and return the response (None without answer).
+
+        The port is owned by its bus process, so this is the way to command a device
+        while the ProcessPoller runs. A port without a process is logged and gets None.
+        """
+        connection, send_lock = self._connections.get(port), self._send_locks.get(port)
+        if connection is None or send_lock is None:
+            get_logger(port, device_id).error("Nenhum processo de barramento para a porta %s", port)
+            return None
+        try:
+            request_id = next(self._request_ids) & 0xFFFFFFFF
+            command = _COMMAND.pack(b"C", request_id, device_id, function, address, data, force)
+        except struct.error:
+            get_logger(port, device_id).error("Comando fora da faixa: escravo %s, função %s, endereço %s, dado %s",
+                                              device_id, function, address, data)
+            return None
+        future = self._replies[request_id] = Future()
+        try:
+            with send_lock:
+                connection.send_bytes(command)
+            return future.result(timeout)
+        except OSError as e:
+            get_logger(port, device_id).error("O processo do barramento %s não aceitou o comando: %s", port, e)
+            return None
+        except FutureTimeoutError:
+            get_logger(port, device_id).warning("Sem resposta do processo do barramento %s em %.0f s", port, timeout)
+            return None
+        finally:
+            self._replies.pop(request_id, None)
+
+    def _receive(self) -> None:
+        ports = {connection: port for port, connection in self._connections.items()}
+        while ports and not self._stop.is_set():
+            for connection in wait(list(ports), timeout=0.2):
+                port = ports[connection]
+                try:
+                    message = connection.recv_bytes()
+                except (EOFError, OSError):
+                    del ports[connection]
+                    if not self._stop.is_set():
+                        get_logger(port).error("O processo do barramento %s terminou", port)
+                    continue
+                try:
+                    self._dispatch(port, message)
+                except Exception:
+                    get_logger(port).exception("Erro ao processar mensagem do processo do barramento")
+
+    def _dispatch(self, port, message: bytes) -> None:
+        kind = message[:1]
+        if kind == b"S":
+            scan_duration, samples = decode_batch(message)
+            self.batches += 1
+            self.last_scan_duration[port] = scan_duration
+            if self.on_sample:
+                tags = self._tags_by_port[port]
+                for index, timestamp, values in samples:
+                    self.on_sample(tags[index], values, timestamp)
+            if self.on_scan:
+                self.on_scan(port)
+        elif kind == b"H":
+            _, device_id = _HEALTH.unpack_from(message, 0)
+            if self.on_state:
+                self.on_state(port, device_id, message[_HEALTH.size:].decode("utf-8"))
+        elif kind == b"R":
+            _, request_id = _REPLY.unpack_from(message, 0)
+            future = self._replies.get(request_id)
+            if future is not None and not future.done():
+                future.set_result(message[_REPLY.size:] or None)
@@ -0,0 +1,278 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import serial
+
+from modbus_frames import FUNCTION_NAMES, crc16, crc16_update, decode_frame, expected_frame_length
+from traffic_capture import BUS
+
+MAX_FRAME = 256
+
+
+def _crc_match_length(buffer, start_length: int = 4):
+    """Smallest length L >= start_length whose last two bytes are the CRC of the first L - 2.
+
+    The CRC is rolled forward one byte at a time, so the whole scan is O(len(buffer)).
+    """
+    crc = 0xFFFF
+    limit = min(len(buffer), MAX_FRAME)
+    for length in range(2, limit - 1):
+        crc = crc16_update(crc, buffer[length - 2])
+        if length + 2 >= start_length and crc == (buffer[length] | (buffer[length + 1] << 8)):
+            return length + 2
+    return None
+
+
+class RtuFrameSplitter:
+    """Reassemble a raw RTU byte stream into frames.
+
+    A silent interval longer than t3.5 marks a frame boundary, as in the standard.
+    USB adapters deliver bytes in bursts, so timing alone cannot be trusted: the
+    CRC is the authority. Expected lengths per function code are tried first, then
+    a rolling CRC scan; bytes that never form a valid frame are reported as invalid
+    after `stale_timeout` or once the buffer exceeds the maximum RTU frame size.
+    Frames cut from one read are timestamped from their byte offset in it at one
+    character time per byte, so a request and its response keep their turnaround.
+    """
+
+    def __init__(self, baudrate: int = 9600, bits_per_char: int = 11, stale_timeout: float = 0.05):
+        t35 = 3.5 * bits_per_char / baudrate
+        self.gap_ns = int((0.00175 if baudrate > 19200 else t35) * 1e9)
+        self.char_ns = int(bits_per_char / baudrate * 1e9)
+        self.stale_ns = int(stale_timeout * 1e9)
+        self.valid_frames = 0
+        self.invalid_bytes = 0
+
+        self._buffer = bytearray()
+        self._consumed = 0  # Bytes do fluxo já retirados do buffer
+        self._arrivals = deque()  # (posição no fluxo, horário) do primeiro byte de cada leitura no buffer
+        self._last_ns = 0
+        self._pending_request = None
+
+    def feed(self, data: bytes, timestamp_ns: int = None):
+        """Add received bytes; returns a list of (timestamp_ns, frame, is_request, crc_ok)."""
+        timestamp_ns = timestamp_ns or time.monotonic_ns()
+        frames = []
+        if self._buffer and timestamp_ns - self._last_ns > self.gap_ns:
+            # Silêncio maior que t3.5: o que está no buffer deveria ser um frame completo.
+            # Só é descartado como inválido depois de stale_timeout (atraso de adaptadores USB).
+            frames += self._split(final=timestamp_ns - self._last_ns > self.stale_ns)
+        if not data:
+            return frames
+
+        self._arrivals.append((self._consumed + len(self._buffer), timestamp_ns))
+        self._buffer += data
+        self._last_ns = timestamp_ns
+        frames += self._split(final=False)
+        return frames
+
+    def flush(self):
+        """Return whatever is buffered (e.g. when the sniffer stops)."""
+        return self._split(final=True)
+
+    def classify(self, frame) -> bool:
+        """Decide whether a valid frame is a master request or a slave response.
+
+        Keeps the last request seen, so frames must be classified in bus order.
+        """
+        pending = self._pending_request
+        if pending is not None and frame[0] == pending[0] and (frame[1] & 0x7F) == pending[1] \
+                and expected_frame_length(frame, False) in (len(frame), None):
+            self._pending_request = None
+            return False
+        if expected_frame_length(frame, True) in (len(frame), None) and frame[0] != 0:
+            self._pending_request = (frame[0], frame[1])
+            return True
+        if frame[0] == 0:
+            return True  # Broadcast: sempre requisição
+        return False
+
+    def _frame_length(self, buffer):
+        """Length of the valid frame at the start of `buffer` (0 = none, or not complete yet)."""
+        request_length = expected_frame_length(buffer, True)
+        response_length = expected_frame_length(buffer, False)
+        candidates = [request_length, response_length]
+        # Com uma requisição pendente para o mesmo escravo/função, a resposta é o mais provável
+        pending = self._pending_request
+        if pending is not None and buffer[0] == pending[0] and (buffer[1] & 0x7F) == pending[1]:
+            candidates.reverse()
+
+        waiting = False
+        for length in (c for c in candidates if c):
+            if length > len(buffer):
+                waiting = True
+            elif crc16(buffer[:length - 2]) == (buffer[length - 2] | (buffer[length - 1] << 8)):
+                return length
+        if waiting and None not in candidates and len(buffer) < MAX_FRAME:
+            return 0
+        return _crc_match_length(buffer) or 0
+
+    def _resync(self, view, final: bool) -> int:
+        """How many leading bytes to discard: up to the next offset where a valid frame starts.
+
+        Without `final`, bytes that could still begin a frame (the last MAX_FRAME - 1)
+        are kept to wait for the rest of it.
+        """
+        limit = len(view) - 3 if final else len(view) - MAX_FRAME + 1
+        for offset in range(1, limit):
+            # Só testa o CRC onde um frame pode começar: escravo 0-247 e função conhecida
+            # (funções desconhecidas ainda são achadas no início do buffer, depois de um silêncio)
+            if view[offset] <= 247 and view[offset + 1] & 0x7F in FUNCTION_NAMES \
+                    and self._frame_length(view[offset:]):
+                return offset
+        return len(view) if final else max(limit, 1)
+
+    def _timestamp(self, position: int) -> int:
+        """Estimated start time of the byte at `position` of the stream: arrival of its read plus one
+        character time per byte before it in that read (a read can hold several frames)."""
+        arrivals = self._arrivals
+        while len(arrivals) > 1 and arrivals[1][0] <= position:
+            arrivals.popleft()
+        offset, arrived_ns = arrivals[0]
+        return arrived_ns + (position - offset) * self.char_ns
+
+    def _cut(self, length: int) -> tuple:
+        """Remove `length` bytes from the buffer; returns (timestamp of the first one, bytes)."""
+        timestamp_ns = self._timestamp(self._consumed)
+        data = bytes(self._buffer[:length])
+        del self._buffer[:length]
+        self._consumed += length
+        return timestamp_ns, data
+
+    def _split(self, final: bool):
+        frames = []
+        while len(self._buffer) >= 4:
+            skip = 0
+            with memoryview(self._buffer) as view:
+                length = self._frame_length(view)
+                if not length and (final or len(view) >= MAX_FRAME):
+                    skip = self._resync(view, final)
+            if length:
+                timestamp_ns, frame = self._cut(length)
+                self.valid_frames += 1
+                frames.append((timestamp_ns, frame, self.classify(frame), True))
+                continue
+            if not skip:
+                break
+            # Ressincroniza: descarta de uma vez os bytes até o próximo frame válido
+            timestamp_ns, garbage = self._cut(skip)
+            self.invalid_bytes += skip
+            frames.append((timestamp_ns, garbage, False, False))
+
+        if final and self._buffer:
+            self.invalid_bytes += len(self._buffer)
+            frames.append(self._cut(len(self._buffer)) + (False, False))
+        return frames
+
+
+class BusSniffer:
+    """Listen-only RS-485 monitor: never writes to the port.
+
+    The reader thread only moves bytes from the port to a queue (with their arrival
+    time); a second thread splits, decodes, records and reports frames, so parsing can
+    never make the reader miss bytes. `on_frames` receives batches of
+    (timestamp_ns, frame, DecodedFrame or None) at most every `batch_interval` seconds.
+    """
+
+    def __init__(self, port: str, baudrate: int = 9600, bytesize: int = 8, parity: str = "E",
+                 stopbits: int = 1, capture=None, on_frames=None, on_error=None, batch_interval: float = 0.25):
+        self.port = port
+        self.baudrate = baudrate
+        self.bytesize = bytesize
+        self.parity = parity
+        self.stopbits = stopbits
+        self.capture = capture
+        self.on_frames = on_frames
+        self.on_error = on_error
+        self.batch_interval = batch_interval
+        bits_per_char = 1 + bytesize + (0 if parity == "N" else 1) + stopbits
+        self.splitter = RtuFrameSplitter(baudrate, bits_per_char)
+        self.bytes_received = 0
+        self.error = None
+
+        self._chunks = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self) -> None:
+        self._stop.clear()
+        self.error = None
+        self._threads = [
+            threading.Thread(target=self._read_loop, name=f"sniffer-read-{self.port}", daemon=True),
+            threading.Thread(target=self._parse_loop, name=f"sniffer-parse-{self.port}", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _read_loop(self) -> None:
+        try:
+            ser = serial.Serial(port=self.port, baudrate=self.baudrate, bytesize=self.bytesize,
+                                parity=self.parity, stopbits=self.stopbits, timeout=0.01)
+        except Exception as e:
+            self._fail(e)
+            self._chunks.put(None)
+            return
+
+        if hasattr(ser, "set_buffer_size"):
+            ser.set_buffer_size(rx_size=64 * 1024)  # Windows: buffer maior no driver
+
+        try:
+            while not self._stop.is_set():
+                data = ser.read(max(ser.in_waiting, 1))
+                if data:
+                    self._chunks.put((time.monotonic_ns(), time.time_ns(), data))
+        except Exception as e:
+            self._fail(e)
+        finally:
+            ser.close()
+            self._chunks.put(None)
+
+    def _fail(self, error: Exception) -> None:
+        self.error = str(error)
+        if self.on_error:
+            self.on_error(error)
+
+    def _parse_loop(self) -> None:
+        batch = []
+        next_report = time.monotonic() + self.batch_interval
+        # Relógio de parede correspondente ao relógio monotônico do splitter
+        wall_offset = time.time_ns() - time.monotonic_ns()
+
+        while True:
+            try:
+                item = self._chunks.get(timeout=self.batch_interval)
+            except queue.Empty:
+                item = ()
+
+            if item is None:
+                frames = self.splitter.flush()
+            elif item:
+                monotonic_ns, wall_ns, data = item
+                wall_offset = wall_ns - monotonic_ns
+                self.bytes_received += len(data)
+                frames = self.splitter.feed(data, monotonic_ns)
+            else:
+                frames = self.splitter.feed(b"", time.monotonic_ns())
+
+            for monotonic_ns, frame, is_request, crc_ok in frames:
+                timestamp_ns = monotonic_ns + wall_offset
+                if self.capture is not None:
+                    self.capture.record(BUS, self.port, frame, timestamp_ns)
+                decoded = decode_frame(frame, is_request) if crc_ok else None
+                batch.append((timestamp_ns, frame, decoded))
+
+            if batch and (item is None or time.monotonic() >= next_report):
+                if self.on_frames:
+                    self.on_frames(batch)
+                batch = []
+                next_report = time.monotonic() + self.batch_interval
+            if item is None:
+                return
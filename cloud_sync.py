@@ -0,0 +1,330 @@
+import gzip
+import json
+import os
+import queue
+import tarfile
+import threading
+import time
+
+from modbus_frames import decode_register_values
+
+CHUNK_PREFIX = "chunk_"
+CHUNK_SUFFIX = ".jsonl"
+
+
+def last_sequence(directory: str) -> int:
+    """Highest sequence number among the chunks in `directory` (0 if none)."""
+    sequence = 0
+    for name in os.listdir(directory):
+        if name.startswith(CHUNK_PREFIX) and CHUNK_SUFFIX in name:
+            number = name[:name.index(CHUNK_SUFFIX)].rsplit("_", 1)[-1]
+            if number.isdigit():
+                sequence = max(sequence, int(number))
+    return sequence
+
+
+class ChunkedLogWriter:
+    """Write transactions to rotating local JSON-lines chunks from a background thread.
+
+    The listener only enqueues the transaction, so serial I/O never waits on the disk.
+    A chunk is closed (and becomes eligible for upload) when it reaches `max_bytes`
+    or has been open for `max_age` seconds. Chunk names carry the UTC time, so they
+    keep sorting in creation order across daylight saving changes.
+    """
+
+    def __init__(self, directory: str = os.path.join("storage", "chunks"),
+                 max_bytes: int = 256 * 1024, max_age: float = 60.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._queue = queue.Queue()
+        self._file = None
+        self._opened_at = 0.0
+
+        os.makedirs(directory, exist_ok=True)
+        # Chunk deixado aberto por um encerramento sem close() (ou queda): fecha para ser sincronizado
+        for name in os.listdir(directory):
+            if name.startswith(CHUNK_PREFIX) and name.endswith(CHUNK_SUFFIX + ".open"):
+                path = os.path.join(directory, name)
+                os.replace(path, path[:-len(".open")])
+        # Continua a numeração após reinícios para manter a ordem dos nomes
+        self._sequence = last_sequence(directory)
+        self._thread = threading.Thread(target=self._run, name="chunk-writer", daemon=True)
+        self._thread.start()
+
+    def __call__(self, transaction) -> None:
+        """Listener for ModbusProtocol.add_transaction_listener."""
+        self._queue.put(transaction)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _open_chunk(self) -> None:
+        self._sequence += 1
+        name = f"{CHUNK_PREFIX}{time.strftime('%Y%m%d_%H%M%S', time.gmtime())}_{self._sequence:06d}{CHUNK_SUFFIX}"
+        # O arquivo é escrito com sufixo .open e renomeado ao fechar, para o SyncEngine
+        # nunca enviar um chunk incompleto.
+        self._file = open(os.path.join(self.directory, name + ".open"), "w", encoding="utf-8")
+        self._opened_at = time.monotonic()
+
+    def _close_chunk(self) -> None:
+        if self._file is None:
+            return
+        path = self._file.name
+        self._file.close()
+        self._file = None
+        os.replace(path, path[:-len(".open")])
+
+    def _run(self) -> None:
+        while True:
+            try:
+                transaction = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                transaction = False
+
+            if transaction is None:
+                self._close_chunk()
+                return
+
+            if transaction:
+                if self._file is None:
+                    self._open_chunk()
+                record = {
+                    "timestamp": transaction.timestamp,
+                    "port": transaction.port,
+                    "device_id": transaction.device_id,
+                    "function": transaction.function,
+                    "address": transaction.address,
+                    "data": transaction.data,
+                    "request": transaction.request.hex(),
+                    "response": (transaction.response or b"").hex(),
+                    "error": transaction.error,
+                }
+                values = decode_register_values(transaction.response)
+                if values:
+                    record["values"] = values
+                self._file.write(json.dumps(record) + "\n")
+
+            if self._file is not None and (self._file.tell() >= self.max_bytes
+                                           or time.monotonic() - self._opened_at >= self.max_age):
+                self._close_chunk()
+
+
+class RemoteFolder:
+    """Destination of the sync engine. Uploads are append-only so they can be resumed."""
+
+    def identity(self) -> str:
+        """Stable name of the destination; the sync checkpoint only applies to the same one."""
+        raise NotImplementedError
+
+    def uploaded_size(self, name: str) -> int:
+        """Return how many bytes of `name` already reached the remote (0 if none)."""
+        raise NotImplementedError
+
+    def append(self, name: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def finalize(self, name: str) -> None:
+        """Mark `name` as complete on the remote."""
+        raise NotImplementedError
+
+
+class LocalDirectoryRemote(RemoteFolder):
+    """Remote backed by a local directory.
+
+    Pointing it at a folder synced by the Google Drive desktop client gives cloud
+    upload without API credentials; it also serves as the stand-in for tests.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def identity(self) -> str:
+        return os.path.normcase(os.path.abspath(self.path))
+
+    def _partial(self, name: str) -> str:
+        return os.path.join(self.path, name + ".part")
+
+    def uploaded_size(self, name: str) -> int:
+        if os.path.exists(os.path.join(self.path, name)):
+            return -1  # Já finalizado
+        try:
+            return os.path.getsize(self._partial(name))
+        except FileNotFoundError:
+            return 0
+
+    def append(self, name: str, data: bytes) -> None:
+        with open(self._partial(name), "ab") as partial:
+            partial.write(data)
+
+    def finalize(self, name: str) -> None:
+        os.replace(self._partial(name), os.path.join(self.path, name))
+
+
+class SyncEngine:
+    """Upload closed log chunks created since the last checkpoint.
+
+    Small chunks are batched into one gzip-compressed tar archive (up to
+    `batch_bytes` of raw data) before upload. The checkpoint records the last
+    uploaded chunk and any batch in progress, so an interrupted upload resumes
+    from the byte offset the remote already holds. It belongs to one remote: after
+    switching to another folder every chunk is uploaded again from the start.
+    """
+
+    def __init__(self, remote: RemoteFolder, chunk_directory: str = os.path.join("storage", "chunks"),
+                 checkpoint_path: str = os.path.join("storage", "sync_checkpoint.json"),
+                 batch_bytes: int = 4 * 1024 * 1024, block_size: int = 256 * 1024,
+                 interval: float = 300.0, on_status=None):
+        self.remote = remote
+        self.chunk_directory = chunk_directory
+        self.checkpoint_path = checkpoint_path
+        self.staging_directory = os.path.join(chunk_directory, "staging")
+        self.batch_bytes = batch_bytes
+        self.block_size = block_size
+        self.interval = interval
+        self.on_status = on_status
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(self.staging_directory, exist_ok=True)
+
+    # Checkpoint
+    def load_checkpoint(self) -> dict:
+        remote = self.remote.identity()
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as checkpoint:
+                saved = json.load(checkpoint)
+        except (FileNotFoundError, ValueError):
+            saved = None
+        if isinstance(saved, dict) and saved.get("remote") == remote:
+            return saved
+        # Checkpoint de outra pasta (ou de antes de o checkpoint ter a pasta): recomeça do início
+        if isinstance(saved, dict) and saved.get("pending"):
+            try:
+                os.remove(saved["pending"]["archive"])
+            except (OSError, KeyError, TypeError):
+                pass
+        return {"remote": remote, "last_chunk": "", "pending": None}
+
+    def save_checkpoint(self, checkpoint: dict) -> None:
+        temporary = self.checkpoint_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as output:
+            json.dump(checkpoint, output)
+        os.replace(temporary, self.checkpoint_path)
+
+    # Batching
+    def pending_chunks(self, last_chunk: str):
+        """Closed chunks newer than `last_chunk`, oldest first (names sort by creation)."""
+        names = sorted(name for name in os.listdir(self.chunk_directory)
+                       if name.startswith(CHUNK_PREFIX) and name.endswith(CHUNK_SUFFIX))
+        return [name for name in names if name > last_chunk]
+
+    def next_batch(self, chunks):
+        batch, size = [], 0
+        for name in chunks:
+            chunk_size = os.path.getsize(os.path.join(self.chunk_directory, name))
+            if batch and size + chunk_size > self.batch_bytes:
+                break
+            batch.append(name)
+            size += chunk_size
+        return batch
+
+    def build_archive(self, chunks) -> str:
+        first, last = chunks[0][len(CHUNK_PREFIX):-len(CHUNK_SUFFIX)], chunks[-1][len(CHUNK_PREFIX):-len(CHUNK_SUFFIX)]
+        archive_name = f"modbus_{first}__{last}.tar.gz"
+        archive_path = os.path.join(self.staging_directory, archive_name)
+        with open(archive_path + ".tmp", "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as compressed:
+                with tarfile.open(fileobj=compressed, mode="w") as archive:
+                    for name in chunks:
+                        archive.add(os.path.join(self.chunk_directory, name), arcname=name)
+        os.replace(archive_path + ".tmp", archive_path)
+        return archive_path
+
+    # Upload
+    def upload_archive(self, archive_path: str) -> None:
+        name = os.path.basename(archive_path)
+        offset = self.remote.uploaded_size(name)
+        if offset < 0:
+            return  # Já enviado antes da interrupção
+
+        with open(archive_path, "rb") as archive:
+            archive.seek(offset)
+            while not self._stop.is_set():
+                block = archive.read(self.block_size)
+                if not block:
+                    break
+                self.remote.append(name, block)
+
+        if not self._stop.is_set():
+            self.remote.finalize(name)
+
+    def sync_once(self) -> int:
+        """Upload everything pending; returns the number of chunks uploaded."""
+        checkpoint = self.load_checkpoint()
+        uploaded = 0
+
+        while not self._stop.is_set():
+            pending = checkpoint.get("pending")
+            if pending is None:
+                batch = self.next_batch(self.pending_chunks(checkpoint["last_chunk"]))
+                if not batch:
+                    break
+                archive_path = self.build_archive(batch)
+                pending = {"archive": archive_path, "chunks": batch}
+                checkpoint["pending"] = pending
+                self.save_checkpoint(checkpoint)
+            elif not os.path.exists(pending["archive"]):
+                pending["archive"] = self.build_archive(pending["chunks"])
+
+            self.upload_archive(pending["archive"])
+            if self._stop.is_set():
+                break
+
+            checkpoint = {"remote": checkpoint["remote"], "last_chunk": pending["chunks"][-1], "pending": None}
+            self.save_checkpoint(checkpoint)
+            os.remove(pending["archive"])
+            uploaded += len(pending["chunks"])
+            self._report(f"{uploaded} blocos de log sincronizados")
+
+        return uploaded
+
+    # Background worker
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cloud-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def sync_now(self) -> None:
+        """Ask the background worker to sync without waiting for the next interval."""
+        self._wake.set()
+
+    def _report(self, message: str) -> None:
+        if self.on_status:
+            self.on_status(message)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sync_once()
+            except Exception as e:
+                self._report(f"Erro na sincronização: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+def restore_archive(archive_path: str, destination: str) -> None:
+    """Extract an uploaded batch back into JSON-lines chunks."""
+    with tarfile.open(archive_path, "r:gz") as archive:
+        archive.extractall(destination, filter="data")  # Recusa caminhos absolutos, "..", links e dispositivos
@@ -0,0 +1,191 @@
+import threading
+
+import flet as ft
+
+from device_health import OFFLINE, ONLINE, SUSPECT, UNKNOWN
+
+_STATE_STYLE = {
+    ONLINE: ("Conectado", ft.Colors.GREEN_400),
+    SUSPECT: ("Instável", ft.Colors.AMBER_400),
+    OFFLINE: ("Desconectado", ft.Colors.RED_400),
+    UNKNOWN: ("—", ft.Colors.GREY_400),
+}
+
+# (título, largura) das colunas
+_COLUMNS = [("Dispositivo", 180), ("Porta / ID", 150), ("Modelo", 170), ("Posição", 90), ("Torque", 90),
+            ("Status", 120)]
+
+_UNSET = object()
+
+
+class _RowSlot:
+    """One of the few row controls reused while scrolling; shows whichever device is at its position."""
+
+    def __init__(self, height: int):
+        self.cells = [ft.Text("", size=13, width=width, no_wrap=True) for _, width in _COLUMNS[:-1]]
+        self.state_text = ft.Text("", size=12, color=ft.Colors.WHITE, text_align=ft.TextAlign.CENTER)
+        self.state_chip = ft.Container(self.state_text, width=_COLUMNS[-1][1], border_radius=4, padding=4)
+        self.control = ft.Container(
+            content=ft.Row([*self.cells, self.state_chip], spacing=10),
+            height=height,
+            padding=ft.padding.symmetric(horizontal=10),
+            border=ft.border.only(bottom=ft.BorderSide(1, ft.Colors.GREY_200)),
+            visible=False,
+        )
+        self.shown = None  # Valores exibidos, para alterar só o que mudou
+
+    def show(self, row) -> bool:
+        """Display `row` (None hides the slot); returns True if any property changed."""
+        if row is None:
+            values = None
+        else:
+            values = (row.name, f"{row.port} / {row.slave_id}", row.model,
+                      "—" if row.position is None else str(row.position),
+                      "—" if row.torque is None else str(row.torque), row.state)
+        if values == self.shown:
+            return False
+
+        if values is None:
+            self.control.visible = False
+        else:
+            self.control.visible = True
+            previous = self.shown or (_UNSET,) * len(values)
+            for cell, value, old in zip(self.cells, values, previous):
+                if value != old:
+                    cell.value = value
+            if values[-1] != previous[-1]:
+                self.state_text.value, self.state_chip.bgcolor = _STATE_STYLE.get(values[-1], _STATE_STYLE[UNKNOWN])
+        self.shown = values
+        return True
+
+
+class DeviceDashboard:
+    """Filterable, sortable list of every device, virtualized over a DeviceTableModel.
+
+    Only `visible_rows` row controls exist, whatever the number of devices:
+    scrolling (mouse wheel or the arrow buttons) moves a window over the model's
+    query result and rebinds those controls. Several dashboards (one per UI
+    session) can share a model: each compares the model revision with the one it
+    last displayed and sends its own page only the properties that changed.
+    flush() is meant for TrendUpdater, which pushes changes at a bounded rate.
+    """
+
+    def __init__(self, model, visible_rows: int = 20, row_height: int = 34):
+        self.model = model
+        self.visible_rows = visible_rows
+        self.offset = 0
+        self.filter_text = ""
+        self.state_filter = None
+        self.sort = "name"
+        self.descending = False
+        self._view = []
+        self._revision = -1
+        self._lock = threading.Lock()  # refresh() roda na thread da UI e na do atualizador
+
+        self.slots = [_RowSlot(row_height) for _ in range(visible_rows)]
+        self.search_field = ft.TextField(label="Filtrar (nome, porta, modelo)", width=280, dense=True,
+                                         on_change=self.handle_filter)
+        self.state_dropdown = ft.Dropdown(
+            width=170, dense=True, value="all", on_change=self.handle_filter,
+            options=[ft.dropdown.Option("all", "Todos"),
+                     ft.dropdown.Option(ONLINE, "Conectados"),
+                     ft.dropdown.Option(SUSPECT, "Instáveis"),
+                     ft.dropdown.Option(OFFLINE, "Desconectados")])
+        self.sort_dropdown = ft.Dropdown(
+            width=170, dense=True, value="name", on_change=self.handle_filter,
+            options=[ft.dropdown.Option("name", "Nome"),
+                     ft.dropdown.Option("address", "Porta / ID"),
+                     ft.dropdown.Option("model", "Modelo"),
+                     ft.dropdown.Option("position", "Posição"),
+                     ft.dropdown.Option("torque", "Torque"),
+                     ft.dropdown.Option("state", "Status")])
+        self.direction_button = ft.IconButton(icon=ft.Icons.ARROW_UPWARD, tooltip="Inverter ordem",
+                                              on_click=self.handle_direction)
+        self.count_text = ft.Text("", size=12, color=ft.Colors.GREY_700)
+
+        header = ft.Container(
+            content=ft.Row([ft.Text(title, size=13, weight=ft.FontWeight.BOLD, width=width)
+                            for title, width in _COLUMNS], spacing=10),
+            padding=ft.padding.symmetric(horizontal=10, vertical=6),
+            bgcolor=ft.Colors.BLUE_50,
+        )
+        rows = ft.GestureDetector(
+            content=ft.Column([slot.control for slot in self.slots], spacing=0),
+            on_scroll=self.handle_scroll,
+        )
+        self.control = ft.Container(
+            content=ft.Column([
+                ft.Row([self.search_field, self.state_dropdown, self.sort_dropdown, self.direction_button,
+                        self.count_text], vertical_alignment=ft.CrossAxisAlignment.CENTER),
+                ft.Container(
+                    content=ft.Column([header, rows], spacing=0),
+                    border=ft.border.all(1, ft.Colors.GREY_300),
+                    border_radius=8,
+                ),
+                ft.Row([
+                    ft.IconButton(icon=ft.Icons.KEYBOARD_DOUBLE_ARROW_UP, on_click=lambda e: self.scroll_by(
+                        -self.visible_rows)),
+                    ft.IconButton(icon=ft.Icons.KEYBOARD_ARROW_UP, on_click=lambda e: self.scroll_by(-1)),
+                    ft.IconButton(icon=ft.Icons.KEYBOARD_ARROW_DOWN, on_click=lambda e: self.scroll_by(1)),
+                    ft.IconButton(icon=ft.Icons.KEYBOARD_DOUBLE_ARROW_DOWN, on_click=lambda e: self.scroll_by(
+                        self.visible_rows)),
+                ], alignment=ft.MainAxisAlignment.CENTER),
+            ], spacing=10),
+            padding=20,
+        )
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """Re-run the query and rebind the visible slots; returns True if anything changed."""
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> bool:
+        self._revision = self.model.revision
+        self._view = self.model.query(self.filter_text, self.state_filter, self.sort, self.descending)
+        self.offset = max(0, min(self.offset, len(self._view) - self.visible_rows))
+        changed = False
+        for index, slot in enumerate(self.slots):
+            position = self.offset + index
+            row = self.model.rows.get(self._view[position]) if position < len(self._view) else None
+            changed |= slot.show(row)
+
+        last = min(self.offset + self.visible_rows, len(self._view))
+        count = f"{self.offset + 1 if self._view else 0}–{last} de {len(self._view)} " \
+                f"({self.model.count()} dispositivos)"
+        if count != self.count_text.value:
+            self.count_text.value = count
+            changed = True
+        return changed
+
+    def flush(self) -> bool:
+        """Apply pending model changes (the query result is cached by the model until it is affected)."""
+        if self.model.revision == self._revision:
+            return False
+        return self.refresh()
+
+    def scroll_by(self, rows: int) -> None:
+        offset = max(0, min(self.offset + rows, len(self._view) - self.visible_rows))
+        if offset != self.offset:
+            self.offset = offset
+            if self.refresh():
+                self.control.update()
+
+    def handle_scroll(self, e) -> None:
+        if e.scroll_delta_y:
+            self.scroll_by(3 if e.scroll_delta_y > 0 else -3)
+
+    def handle_filter(self, e) -> None:
+        self.filter_text = self.search_field.value or ""
+        self.state_filter = None if self.state_dropdown.value == "all" else self.state_dropdown.value
+        self.sort = self.sort_dropdown.value or "name"
+        self.offset = 0
+        if self.refresh():
+            self.control.update()
+
+    def handle_direction(self, e) -> None:
+        self.descending = not self.descending
+        self.direction_button.icon = ft.Icons.ARROW_DOWNWARD if self.descending else ft.Icons.ARROW_UPWARD
+        self.offset = 0
+        self.refresh()
+        self.control.update()
@@ -0,0 +1,289 @@
+import csv
+import os
+import threading
+import time
+from datetime import datetime
+
+from modbus_frames import decode_register_values
+from modbus_logging import get_logger
+
+TRAFFIC_HEADER = ["Data/Hora", "Porta", "Device ID", "Function", "Address", "Data",
+                  "Requisição [HEX]", "Resposta [HEX]", "Erro"]
+READINGS_HEADER = ["Data/Hora", "Porta", "Device ID", "Function", "Registrador", "Valor"]
+
+# Limite de linhas por planilha do Excel (inclui o cabeçalho)
+XLSX_MAX_ROWS = 1_048_576
+
+
+def _count_rows(path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    with open(path, newline="", encoding="utf-8") as spool:
+        # Registros CSV, não linhas do arquivo: um campo pode conter quebras de linha
+        return sum(1 for _ in csv.reader(spool))
+
+
+class TransactionRecorder:
+    """Append every Modbus transaction to an on-disk spool so exports never hold rows in memory.
+
+    Rows are buffered and flushed at most every `flush_interval` seconds (and by
+    snapshot(), flush() and close()), not once per transaction. When the spool
+    exceeds `max_bytes` it becomes the single backup file (`<name>.1.csv`,
+    replacing the previous one), so the disk holds at most about 2 * max_bytes.
+    Rotation waits while an export is reading the spool.
+    """
+
+    def __init__(self, path: str = os.path.join("storage", "transactions.csv"), max_bytes: int = 64 * 1024 * 1024,
+                 flush_interval: float = 1.0):
+        self.path = path
+        self.backup_path = f"{os.path.splitext(path)[0]}.1.csv"
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._readers = 0  # Exportações lendo o spool (a rotação espera por elas)
+        self._last_flush = time.monotonic()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._backup_count = _count_rows(self.backup_path)
+        self._current_count = _count_rows(path)
+
+        self._file = open(path, "a", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+
+    @property
+    def count(self) -> int:
+        return self._backup_count + self._current_count
+
+    def __call__(self, transaction) -> None:
+        """Listener for ModbusProtocol.add_transaction_listener."""
+        row = [
+            f"{transaction.timestamp:.6f}",
+            transaction.port,
+            transaction.device_id,
+            transaction.function,
+            transaction.address,
+            transaction.data,
+            transaction.request.hex(),
+            (transaction.response or b"").hex(),
+            transaction.error,
+        ]
+        with self._lock:
+            self._writer.writerow(row)
+            self._current_count += 1
+            now = time.monotonic()
+            if now - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._last_flush = now
+                if self._readers == 0 and self._file.tell() >= self.max_bytes:
+                    self._rotate()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        os.replace(self.path, self.backup_path)
+        self._backup_count, self._current_count = self._current_count, 0
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+            self._last_flush = time.monotonic()
+
+    def snapshot(self) -> int:
+        """Return the number of spooled transactions, flushing pending writes."""
+        with self._lock:
+            self._file.flush()
+            return self.count
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def iter_spool(self, limit: int = None) -> "SpoolSnapshot":
+        """Raw spool rows as of now, oldest first (at most `limit`); rows appended later are ignored.
+
+        The row count is taken and the spool files are pinned against rotation in
+        the same locked step; close the snapshot (or iterate it to the end) to
+        release them.
+        """
+        with self._lock:
+            self._file.flush()
+            count = self.count
+            self._readers += 1
+        return SpoolSnapshot(self, count if limit is None else min(limit, count))
+
+    def _release_reader(self) -> None:
+        with self._lock:
+            self._readers -= 1
+
+
+class SpoolSnapshot:
+    """Rows of a TransactionRecorder spool up to a fixed count, while rotation is held off."""
+
+    def __init__(self, recorder: TransactionRecorder, limit: int):
+        self.recorder = recorder
+        self.limit = limit
+        self._closed = False
+
+    def __iter__(self):
+        try:
+            index = 0
+            for path in (self.recorder.backup_path, self.recorder.path):
+                if index >= self.limit or not os.path.exists(path):
+                    continue
+                with open(path, newline="", encoding="utf-8") as spool:
+                    for row in csv.reader(spool):
+                        if index >= self.limit:
+                            break
+                        yield row
+                        index += 1
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self.recorder._release_reader()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+def _format_timestamp(value: str) -> str:
+    return datetime.fromtimestamp(float(value)).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def traffic_rows(spool):
+    """Generate command/response rows ready to be written to CSV or XLSX from raw spool rows."""
+    for row in spool:
+        yield [_format_timestamp(row[0]), row[1], int(row[2]), int(row[3]), int(row[4]), int(row[5]),
+               row[6].upper(), row[7].upper(), row[8]]
+
+
+def reading_rows(spool):
+    """Generate one row per register value read (functions 3 and 4) from raw spool rows."""
+    for row in spool:
+        function = int(row[3])
+        if function not in (3, 4) or not row[7]:
+            continue
+
+        timestamp = _format_timestamp(row[0])
+        first_register = int(row[4])
+        for offset, value in enumerate(decode_register_values(bytes.fromhex(row[7]))):
+            yield [timestamp, row[1], int(row[2]), function, first_register + offset, value]
+
+
+def export_csv(rows, destination: str, header, progress=None, progress_every: int = 10_000,
+               cancel_event: threading.Event = None) -> int:
+    """Stream rows to a CSV file and return how many rows were written."""
+    written = 0
+    with open(destination, "w", newline="", encoding="utf-8-sig") as output:
+        writer = csv.writer(output, delimiter=";")
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+            if written % progress_every == 0:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                if progress:
+                    progress(written)
+
+    return written
+
+
+def export_xlsx(rows, destination: str, header, progress=None, progress_every: int = 10_000,
+                cancel_event: threading.Event = None) -> int:
+    """Stream rows to an XLSX file using openpyxl's write-only mode."""
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError("Exportação para Excel requer o pacote 'openpyxl' (pip install openpyxl)")
+
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = XLSX_MAX_ROWS
+    written = 0
+
+    for row in rows:
+        # Uma planilha nova a cada limite de linhas do Excel
+        if sheet_rows >= XLSX_MAX_ROWS:
+            sheet = workbook.create_sheet(f"Dados {len(workbook.worksheets) + 1}")
+            sheet.append(header)
+            sheet_rows = 1
+
+        sheet.append(row)
+        sheet_rows += 1
+        written += 1
+        if written % progress_every == 0:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            if progress:
+                progress(written)
+
+    if sheet is None:
+        workbook.create_sheet("Dados 1").append(header)
+
+    workbook.save(destination)
+    return written
+
+
+class ExportWorker(threading.Thread):
+    """Run an export in the background, reporting progress through callbacks.
+
+    cancel() stops it at the next progress check; the partial file is removed and
+    `on_cancel` is called instead of `on_done`.
+    """
+
+    FORMATS = {"csv": export_csv, "xlsx": export_xlsx}
+
+    def __init__(self, recorder: TransactionRecorder, kind: str = "traffic", file_format: str = "csv",
+                 destination: str = None, on_progress=None, on_done=None, on_error=None, on_cancel=None):
+        super().__init__(daemon=True)
+        if file_format not in self.FORMATS:
+            raise ValueError(f"Formato de exportação desconhecido: {file_format}")
+        if kind not in ("traffic", "readings"):
+            raise ValueError(f"Tipo de exportação desconhecido: {kind}")
+
+        self.recorder = recorder
+        self.kind = kind
+        self.file_format = file_format
+        self.destination = destination or os.path.join(
+            "exports", f"{kind}_{time.strftime('%Y%m%d_%H%M%S')}.{file_format}")
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.cancel_event = threading.Event()
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+
+    def run(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.destination) or ".", exist_ok=True)
+            with self.recorder.iter_spool() as spool:
+                if self.kind == "traffic":
+                    rows, header = traffic_rows(spool), TRAFFIC_HEADER
+                else:
+                    rows, header = reading_rows(spool), READINGS_HEADER
+
+                written = self.FORMATS[self.file_format](
+                    rows, self.destination, header, progress=self.on_progress, cancel_event=self.cancel_event)
+            if self.cancel_event.is_set():
+                os.remove(self.destination)
+                if self.on_cancel:
+                    self.on_cancel()
+            elif self.on_done:
+                self.on_done(self.destination, written)
+        except Exception as e:
+            if self.on_error:
+                self.on_error(e)
+            else:
+                get_logger().error("Erro ao exportar dados: %s", e)
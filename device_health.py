@@ -0,0 +1,119 @@
+import threading
+import time
+
+UNKNOWN = "unknown"  # Nenhuma transação concluída ainda
+ONLINE = "online"
+SUSPECT = "suspect"
+OFFLINE = "offline"
+
+
+class DeviceOfflineError(Exception):
+    """Raised when a command targets a device the circuit breaker marked offline."""
+
+    def __init__(self, port, device_id, retry_in: float):
+        super().__init__(f"Dispositivo {device_id} em {port} está offline (nova tentativa em {retry_in:.0f} s)")
+        self.port = port
+        self.device_id = device_id
+        self.retry_in = retry_in
+
+
+class _Health:
+    __slots__ = ("state", "failures", "probe_interval", "next_probe")
+
+    def __init__(self):
+        self.state = UNKNOWN
+        self.failures = 0
+        self.probe_interval = 0.0
+        self.next_probe = 0.0
+
+
+class DeviceHealth:
+    """Per-device circuit breaker: unknown -> online -> suspect -> offline.
+
+    A failed exchange (no answer, bad CRC, I/O error) makes a device suspect;
+    `offline_after` consecutive failures open the breaker. Offline devices are left
+    out of regular scans and only probed at an exponentially growing interval
+    (`probe_interval` doubling up to `max_probe_interval`); any valid answer,
+    including a Modbus exception response, brings the device back online.
+    Devices start unknown, so the first exchange is also a transition: `on_change(port,
+    device_id, state)` is called on every transition, including a first success.
+    """
+
+    def __init__(self, offline_after: int = 3, probe_interval: float = 1.0,
+                 max_probe_interval: float = 60.0, on_change=None):
+        self.offline_after = offline_after
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._devices = {}
+
+    def _health(self, port, device_id) -> _Health:
+        health = self._devices.get((port, device_id))
+        if health is None:
+            health = self._devices[(port, device_id)] = _Health()
+        return health
+
+    def state(self, port, device_id) -> str:
+        health = self._devices.get((port, device_id))
+        return health.state if health is not None else UNKNOWN
+
+    def states(self) -> dict:
+        with self._lock:
+            return {key: health.state for key, health in self._devices.items()}
+
+    def allow_request(self, port, device_id) -> bool:
+        """False while the device is offline and its next probe is not due yet.
+
+        When a probe is due, this call claims it: the next one is scheduled
+        further away, so concurrent callers do not all hit the dead device.
+        """
+        with self._lock:
+            health = self._devices.get((port, device_id))
+            if health is None or health.state != OFFLINE:
+                return True
+            now = time.monotonic()
+            if now < health.next_probe:
+                return False
+            health.probe_interval = min(health.probe_interval * 2, self.max_probe_interval)
+            health.next_probe = now + health.probe_interval
+            return True
+
+    def retry_in(self, port, device_id) -> float:
+        health = self._devices.get((port, device_id))
+        if health is None or health.state != OFFLINE:
+            return 0.0
+        return max(health.next_probe - time.monotonic(), 0.0)
+
+    def check(self, port, device_id) -> None:
+        """Fail fast for UI commands: raise DeviceOfflineError instead of waiting for a timeout."""
+        if self.state(port, device_id) == OFFLINE:
+            raise DeviceOfflineError(port, device_id, self.retry_in(port, device_id))
+
+    def record_success(self, port, device_id) -> None:
+        self._transition(port, device_id, success=True)
+
+    def record_failure(self, port, device_id) -> None:
+        self._transition(port, device_id, success=False)
+
+    def _transition(self, port, device_id, success: bool) -> None:
+        with self._lock:
+            health = self._health(port, device_id)
+            previous = health.state
+            if success:
+                health.failures = 0
+                health.state = ONLINE
+            else:
+                health.failures += 1
+                if health.failures >= self.offline_after:
+                    if previous != OFFLINE:
+                        health.probe_interval = self.probe_interval
+                        health.next_probe = time.monotonic() + health.probe_interval
+                    health.state = OFFLINE
+                else:
+                    health.state = SUSPECT
+            changed = health.state != previous
+            state = health.state
+
+        if changed and self.on_change:
+            self.on_change(port, device_id, state)
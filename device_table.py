@@ -0,0 +1,122 @@
+import threading
+import time
+
+from device_health import OFFLINE, ONLINE, SUSPECT, UNKNOWN
+
+# Ordenação por estado: problemas primeiro, dispositivos ainda não vistos por último
+_STATE_ORDER = {OFFLINE: 0, SUSPECT: 1, ONLINE: 2, UNKNOWN: 3}
+
+SORT_KEYS = {
+    "name": lambda row: row.name,
+    "address": lambda row: (row.port, row.slave_id),
+    "model": lambda row: (row.model, row.name),
+    "position": lambda row: (row.position is None, row.position or 0),
+    "torque": lambda row: (row.torque is None, row.torque or 0),
+    "state": lambda row: (_STATE_ORDER.get(row.state, 3), row.name),
+    "updated": lambda row: row.updated,
+}
+
+# Campos cuja alteração muda a ordem (ou o filtro) de cada critério
+_SORT_FIELDS = {"position": "position", "torque": "torque", "state": "state", "updated": "updated"}
+
+
+class DeviceRow:
+    __slots__ = ("name", "port", "slave_id", "model", "position", "torque", "state", "updated", "search_key")
+
+    def __init__(self, device, state: str = UNKNOWN):
+        self.name = device.name
+        self.port = device.port
+        self.slave_id = device.slave_id
+        self.model = device.model
+        self.position = None
+        self.torque = None
+        self.state = state
+        self.updated = 0.0
+        self.search_key = f"{device.name} {device.port} {device.model}".lower()
+
+
+class DeviceTableModel:
+    """In-memory table of every configured device with its latest readings and health.
+
+    Rows are indexed by name, by (port, slave) and by health state, so live
+    updates are dict lookups and the state filter does not scan the table.
+    query() results are cached until a change that can affect them: a new
+    reading only invalidates views sorted by that reading. With `health` (a
+    DeviceHealth) rows start from the devices' current state instead of unknown.
+    """
+
+    def __init__(self, devices=(), health=None):
+        self._lock = threading.Lock()
+        self.rows = {}
+        self._by_address = {}
+        self._by_state = {state: set() for state in _STATE_ORDER}
+        self._revisions = {"rows": 0, "position": 0, "torque": 0, "state": 0, "updated": 0}
+        self.revision = 0  # Incrementado a cada mudança visível; cada tela compara com o que já exibiu
+        self._view_key = None
+        self._view = []
+        self.health = health
+        for device in devices:
+            self.add(device)
+
+    def add(self, device) -> None:
+        with self._lock:
+            state = self.health.state(device.port, device.slave_id) if self.health is not None else UNKNOWN
+            row = DeviceRow(device, state)
+            self.rows[row.name] = row
+            self._by_address[(row.port, row.slave_id)] = row.name
+            self._by_state.setdefault(state, set()).add(row.name)
+            self._revisions["rows"] += 1
+            self.revision += 1
+
+    def set_reading(self, name: str, quantity: str, value, timestamp: float = None) -> None:
+        """Store a polled value ("position" or "torque")."""
+        with self._lock:
+            row = self.rows.get(name)
+            if row is None or quantity not in ("position", "torque"):
+                return
+            row.updated = timestamp or time.time()
+            self._revisions["updated"] += 1
+            if getattr(row, quantity) != value:
+                setattr(row, quantity, value)
+                self._revisions[quantity] += 1
+                self.revision += 1
+
+    def set_state(self, port, slave_id, state: str) -> None:
+        """Health state of the device at (port, slave_id); ignored for unknown devices."""
+        with self._lock:
+            name = self._by_address.get((port, slave_id))
+            if name is None:
+                return
+            row = self.rows[name]
+            if row.state == state:
+                return
+            self._by_state[row.state].discard(name)
+            self._by_state.setdefault(state, set()).add(name)
+            row.state = state
+            self._revisions["state"] += 1
+            self.revision += 1
+
+    def count(self, state=None) -> int:
+        if state is None:
+            return len(self.rows)
+        return len(self._by_state.get(state, ()))
+
+    def query(self, text: str = "", state=None, sort: str = "name", descending: bool = False):
+        """Names of the rows matching `text` (name, port or model) and `state`, in sort order."""
+        key_function = SORT_KEYS[sort]
+        text = text.strip().lower()
+        with self._lock:
+            revisions = (self._revisions["rows"], self._revisions["state"],
+                         self._revisions[_SORT_FIELDS[sort]] if sort in _SORT_FIELDS else 0)
+            view_key = (text, state, sort, descending, revisions)
+            if view_key == self._view_key:
+                return self._view
+
+            names = self._by_state.get(state, ()) if state is not None else self.rows.keys()
+            rows = [self.rows[name] for name in names]
+            if text:
+                rows = [row for row in rows if text in row.search_key]
+            rows.sort(key=key_function, reverse=descending)
+            self._view = [row.name for row in rows]
+            self._view_key = view_key
+            return self._view
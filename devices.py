@@ -0,0 +1,65 @@
+import json
+from dataclasses import dataclass
+
+from actuator_data import actuators_data
+
+
+@dataclass(frozen=True)
+class Device:
+    """An actuator on a serial bus."""
+    name: str
+    port: str
+    slave_id: int
+    model: str
+
+
+class DeviceRegistry:
+    """Known devices and named groups of devices, usually loaded from a JSON file:
+
+        {"devices": [{"name": "V-101", "port": "COM5", "slave_id": 1, "model": "TOP-E Module"}, ...],
+         "groups": {"zona-a": ["V-101", "V-102"], ...}}
+
+    Every device also belongs to the implicit group "todos".
+    """
+
+    ALL = "todos"
+
+    def __init__(self, devices=(), groups=None):
+        self.devices = {}
+        self.groups = {}
+        for device in devices:
+            self.add(device)
+        for name, members in (groups or {}).items():
+            self.add_group(name, members)
+
+    @classmethod
+    def load(cls, path: str) -> "DeviceRegistry":
+        with open(path, "r", encoding="utf-8") as config:
+            data = json.load(config)
+        devices = [Device(entry["name"], entry["port"], int(entry["slave_id"]), entry["model"])
+                   for entry in data.get("devices", [])]
+        return cls(devices, data.get("groups", {}))
+
+    def add(self, device: Device) -> None:
+        if not 1 <= device.slave_id <= 247:
+            raise ValueError(f"Endereço Modbus inválido para {device.name}: {device.slave_id}")
+        if device.model not in actuators_data:
+            raise ValueError(f"Modelo desconhecido para {device.name}: {device.model}")
+        self.devices[device.name] = device
+
+    def add_group(self, name: str, members) -> None:
+        unknown = [member for member in members if member not in self.devices]
+        if unknown:
+            raise ValueError(f"Grupo {name}: dispositivos desconhecidos {', '.join(unknown)}")
+        self.groups[name] = list(members)
+
+    def group(self, name: str):
+        """Devices of a group, in definition order."""
+        if name == self.ALL:
+            return list(self.devices.values())
+        if name not in self.groups:
+            raise KeyError(f"Grupo desconhecido: {name}")
+        return [self.devices[member] for member in self.groups[name]]
+
+    def on_port(self, port: str):
+        return [device for device in self.devices.values() if device.port == port]
@@ -0,0 +1,84 @@
+import struct
+
+from modbus_frames import append_crc, check_crc
+
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_ADDRESS = 0x02
+ILLEGAL_DATA_VALUE = 0x03
+
+
+class FakeSlave:
+    """In-memory Modbus RTU slave answering requests from a register map.
+
+    Used to replay captures and exercise the stack without hardware.
+    """
+
+    def __init__(self, slave_ids=(1,), registers=None, coils=None, size: int = 0x10000):
+        self.slave_ids = set(slave_ids)
+        self.size = size
+        self.registers = dict(registers or {})
+        self.coils = dict(coils or {})
+        self.requests = 0
+
+    def _exception(self, slave: int, function: int, code: int) -> bytes:
+        return append_crc(bytes([slave, function | 0x80, code]))
+
+    def _read_words(self, start, quantity):
+        return b"".join(struct.pack(">H", self.registers.get(start + i, 0)) for i in range(quantity))
+
+    def handle(self, frame: bytes):
+        """Return the response frame for `frame`, or None when the slave stays silent."""
+        if not check_crc(frame):
+            return None  # Frame corrompido: o escravo não responde
+        slave, function, body = frame[0], frame[1], frame[2:-2]
+        if slave != 0 and slave not in self.slave_ids:
+            return None
+        self.requests += 1
+
+        response = self._process(slave, function, body)
+        if slave == 0:
+            return None  # Broadcast nunca é respondido
+        return response
+
+    def _process(self, slave, function, body):
+        if function in (0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x10) and len(body) < 4:
+            return self._exception(slave, function, ILLEGAL_DATA_VALUE)  # Corpo truncado
+
+        if function in (0x01, 0x02, 0x03, 0x04):
+            start, quantity = struct.unpack(">HH", body[:4])
+            if not 1 <= quantity <= (2000 if function <= 0x02 else 125):
+                return self._exception(slave, function, ILLEGAL_DATA_VALUE)
+            if start + quantity > self.size:
+                return self._exception(slave, function, ILLEGAL_DATA_ADDRESS)
+            if function <= 0x02:
+                bits = [self.coils.get(start + i, 0) for i in range(quantity)]
+                payload = bytes(sum(bit << n for n, bit in enumerate(bits[i:i + 8])) for i in range(0, quantity, 8))
+            else:
+                payload = self._read_words(start, quantity)
+            return append_crc(bytes([slave, function, len(payload)]) + payload)
+
+        if function == 0x05:
+            address, value = struct.unpack(">HH", body[:4])
+            if value not in (0x0000, 0xFF00):
+                return self._exception(slave, function, ILLEGAL_DATA_VALUE)
+            self.coils[address] = 1 if value else 0
+            return append_crc(bytes([slave, function]) + body[:4])
+
+        if function == 0x06:
+            address, value = struct.unpack(">HH", body[:4])
+            self.registers[address] = value
+            return append_crc(bytes([slave, function]) + body[:4])
+
+        if function == 0x10:
+            start, quantity = struct.unpack(">HH", body[:4])
+            # Quantidade, contagem de bytes e dados precisam concordar
+            if not 1 <= quantity <= 123 or len(body) != 5 + 2 * quantity or body[4] != 2 * quantity:
+                return self._exception(slave, function, ILLEGAL_DATA_VALUE)
+            if start + quantity > self.size:
+                return self._exception(slave, function, ILLEGAL_DATA_ADDRESS)
+            values = struct.unpack(f">{quantity}H", body[5:5 + 2 * quantity])
+            for offset, value in enumerate(values):
+                self.registers[start + offset] = value
+            return append_crc(bytes([slave, function]) + body[:4])
+
+        return self._exception(slave, function, ILLEGAL_FUNCTION)
@@ -0,0 +1,115 @@
+import threading
+import time
+from dataclasses import dataclass, field
+
+from actuator_data import actuators_data
+
+# Situação de cada dispositivo após um comando de grupo
+CONFIRMED = "confirmed"   # Eco da escrita ou leitura de verificação com o valor comandado
+MISMATCH = "mismatch"     # Respondeu, mas com outro valor (ou exceção)
+NO_ANSWER = "no_answer"   # Sem resposta válida (ou dispositivo offline)
+UNVERIFIED = "unverified"  # Broadcast sem leitura de verificação
+
+
+@dataclass
+class GroupResult:
+    """Outcome of a group command."""
+    command: str
+    duration: float = 0.0
+    broadcast_ports: list = field(default_factory=list)
+    status: dict = field(default_factory=dict)  # nome do dispositivo -> CONFIRMED/MISMATCH/NO_ANSWER
+
+    @property
+    def ok(self) -> bool:
+        return all(status == CONFIRMED for status in self.status.values())
+
+    @property
+    def failed(self):
+        return [name for name, status in self.status.items() if status != CONFIRMED]
+
+    def summary(self) -> str:
+        confirmed = len(self.status) - len(self.failed)
+        text = f"{self.command}: {confirmed}/{len(self.status)} confirmados em {self.duration * 1000:.0f} ms"
+        if self.failed:
+            text += f" (falha: {', '.join(self.failed)})"
+        return text
+
+
+class GroupCommander:
+    """Write the same command to a group of devices as fast as the buses allow.
+
+    Buses are driven in parallel, one thread per port. On a port where every known
+    device is in the group and gets the same register/value, the write is a single
+    broadcast (slave 0) followed by a read-back sweep; otherwise each device gets a
+    unicast write, and only devices whose echo was missing are read back.
+    """
+
+    def __init__(self, protocol, registry, allow_broadcast: bool = True):
+        self.protocol = protocol
+        self.registry = registry
+        self.allow_broadcast = allow_broadcast
+
+    def open(self, group: str, **options) -> GroupResult:
+        return self.write(group, "data_open", **options)
+
+    def close(self, group: str, **options) -> GroupResult:
+        return self.write(group, "data_close", **options)
+
+    def write(self, group: str, command: str, verify: bool = True, force: bool = True) -> GroupResult:
+        """Write actuators_data[model][command] to every device of `group`.
+
+        `force` bypasses the redundant-write suppression: a group command usually
+        means "make sure", e.g. an emergency close.
+        """
+        started = time.monotonic()
+        result = GroupResult(f"{command} {group}")
+
+        by_port = {}
+        for device in self.registry.group(group):
+            model = actuators_data[device.model]
+            by_port.setdefault(device.port, []).append((device, model["address"], model[command]))
+
+        threads = [threading.Thread(target=self._run_port, args=(port, writes, result, verify, force),
+                                    name=f"group-{port}", daemon=True)
+                   for port, writes in by_port.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        result.duration = time.monotonic() - started
+        return result
+
+    def _can_broadcast(self, port: str, writes) -> bool:
+        if not self.allow_broadcast or len(writes) < 2:
+            return False
+        if len({(address, value) for _, address, value in writes}) != 1:
+            return False
+        # Um broadcast atinge todos os escravos da porta, não só os do grupo
+        targets = {device.slave_id for device, _, _ in writes}
+        return all(device.slave_id in targets for device in self.registry.on_port(port))
+
+    def _run_port(self, port: str, writes, result: GroupResult, verify: bool, force: bool) -> None:
+        pending = []
+        if self._can_broadcast(port, writes):
+            _, address, value = writes[0]
+            self.protocol.exchange(port, 0, 0x06, address, value)
+            result.broadcast_ports.append(port)
+            pending = writes
+        else:
+            for device, address, value in writes:
+                self.protocol.exchange(port, device.slave_id, 0x06, address, value, force=force)
+                if self.protocol.writes.last_confirmed(port, device.slave_id, 0x06, address) == value:
+                    result.status[device.name] = CONFIRMED
+                else:
+                    pending.append((device, address, value))
+
+        for device, address, value in pending:
+            if not verify:
+                result.status[device.name] = UNVERIFIED
+                continue
+            values = self.protocol.read_registers(port, device.slave_id, address, 1, max_age=0)
+            if not values:
+                result.status[device.name] = NO_ANSWER
+            else:
+                result.status[device.name] = CONFIRMED if values[0] == value else MISMATCH
@@ -0,0 +1,181 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Janela (em segundos) das taxas calculadas: transações/s e utilização do barramento
+RATE_WINDOW = 10
+
+
+class _RateWindow:
+    """Per-second buckets over the last RATE_WINDOW seconds."""
+
+    __slots__ = ("buckets",)
+
+    def __init__(self):
+        self.buckets = {}
+
+    def add(self, now: float, amount: float) -> None:
+        second = int(now)
+        self.buckets[second] = self.buckets.get(second, 0) + amount
+        if len(self.buckets) > RATE_WINDOW + 1:
+            for old in [s for s in self.buckets if s <= second - RATE_WINDOW]:
+                del self.buckets[old]
+
+    def rate(self, now: float) -> float:
+        start = int(now) - RATE_WINDOW
+        return sum(amount for second, amount in self.buckets.items() if second > start) / RATE_WINDOW
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class BusMetrics:
+    """Counters for the Modbus traffic, rendered in the Prometheus text format.
+
+    Used as a transaction listener: each transaction costs a handful of dict
+    increments under one lock, cheap enough to leave enabled in production.
+    """
+
+    def __init__(self, protocol=None):
+        self.protocol = protocol
+        self._lock = threading.Lock()
+        self._transactions = {}   # (port, device, function) -> count
+        self._timeouts = {}       # (port, device) -> count
+        self._crc_errors = {}     # (port, device) -> count
+        self._exceptions = {}     # (port, device, code) -> count
+        self._errors = {}         # (port, device) -> count
+        self._retries = {}        # (port, device) -> count
+        self._last_seen = {}      # (port, device) -> time.time()
+        self._tx_rate = {}        # port -> _RateWindow
+        self._bus_bits = {}       # port -> _RateWindow
+        self._gauges = []         # (name, help, callback -> {labels tuple: value})
+
+    @staticmethod
+    def _inc(counters: dict, key, amount: int = 1) -> None:
+        counters[key] = counters.get(key, 0) + amount
+
+    def __call__(self, transaction) -> None:
+        """Listener for ModbusProtocol.add_transaction_listener."""
+        now = time.time()
+        port, device = transaction.port, transaction.device_id
+        response = transaction.response or b""
+        bits_per_char = self.protocol.bits_per_char if self.protocol is not None else 11
+
+        with self._lock:
+            self._inc(self._transactions, (port, device, transaction.function))
+            window = self._tx_rate.get(port)
+            if window is None:
+                window = self._tx_rate[port] = _RateWindow()
+                self._bus_bits[port] = _RateWindow()
+            window.add(now, 1)
+            self._bus_bits[port].add(now, (len(transaction.request) + len(response)) * bits_per_char)
+
+            if transaction.error:
+                self._inc(self._errors, (port, device))
+            elif not response:
+                if device != 0:  # Broadcast não tem resposta
+                    self._inc(self._timeouts, (port, device))
+            elif transaction.crc_ok is False:
+                self._inc(self._crc_errors, (port, device))
+            else:
+                self._last_seen[(port, device)] = now
+                if transaction.exception_code is not None:
+                    self._inc(self._exceptions, (port, device, transaction.exception_code))
+
+    def count_retry(self, port, device_id) -> None:
+        with self._lock:
+            self._inc(self._retries, (port, device_id))
+
+    def add_gauge(self, name: str, help_text: str, callback) -> None:
+        """Register a gauge computed on scrape; `callback()` returns {(label, value) pairs: number}."""
+        self._gauges.append((name, help_text, callback))
+
+    def render(self) -> str:
+        """Current metrics in the Prometheus text exposition format (version 0.0.4)."""
+        now = time.time()
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(**labels)} {value}")
+
+        with self._lock:
+            family("modbus_transactions_total", "counter", "Transações Modbus enviadas.",
+                   [({"port": p, "device": d, "function": f}, v) for (p, d, f), v in self._transactions.items()])
+            family("modbus_timeouts_total", "counter", "Transações sem resposta do dispositivo.",
+                   [({"port": p, "device": d}, v) for (p, d), v in self._timeouts.items()])
+            family("modbus_crc_errors_total", "counter", "Respostas com CRC inválido.",
+                   [({"port": p, "device": d}, v) for (p, d), v in self._crc_errors.items()])
+            family("modbus_exception_responses_total", "counter", "Respostas de exceção Modbus.",
+                   [({"port": p, "device": d, "code": c}, v) for (p, d, c), v in self._exceptions.items()])
+            family("modbus_errors_total", "counter", "Falhas de comunicação (porta, E/S).",
+                   [({"port": p, "device": d}, v) for (p, d), v in self._errors.items()])
+            family("modbus_retries_total", "counter", "Retransmissões de requisições.",
+                   [({"port": p, "device": d}, v) for (p, d), v in self._retries.items()])
+            family("modbus_transactions_per_second", "gauge",
+                   f"Transações por segundo (média de {RATE_WINDOW} s).",
+                   [({"port": p}, round(w.rate(now), 3)) for p, w in self._tx_rate.items()])
+            if self.protocol is not None:
+                baudrate = self.protocol.baudrate
+                family("modbus_bus_utilization_percent", "gauge",
+                       f"Ocupação do barramento (média de {RATE_WINDOW} s).",
+                       [({"port": p}, round(100 * w.rate(now) / baudrate, 2)) for p, w in self._bus_bits.items()])
+            family("modbus_device_last_seen_seconds", "gauge", "Segundos desde a última resposta válida.",
+                   [({"port": p, "device": d}, round(now - t, 3)) for (p, d), t in self._last_seen.items()])
+
+        if self.protocol is not None:
+            family("modbus_queue_depth", "gauge", "Requisições aguardando a porta serial.",
+                   [({"port": p}, v) for p, v in list(self.protocol.pending_requests.items())])
+
+        for name, help_text, callback in self._gauges:
+            try:
+                family(name, "gauge", help_text, [(dict(labels), value) for labels, value in callback().items()])
+            except Exception:
+                continue
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Optional HTTP endpoint serving BusMetrics.render() at /metrics."""
+
+    def __init__(self, metrics: BusMetrics, host: str = "127.0.0.1", port: int = 9108):
+        self.metrics = metrics
+        metrics_ref = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics_ref.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Sem log por requisição de scrape
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+
+    @property
+    def address(self):
+        return self.server.server_address
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,54 +1,61 @@
+import os
+import time
+
 import flet as ft
-from modbus_protocol import ModbusProtocol
+from actuator_tab import ActuatorTab
+from backend import Backend, get_backend
+from dashboard_view import DeviceDashboard
+from device_health import DeviceOfflineError
+from modbus_frames import decode_register_values, exception_code, exception_name
 from actuator_data import actuators_data
+from data_export import ExportWorker
+from poller import PollTag
+from modbus_logging import setup_logging
+from trend_view import TrendChart, TrendUpdater
 
 
-class Actuator(ModbusProtocol):
-    def __init__(self, atuador_id: int = 1, default_port: str = "COM5"):
-        super().__init__(atuador_id)
-        self.default_port = default_port
-        self.device_id = 1  # Default device ID
-
-    def open_valve(self, actuator_name: str) -> None:
-        """Open the valve completely for the specified actuator."""
-        if actuator_name in actuators_data:
-            self.sendRequest(
-                port=self.default_port,
-                device_id=self.device_id,
-                function=0x06,
-                address=actuators_data[actuator_name]["address"],
-                data=actuators_data[actuator_name]["data_open"]
-            )
-
-    def close_valve(self, actuator_name: str) -> None:
-        """Close the valve completely for the specified actuator."""
-        if actuator_name in actuators_data:
-            self.sendRequest(
-                port=self.default_port,
-                device_id=self.device_id,
-                function=0x06,
-                address=actuators_data[actuator_name]["address"],
-                data=actuators_data[actuator_name]["data_close"]
-            )
-
-    def send_custom_request(self, device_id: int, function: int, address: int, data: int) -> None:
-        """Send a custom request with the provided parameters."""
-        self.sendRequest(
-            port=self.default_port,
-            device_id=device_id,
-            function=function,
-            address=address,
-            data=data
-        )
+# (rótulo da aba, modelo em actuators_data)
+ACTUATOR_TABS = [
+    ("Grey-M Smart", "Grey-M Multivoltas"),
+    ("Grey-Q Evolution", "Grey-Q Evolution"),
+    ("White-E Evolution", "White-E Evolution"),
+    ("Módulo TOP-E", "TOP-E Module"),
+]
 
 
 class ModbusApp:
-    def __init__(self, page: ft.Page):
+    def __init__(self, page: ft.Page, backend: Backend = None):
         self.page = page
-        self.actuator = Actuator()
+        # Barramentos, poller e gravadores são do processo; cada sessão só tem a sua interface
+        self.backend = backend or get_backend()
+        self.actuator = self.backend.actuator
+        self.recorder = self.backend.recorder
+        self.chunk_writer = self.backend.chunk_writer
+        self.capture_writer = self.backend.capture_writer
+        self.metrics = self.backend.metrics
+        self.devices = self.backend.devices
+        self.device_table = self.backend.device_table
+        self.received_data = None  # Última resposta de um comando desta sessão
+        self.export_worker = None
+        self.actuator_tabs = {}
+        self.polling_reasons = set()  # "trends" (chave do monitoramento) e/ou "dashboard" (aba Painel visível)
         self.setup_page()
         self.create_ui_components()
+        self.create_poller()
         self.assemble_ui()
+        # Depois de montar a página: a inscrição já reenvia o estado atual dos dispositivos
+        self.listeners = {"on_sample": self.handle_sample, "on_state": self.update_status_indicators,
+                          "on_sync_status": self.update_sync_status, "on_frames": self.handle_sniffed_frames,
+                          "on_sniffer_error": self.handle_sniffer_error}
+        self.backend.subscribe(self, **self.listeners)
+        self.page.on_disconnect = self.close
+
+    def close(self, e=None) -> None:
+        """Session ended: stop receiving updates, release this session's polling request and cancel its export."""
+        self.backend.unsubscribe(self, **self.listeners)
+        self.trend_updater.stop()
+        if self.export_worker is not None:
+            self.export_worker.cancel()
 
     def setup_page(self) -> None:
         """Configure basic page properties."""
@@ -72,181 +79,113 @@ class ModbusApp:
             on_click=self.handle_send_custom_request
         )
 
-        # Create tabs for each actuator type
+        # Create export controls
+        self.export_csv_button = ft.ElevatedButton(
+            text="Exportar CSV",
+            icon=ft.Icons.TABLE_VIEW,
+            on_click=lambda e: self.handle_export("csv")
+        )
+        self.export_xlsx_button = ft.ElevatedButton(
+            text="Exportar Excel",
+            icon=ft.Icons.GRID_ON,
+            on_click=lambda e: self.handle_export("xlsx")
+        )
+        self.export_kind = ft.Dropdown(
+            width=200,
+            value="traffic",
+            options=[
+                ft.dropdown.Option("traffic", "Comandos e respostas"),
+                ft.dropdown.Option("readings", "Leituras"),
+            ]
+        )
+        self.export_cancel_button = ft.TextButton(
+            text="Cancelar",
+            icon=ft.Icons.CANCEL,
+            visible=False,
+            on_click=self.handle_cancel_export
+        )
+        self.export_progress = ft.ProgressBar(width=400, visible=False)
+        self.export_status = ft.Text(value="", size=12, color=ft.Colors.GREY_700)
+
+        # Create cloud sync controls
+        self.sync_folder_field = ft.TextField(label="Pasta do Google Drive", width=380)
+        self.sync_button = ft.ElevatedButton(
+            text="Sincronizar",
+            icon=ft.Icons.CLOUD_UPLOAD,
+            on_click=self.handle_sync
+        )
+        self.sync_status = ft.Text(value="", size=12, color=ft.Colors.GREY_700)
+
+        # Create tabs for each actuator type; their contents are built on first selection
+        actuator_tabs = []
+        state = self.actuator.health.state(self.actuator.default_port, self.actuator.device_id)
+        for label, actuator_name in ACTUATOR_TABS:
+            self.actuator_tabs[actuator_name] = ActuatorTab(
+                actuator_name, self.handle_open_valve, self.handle_close_valve, self.set_valve_position, state)
+            actuator_tabs.append(ft.Tab(text=label, content=ft.Container()))
+
         self.tabs = ft.Tabs(
             selected_index=0,
             animation_duration=300,
+            on_change=self.handle_tab_change,
             tabs=[
-                ft.Tab(text="Grey-M Smart", content=self.create_actuator_tab("Grey-M Multivoltas")),
-                ft.Tab(text="Grey-Q Evolution", content=self.create_actuator_tab("Grey-Q Evolution")),
-                ft.Tab(text="White-E Evolution", content=self.create_actuator_tab("White-E Evolution")),
-                ft.Tab(text="Módulo TOP-E", content=self.create_actuator_tab("TOP-E Module")),
+                *actuator_tabs,
+                ft.Tab(text="Painel", content=self.create_dashboard_tab()),
                 ft.Tab(text="Mensagem Modbus", content=self.create_protocol_tab()),
+                ft.Tab(text="Tendências", content=self.create_trend_tab()),
+                ft.Tab(text="Monitor RS-485", content=self.create_sniffer_tab()),
+                ft.Tab(text="Diagnóstico", content=self.create_diagnostics_tab()),
             ],
             expand=2
         )
-
-    def create_actuator_tab(self, actuator_name: str) -> ft.Container:
-        """Create a tab for a specific actuator type with improved styling."""
-        # Create a more stylized TOP-E Module tab
-        valve_position_slider = ft.Slider(
-            min=0,
-            max=100,
-            divisions=10,
-            label="{value}%",
-            value=0,
-            width=300,
-            on_change=lambda e: self.update_slider_value(e.data)
-        )
-
-        self.position_value_text = ft.Text(
-            value="0%",
-            size=16,
-            weight=ft.FontWeight.BOLD,
-            color=ft.Colors.BLUE
-        )
-
-        # Corrigido: text_align movido para o Text, não para o Container
-        status_indicator = ft.Container(
-            content=ft.Text("STATUS: Desconectado", color=ft.Colors.WHITE, text_align=ft.TextAlign.CENTER),
-            bgcolor=ft.Colors.RED_400,
-            border_radius=4,
-            padding=8,
-            width=200
-        )
-
-        # Create controls with improved styling
-        return ft.Container(
-            content=ft.Column([
-                # Header with logo and status
-                ft.Container(
-                    content=ft.Row([
-                        ft.Icon(ft.Icons.DEVICE_HUB, size=36, color=ft.Colors.BLUE),
-                        ft.Column([
-                            ft.Text(f"{actuator_name} Controller", size=20, weight=ft.FontWeight.BOLD),
-                            ft.Text(f"Controlador para módulo {actuator_name}", size=14, color=ft.Colors.GREY_700)
-                        ]),
-                        status_indicator
-                    ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
-                    padding=10,
-                    bgcolor=ft.Colors.BLUE_50,
-                    border_radius=8,
-                    border=ft.border.all(1, ft.Colors.BLUE_200),
-                ),
-
-                # Divider
-                ft.Divider(height=1, color=ft.Colors.BLUE_100),
-
-                # Main controls section
-                ft.Container(
-                    content=ft.Column([
-                        ft.Text("Controle de Posição da Válvula", size=16, weight=ft.FontWeight.W_500),
-
-                        # Position control with slider
-                        ft.Container(
-                            content=ft.Column([
-                                ft.Row([
-                                    ft.Text("Posição Atual:", size=14),
-                                    self.position_value_text
-                                ]),
-                                ft.Row([
-                                    ft.Icon(ft.Icons.CLOSE, color=ft.Colors.RED),
-                                    valve_position_slider,
-                                    ft.Icon(ft.Icons.CHECK_CIRCLE, color=ft.Colors.GREEN)
-                                ], alignment=ft.MainAxisAlignment.CENTER,
-                                    vertical_alignment=ft.CrossAxisAlignment.CENTER),
-                            ]),
-                            padding=15,
-                            border=ft.border.all(1, ft.Colors.GREY_300),
-                            border_radius=8,
-                            bgcolor=ft.Colors.WHITE,
-                            margin=10
-                        ),
-
-                        # Quick action buttons
-                        ft.Row([
-                            ft.ElevatedButton(
-                                text="Fechar Totalmente",
-                                icon=ft.Icons.CLOSE,
-                                on_click=lambda e: self.handle_close_valve(actuator_name),
-                                bgcolor=ft.Colors.RED_400,
-                                color=ft.Colors.WHITE,
-                                style=ft.ButtonStyle(
-                                    shape=ft.RoundedRectangleBorder(radius=8)
-                                ),
-                            ),
-                            ft.ElevatedButton(
-                                text="Posição 50%",
-                                icon=ft.Icons.TUNE,
-                                on_click=lambda e: self.set_valve_position(50),
-                                bgcolor=ft.Colors.AMBER_400,
-                                color=ft.Colors.WHITE,
-                                style=ft.ButtonStyle(
-                                    shape=ft.RoundedRectangleBorder(radius=8)
-                                ),
-                            ),
-                            ft.ElevatedButton(
-                                text="Abrir Totalmente",
-                                icon=ft.Icons.CHECK_CIRCLE,
-                                on_click=lambda e: self.handle_open_valve(actuator_name),
-                                bgcolor=ft.Colors.GREEN_400,
-                                color=ft.Colors.WHITE,
-                                style=ft.ButtonStyle(
-                                    shape=ft.RoundedRectangleBorder(radius=8)
-                                ),
-                            ),
-                        ], alignment=ft.MainAxisAlignment.SPACE_AROUND),
-                    ], spacing=15, horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                    padding=20,
-                ),
-
-                # Status and information section
-                ft.Container(
-                    content=ft.Column([
-                        ft.Text("Informações do Dispositivo", weight=ft.FontWeight.BOLD),
-                        ft.Row([
-                            ft.Text("ID do Dispositivo: 1", size=14),
-                            ft.Text("Endereço: 5", size=14),
-                            ft.Text("Status: Operacional", size=14),
-                        ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
-                    ]),
-                    padding=10,
-                    border=ft.border.all(1, ft.Colors.GREY_300),
-                    border_radius=8,
-                    bgcolor=ft.Colors.GREY_50,
-                )
-            ], spacing=15, horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-            padding=20,
-            bgcolor=ft.Colors.WHITE,
-        )
-
-    def update_slider_value(self, value):
-        """Update the position value text based on slider movement."""
-        position = int(float(value))
-        self.position_value_text.value = f"{position}%"
-        # Send the corresponding Modbus command if needed
-        # This would translate the percentage to the appropriate Modbus data value
-        self.page.update()
-
-    def set_valve_position(self, position_percent):
+        self.build_tab(0)
+
+    def build_tab(self, index: int) -> bool:
+        """Build an actuator tab's controls the first time it is shown; True if it was built now."""
+        if index >= len(ACTUATOR_TABS):
+            return False
+        controller = self.actuator_tabs[ACTUATOR_TABS[index][1]]
+        if controller.built:
+            return False
+        self.tabs.tabs[index].content = controller.build()
+        return True
+
+    def handle_tab_change(self, e) -> None:
+        # O painel lê os dispositivos enquanto está visível, mesmo com o monitoramento das tendências desligado
+        self.set_polling_reason("dashboard", self.tabs.selected_index == len(ACTUATOR_TABS))
+        if self.build_tab(self.tabs.selected_index):
+            self.tabs.update()
+
+    def set_valve_position(self, tab: ActuatorTab, position_percent):
         """Set the valve to a specific position percentage."""
         # Calculate the corresponding Modbus data value based on percentage
         # This is a simplified example - real implementation would depend on the actuator specs
         data_value = int((position_percent / 100) * 65535)  # Assuming 16-bit register
 
         # Send the Modbus command to set position
-        self.actuator.send_custom_request(
-            device_id=1,
-            function=6,  # Write Single Register
-            address=actuators_data["TOP-E Module"]["address"] if "TOP-E Module" in actuators_data else 5,
-            # Use default address if not defined
-            data=data_value
-        )
+        try:
+            self.received_data = self.send_command(
+                self.actuator.send_custom_request,
+                device_id=1,
+                function=6,  # Write Single Register
+                address=actuators_data["TOP-E Module"]["address"] if "TOP-E Module" in actuators_data else 5,
+                # Use default address if not defined
+                data=data_value,
+                force=True
+            )
+        except DeviceOfflineError as error:
+            self.update_response(str(error))
+            return
 
         # Update the UI to reflect the change
-        self.position_value_text.value = f"{position_percent}%"
+        # A posição é enviada junto com a atualização da resposta
+        tab.set_position(position_percent)
         self.update_response(f"Válvula TOP-E ajustada para {position_percent}%")
-        self.page.update()
+
+    def create_dashboard_tab(self) -> ft.Container:
+        """Create the tab listing every configured device."""
+        self.dashboard = DeviceDashboard(self.device_table)
+        return self.dashboard.control
 
     def create_protocol_tab(self) -> ft.Container:
         """Create the tab for custom Modbus protocol messages."""
@@ -300,24 +239,255 @@ class ModbusApp:
                     bgcolor=ft.Colors.WHITE,
                 ),
                 self.response_container,
+                ft.Container(
+                    content=ft.Column([
+                        ft.Text("Exportar Dados Registrados", size=16, weight=ft.FontWeight.BOLD),
+                        ft.Row([
+                            self.export_kind,
+                            self.export_csv_button,
+                            self.export_xlsx_button,
+                            self.export_cancel_button,
+                        ], alignment=ft.MainAxisAlignment.CENTER),
+                        self.export_progress,
+                        self.export_status,
+                    ], spacing=10, horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                    padding=10,
+                    border=ft.border.all(1, ft.Colors.GREY_300),
+                    border_radius=8,
+                    width=600,
+                ),
+                ft.Container(
+                    content=ft.Column([
+                        ft.Text("Sincronização com a Nuvem", size=16, weight=ft.FontWeight.BOLD),
+                        ft.Row([
+                            self.sync_folder_field,
+                            self.sync_button,
+                        ], alignment=ft.MainAxisAlignment.CENTER),
+                        self.sync_status,
+                    ], spacing=10, horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                    padding=10,
+                    border=ft.border.all(1, ft.Colors.GREY_300),
+                    border_radius=8,
+                    width=600,
+                ),
             ], spacing=15, horizontal_alignment=ft.CrossAxisAlignment.CENTER),
             padding=20
         )
 
+    def create_trend_tab(self) -> ft.Container:
+        """Create the tab with live position and torque trends of the actuator polled at the default address."""
+        self.trend_charts = {}
+        rows = []
+        for actuator_name in self.backend.trend_models:
+            position_chart = TrendChart(f"{actuator_name} - Posição", color=ft.Colors.BLUE)
+            torque_chart = TrendChart(f"{actuator_name} - Torque", color=ft.Colors.ORANGE)
+            self.trend_charts[(actuator_name, "position")] = position_chart
+            self.trend_charts[(actuator_name, "torque")] = torque_chart
+            rows.append(ft.Row([position_chart.control, torque_chart.control],
+                               alignment=ft.MainAxisAlignment.CENTER))
+        if not rows:
+            rows.append(ft.Text(f"Nenhum modelo com mapa de registradores cadastrado em "
+                                f"{self.actuator.default_port}, escravo {self.actuator.device_id}.",
+                                color=ft.Colors.GREY_600))
+
+        self.polling_switch = ft.Switch(label="Monitoramento ativo", value=False,
+                                        on_change=self.handle_toggle_polling)
+
+        return ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.Text("Tendências de Posição e Torque", size=18, weight=ft.FontWeight.BOLD),
+                    self.polling_switch,
+                ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                ft.Divider(height=2),
+                *rows,
+            ], spacing=10, scroll=ft.ScrollMode.AUTO),
+            padding=20
+        )
+
+    def create_sniffer_tab(self) -> ft.Container:
+        """Create the listen-only bus monitor tab."""
+        self.sniffer_port_field = ft.TextField(label="Porta", width=150, value=self.actuator.default_port)
+        self.sniffer_baud_field = ft.Dropdown(
+            label="Baudrate",
+            width=150,
+            value="9600",
+            options=[ft.dropdown.Option(str(baud)) for baud in (9600, 19200, 38400, 57600, 115200)]
+        )
+        running = self.backend.sniffer  # Outra sessão pode ter iniciado o monitor
+        self.sniffer_button = ft.ElevatedButton(
+            text="Parar Monitor" if running else "Iniciar Monitor",
+            icon=ft.Icons.HEARING,
+            on_click=self.handle_toggle_sniffer
+        )
+        self.sniffer_status = ft.Text(value=f"Escutando {running.port} (somente leitura)" if running
+                                      else "Monitor parado", size=12, color=ft.Colors.GREY_700)
+        self.sniffer_list = ft.ListView(height=420, spacing=2, auto_scroll=True)
+
+        return ft.Container(
+            content=ft.Column([
+                ft.Text("Monitor Passivo do Barramento RS-485", size=18, weight=ft.FontWeight.BOLD),
+                ft.Divider(height=2),
+                ft.Row([
+                    self.sniffer_port_field,
+                    self.sniffer_baud_field,
+                    self.sniffer_button,
+                ], alignment=ft.MainAxisAlignment.CENTER),
+                self.sniffer_status,
+                ft.Container(
+                    content=self.sniffer_list,
+                    padding=10,
+                    border=ft.border.all(1, ft.Colors.GREY_300),
+                    border_radius=8,
+                    bgcolor=ft.Colors.WHITE,
+                ),
+            ], spacing=10, horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+            padding=20
+        )
+
+    def handle_toggle_sniffer(self, e) -> None:
+        # O monitor é do backend: todas as sessões veem (e podem parar) o mesmo
+        if self.backend.sniffer is not None:
+            self.backend.stop_sniffer()
+            self.sniffer_button.text = "Iniciar Monitor"
+            self.sniffer_status.value = "Monitor parado"
+            self.page.update()
+            return
+
+        sniffer = self.backend.start_sniffer(self.sniffer_port_field.value, int(self.sniffer_baud_field.value))
+        self.sniffer_button.text = "Parar Monitor"
+        self.sniffer_status.value = f"Escutando {sniffer.port} (somente leitura)"
+        self.page.update()
+
+    def handle_sniffed_frames(self, frames) -> None:
+        """Called from the sniffer thread with a batch of frames."""
+        for timestamp_ns, frame, decoded in frames:
+            clock = time.strftime("%H:%M:%S", time.localtime(timestamp_ns / 1e9))
+            line = f"{clock}.{timestamp_ns // 1_000_000 % 1000:03d}  {frame.hex(' ').upper()}"
+            if decoded is not None:
+                self.sniffer_list.controls.append(ft.Text(f"{line}  |  {decoded.summary()}", size=12,
+                                                          color=ft.Colors.BLUE_900 if decoded.is_request
+                                                          else ft.Colors.GREEN_900))
+            else:
+                self.sniffer_list.controls.append(ft.Text(f"{line}  |  bytes inválidos", size=12,
+                                                          color=ft.Colors.RED))
+
+        # Mantém apenas as linhas mais recentes na tela; o histórico completo fica na captura
+        del self.sniffer_list.controls[:-500]
+
+        sniffer = self.backend.sniffer
+        splitter = sniffer.splitter if sniffer else None
+        if splitter is not None:
+            self.sniffer_status.value = (f"{splitter.valid_frames} frames válidos, "
+                                         f"{splitter.invalid_bytes} bytes inválidos")
+        self.page.update(self.sniffer_list, self.sniffer_status)
+
+    def handle_sniffer_error(self, error: Exception) -> None:
+        self.sniffer_status.value = f"Erro no monitor: {error}"
+        self.page.update(self.sniffer_status)
+
+    def create_diagnostics_tab(self) -> ft.Container:
+        """Create the tab showing per-stage latency statistics."""
+        self.diagnostics_table = ft.DataTable(
+            columns=[ft.DataColumn(ft.Text(label), numeric=numeric) for label, numeric in (
+                ("Porta", False), ("Dispositivo", True), ("Função", True), ("Etapa", False), ("N", True),
+                ("Média (ms)", True), ("p50", True), ("p90", True), ("p99", True), ("Máx", True))],
+            rows=[],
+        )
+
+        return ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.Text("Tempos por Etapa da Transação", size=18, weight=ft.FontWeight.BOLD),
+                    ft.Row([
+                        ft.ElevatedButton(text="Atualizar", icon=ft.Icons.REFRESH,
+                                          on_click=lambda e: self.refresh_diagnostics()),
+                        ft.ElevatedButton(text="Zerar", icon=ft.Icons.DELETE_SWEEP,
+                                          on_click=lambda e: self.reset_diagnostics()),
+                    ]),
+                ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                ft.Divider(height=2),
+                ft.Column([self.diagnostics_table], scroll=ft.ScrollMode.AUTO, expand=True),
+            ], spacing=10, expand=True),
+            padding=20
+        )
+
+    def refresh_diagnostics(self) -> None:
+        """Rebuild the diagnostics table from the timing histograms."""
+        def cell(value):
+            return ft.DataCell(ft.Text("-" if value is None else str(value)))
+
+        self.diagnostics_table.rows = [
+            ft.DataRow(cells=[
+                cell(row["port"]), cell(row["device_id"]), cell(row["function"]), cell(row["stage"]),
+                cell(row["count"]),
+                *(cell(f"{row[name]:.2f}") for name in ("mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms")),
+            ])
+            for row in self.actuator.timings.snapshot()
+        ]
+        self.page.update()
+
+    def reset_diagnostics(self) -> None:
+        self.actuator.timings.reset()
+        self.refresh_diagnostics()
+
+    def create_poller(self) -> None:
+        """Trend charts and dashboard are fed by the backend's shared poller.
+
+        The session asks for polling while the trend switch is on or the dashboard tab is shown.
+        """
+        self.trend_updater = TrendUpdater(self.page, [*self.trend_charts.values(), self.dashboard], max_rate=2.0)
+
+    def handle_sample(self, tag: PollTag, values, timestamp: float) -> None:
+        """Called from the poller threads for each tag read (the backend already updated the device table)."""
+        name, quantity = tag.name.rsplit("/", 1)
+        chart = self.trend_charts.get((name, quantity))
+        if chart is not None:
+            chart.add_sample(timestamp, values[0])
+
+    def handle_toggle_polling(self, e) -> None:
+        self.set_polling_reason("trends", bool(self.polling_switch.value))
+
+    def set_polling_reason(self, reason: str, active: bool) -> None:
+        if active == (reason in self.polling_reasons):
+            return
+        if active:
+            self.polling_reasons.add(reason)
+        else:
+            self.polling_reasons.discard(reason)
+        self.backend.set_polling(self, bool(self.polling_reasons))
+        if self.polling_reasons:
+            self.trend_updater.start()
+        else:
+            self.trend_updater.stop()
+
     def assemble_ui(self) -> None:
         """Add all UI components to the page."""
         self.page.add(self.tabs)
         self.page.update()
 
     # Event handlers
+    def send_command(self, command, /, *args, **kwargs):
+        """Run an Actuator command on its port's queue, shared with the other sessions; returns the response."""
+        return self.backend.run_command(self.actuator.default_port, command, *args, **kwargs)
+
     def handle_open_valve(self, actuator_name: str) -> None:
         """Handle open valve button click."""
-        self.actuator.open_valve(actuator_name)
+        try:
+            # Botões do operador sempre enviam: a válvula pode ter sido movida localmente
+            self.received_data = self.send_command(self.actuator.open_valve, actuator_name, force=True)
+        except DeviceOfflineError as error:
+            self.update_response(str(error))
+            return
         self.update_response(f"Comando para abrir válvula {actuator_name} enviado")
 
     def handle_close_valve(self, actuator_name: str) -> None:
         """Handle close valve button click."""
-        self.actuator.close_valve(actuator_name)
+        try:
+            self.received_data = self.send_command(self.actuator.close_valve, actuator_name, force=True)
+        except DeviceOfflineError as error:
+            self.update_response(str(error))
+            return
         self.update_response(f"Comando para fechar válvula {actuator_name} enviado")
 
     def handle_send_custom_request(self, e) -> None:
@@ -328,20 +498,35 @@ class ModbusApp:
             address = int(self.address_field.value)
             data = int(self.data_field.value)
 
-            self.actuator.send_custom_request(device_id, function, address, data)
+            # Requisições manuais são sempre enviadas, mesmo repetindo o último valor
+            self.received_data = self.send_command(self.actuator.send_custom_request, device_id, function, address,
+                                                   data, force=True)
             self.update_response(
                 f"Requisição enviada: Device={device_id}, Function={function}, Address={address}, Data={data}")
 
-        except ValueError as error:
-            self.update_response(f"Erro: Todos os campos devem ser números inteiros válidos")
+        except ValueError:
+            self.update_response("Erro: Todos os campos devem ser números inteiros válidos")
+        except DeviceOfflineError as error:
+            self.update_response(str(error))
+
+    def update_status_indicators(self, port: str, device_id: int, state: str) -> None:
+        """Reflect the device health in the actuator tabs (called from the I/O threads)."""
+        if (port, device_id) != (self.actuator.default_port, self.actuator.device_id):
+            return
+
+        changed = [control for control in (tab.set_state(state) for tab in self.actuator_tabs.values())
+                   if control is not None]
+        if changed:
+            self.page.update(*changed)
 
     def update_response(self, message: str) -> None:
         """Update the response text with formatted information and refresh the UI."""
+        started = time.perf_counter_ns()
         self.response_text.value = message
 
-        if hasattr(self.actuator, 'received_data') and self.actuator.received_data:
+        if self.received_data:
             # Format received data more clearly
-            raw_data = self.actuator.received_data
+            raw_data = self.received_data
 
             if isinstance(raw_data, bytes) or isinstance(raw_data, list):
                 # Format bytes or list as hex
@@ -349,24 +534,95 @@ class ModbusApp:
                 self.response_text.value += f"\n\nDados Recebidos [HEX]: {formatted_data}"
 
                 # If it's a standard Modbus response with function code 3 or 4 (read registers)
-                if len(raw_data) > 3 and (raw_data[1] == 3 or raw_data[1] == 4):
-                    data_len = raw_data[2]  # Byte count
-                    if data_len > 0 and len(raw_data) >= 3 + data_len:
-                        data_bytes = raw_data[3:3 + data_len]
-                        # Parse registers (2 bytes per register)
-                        registers = []
-                        for i in range(0, len(data_bytes), 2):
-                            if i + 1 < len(data_bytes):
-                                reg_val = (data_bytes[i] << 8) + data_bytes[i + 1]
-                                registers.append(reg_val)
-
-                        if registers:
-                            reg_str = ", ".join([f"{r}" for r in registers])
-                            self.response_text.value += f"\nValores: {reg_str}"
+                code = exception_code(raw_data)
+                if code is not None:
+                    self.response_text.value += f"\nExceção Modbus {code:#04x}: {exception_name(code)}"
+
+                registers = decode_register_values(raw_data)
+                if registers:
+                    reg_str = ", ".join([f"{r}" for r in registers])
+                    self.response_text.value += f"\nValores: {reg_str}"
             else:
                 # For other response types
-                self.response_text.value += f"\n\nResposta: {self.actuator.received_data}"
+                self.response_text.value += f"\n\nResposta: {self.received_data}"
+
+        self.page.update()
+        self.actuator.timings.record(self.actuator.default_port, None, None, "ui",
+                                     time.perf_counter_ns() - started)
+
+    def handle_export(self, file_format: str) -> None:
+        """Start a background export of the recorded data."""
+        if self.export_worker is not None and self.export_worker.is_alive():
+            self.export_status.value = "Uma exportação já está em andamento"
+            self.page.update()
+            return
+
+        self.export_worker = ExportWorker(
+            self.recorder,
+            kind=self.export_kind.value,
+            file_format=file_format,
+            on_progress=self.update_export_progress,
+            on_done=self.finish_export,
+            on_error=self.fail_export,
+            on_cancel=self.cancelled_export,
+        )
+        self.export_csv_button.disabled = True
+        self.export_xlsx_button.disabled = True
+        self.export_cancel_button.visible = True
+        self.export_cancel_button.disabled = False
+        self.export_progress.visible = True
+        self.export_progress.value = None  # Indeterminado
+        self.export_status.value = "Exportando..."
+        self.page.update()
+        self.export_worker.start()
+
+    def update_export_progress(self, rows: int) -> None:
+        """Called from the export worker thread every few thousand rows."""
+        self.export_status.value = f"Exportando... {rows:,} linhas".replace(",", ".")
+        self.page.update()
+
+    def finish_export(self, destination: str, rows: int) -> None:
+        self.export_status.value = f"{rows:,} linhas exportadas para {destination}".replace(",", ".")
+        self.reset_export_controls()
+
+    def handle_cancel_export(self, e) -> None:
+        """Ask the export worker to stop; it reports back through cancelled_export."""
+        if self.export_worker is not None and self.export_worker.is_alive():
+            self.export_worker.cancel()
+            self.export_cancel_button.disabled = True
+            self.export_status.value = "Cancelando exportação..."
+            self.page.update()
+
+    def cancelled_export(self) -> None:
+        self.export_status.value = "Exportação cancelada"
+        self.reset_export_controls()
+
+    def fail_export(self, error: Exception) -> None:
+        self.export_status.value = f"Erro ao exportar: {error}"
+        self.reset_export_controls()
+
+    def reset_export_controls(self) -> None:
+        self.export_csv_button.disabled = False
+        self.export_xlsx_button.disabled = False
+        self.export_cancel_button.visible = False
+        self.export_progress.visible = False
+        self.page.update()
+
+    def handle_sync(self, e) -> None:
+        """Start the backend's sync engine (or trigger an immediate sync)."""
+        folder = (self.sync_folder_field.value or "").strip()
+        if not folder:
+            self.sync_status.value = "Informe a pasta sincronizada com o Google Drive"
+            self.page.update()
+            return
+
+        self.backend.sync(folder)  # Um sincronizador por processo: o checkpoint e os blocos são compartilhados
+        self.sync_status.value = "Sincronização em andamento..."
+        self.page.update()
 
+    def update_sync_status(self, message: str) -> None:
+        """Called from the sync worker thread."""
+        self.sync_status.value = message
         self.page.update()
 
 
@@ -375,4 +631,6 @@ def main(page: ft.Page):
 
 
 if __name__ == "__main__":
+    # MODBUS_LOG_LEVEL=DEBUG mostra os frames enviados e recebidos
+    setup_logging(os.environ.get("MODBUS_LOG_LEVEL", "INFO"), log_file=os.environ.get("MODBUS_LOG_FILE"))
     ft.app(main)
\ No newline at end of file
@@ -0,0 +1,454 @@
+"""Linha de comando sem interface gráfica (não importa o Flet).
+
+    python modbus_cli.py --port /dev/ttyUSB0 close "TOP-E Module"
+    python modbus_cli.py --port /dev/ttyUSB0 --slave 3 read 2 -n 2
+    python modbus_cli.py --port /dev/ttyUSB0 write 5 100
+    python modbus_cli.py --port /dev/ttyUSB0 scan --last 32
+    python modbus_cli.py --port /dev/ttyUSB0 poll 2 --interval 0.5
+    python modbus_cli.py --port /dev/ttyUSB0 --low-latency --rs485 --rts-delay-after 1 port-info
+    python modbus_cli.py close --group zona-a --devices devices.json
+    python modbus_cli.py daemon --devices devices.json --metrics-port 9108
+    python modbus_cli.py run-recipe ciclo.json --devices devices.json
+    python modbus_cli.py daemon --devices devices.json --process-image modbus_image
+    python modbus_cli.py --port /dev/ttyUSB0 gateway --tcp-port 5020
+    python modbus_cli.py api --devices devices.json --http-port 8080
+
+Os módulos pesados (poller, métricas, grupos) só são importados pelo comando que os usa.
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+
+from actuator import Actuator
+from actuator_data import actuators_data
+from modbus_frames import check_crc, decode_register_values, exception_code, exception_name
+from modbus_logging import get_logger, setup_logging, stop_logging
+
+
+def _number(text: str) -> int:
+    """Integer in decimal or with a 0x/0o/0b prefix."""
+    return int(text, 0)
+
+
+def _word(text: str) -> int:
+    """Register address or value: an integer in 0-0xFFFF (the frame only carries 16 bits)."""
+    value = _number(text)
+    if not 0 <= value <= 0xFFFF:
+        raise argparse.ArgumentTypeError(f"{text} fora da faixa 0-65535")
+    return value
+
+
+def _actuator(args) -> Actuator:
+    actuator = Actuator(args.slave, args.port, baudrate=args.baudrate, parity=args.parity)
+    actuator.device_id = args.slave
+    if args.timeout is not None:
+        actuator.timeouts.initial_timeout = args.timeout
+        actuator.timeouts.max_timeout = args.timeout
+    tuning = actuator.tuning
+    tuning.low_latency, tuning.latency_timer = args.low_latency, args.latency_timer
+    tuning.rs485, tuning.delay_before, tuning.delay_after = args.rs485, args.rts_delay_before, args.rts_delay_after
+    tuning.rts_on_send, tuning.rx_during_tx = args.rts_on_send == "high", args.rx_during_tx
+    return actuator
+
+
+def _check_response(actuator, response) -> int:
+    """Report a missing or exception response on stderr; returns the exit status."""
+    if not response:
+        print(f"Sem resposta do dispositivo {actuator.device_id} em {actuator.default_port}", file=sys.stderr)
+        return 1
+    code = exception_code(response)
+    if code is not None:
+        print(f"Exceção Modbus {code:#04x}: {exception_name(code)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _registry(args):
+    from devices import DeviceRegistry
+    if not args.devices:
+        raise SystemExit("--devices é obrigatório com --group e no modo daemon")
+    return DeviceRegistry.load(args.devices)
+
+
+def cmd_valve(args) -> int:
+    command = "data_open" if args.command == "open" else "data_close"
+    actuator = _actuator(args)
+    if args.group:
+        from group_commands import GroupCommander
+        result = GroupCommander(actuator, _registry(args)).write(args.group, command)
+        print(result.summary())
+        return 0 if result.ok else 1
+
+    if args.model not in actuators_data:
+        print(f"Modelo desconhecido: {args.model} (opções: {', '.join(actuators_data)})", file=sys.stderr)
+        return 2
+    model = actuators_data[args.model]
+    response = actuator.sendRequest(args.port, args.slave, 0x06, model["address"], model[command],
+                                    force=args.force)
+    return _check_response(actuator, response)
+
+
+def cmd_read(args) -> int:
+    if not 1 <= args.count <= 125 or args.address + args.count > 0x10000:
+        print(f"Faixa inválida: {args.count} registradores a partir de {args.address}", file=sys.stderr)
+        return 2
+    actuator = _actuator(args)
+    response = actuator.exchange(args.port, args.slave, args.function, args.address, args.count)
+    status = _check_response(actuator, response)
+    if status == 0:
+        print(" ".join(str(value) for value in decode_register_values(response)))
+    return status
+
+
+def cmd_write(args) -> int:
+    if args.function == 5 and args.value not in (0x0000, 0xFF00):
+        print("Função 5 aceita apenas 0x0000 (desliga) ou 0xFF00 (liga)", file=sys.stderr)
+        return 2
+    actuator = _actuator(args)
+    response = actuator.exchange(args.port, args.slave, args.function, args.address, args.value, force=args.force)
+    return _check_response(actuator, response)
+
+
+def cmd_scan(args) -> int:
+    from retry_policy import NO_RETRY
+
+    actuator = _actuator(args)
+    if args.timeout is None:
+        # Endereços vazios são a maioria: não vale esperar o timeout inicial de 1 s por eles
+        actuator.timeouts.initial_timeout = actuator.timeouts.max_timeout = 0.1
+    found = 0
+    for slave in range(args.first, args.last + 1):
+        # Qualquer resposta válida, inclusive de exceção, indica um escravo no endereço
+        response = actuator.exchange(args.port, slave, 0x03, 0, 1, retry_policy=NO_RETRY)
+        if response and check_crc(response):
+            found += 1
+            print(slave, flush=True)
+    return 0 if found else 1
+
+
+def cmd_port_info(args) -> int:
+    """Apply the tuning options to the port and print the settings the driver reports."""
+    import json
+
+    import serial
+    from serial_tuning import read_settings
+
+    actuator = _actuator(args)
+    with serial.Serial(port=args.port, **{key: value for key, value in actuator.serial_settings.items()
+                                          if key != "device_id"}) as ser:
+        if actuator.tuning.enabled:
+            settings = actuator.tuning.apply(args.port, ser)
+        else:
+            settings = read_settings(args.port, ser.fileno())
+    print(json.dumps({"port": args.port, **settings}, indent=2))
+    return 0
+
+
+def cmd_poll(args) -> int:
+    from poller import Poller, PollTag
+
+    actuator = _actuator(args)
+    tag = PollTag("cli", args.port, args.slave, args.address, args.count, args.function)
+
+    def on_sample(tag, values, timestamp):
+        print(f"{time.strftime('%H:%M:%S', time.localtime(timestamp))} {' '.join(map(str, values))}", flush=True)
+
+    poller = Poller(actuator, [tag], interval=args.interval, on_sample=on_sample)
+    poller.start()
+    try:
+        _wait_for_signal()
+    finally:
+        poller.stop()
+    return 0
+
+
+def cmd_daemon(args) -> int:
+    """Poll every configured device and serve metrics until SIGINT/SIGTERM."""
+    from actuator_data import actuators_registers
+    from metrics import BusMetrics, MetricsServer
+    from poller import Poller, PollTag
+
+    registry = _registry(args)
+    actuator = _actuator(args)
+    logger = get_logger()
+
+    metrics = BusMetrics(actuator)
+    actuator.add_transaction_listener(metrics)
+    actuator.on_retry = metrics.count_retry
+
+    def on_state(port, device_id, state):
+        logger.warning("Dispositivo %s em %s: %s", device_id, port, state)
+
+    actuator.health.on_change = on_state
+
+    recorder = None
+    if args.record:
+        from data_export import TransactionRecorder
+        recorder = TransactionRecorder()
+        actuator.add_transaction_listener(recorder)
+
+    tags = [PollTag(f"{device.name}/{quantity}", device.port, device.slave_id, address)
+            for device in registry.devices.values()
+            for quantity, address in actuators_registers.get(device.model, {}).items()]
+    image = None
+    if args.process_image:
+        from process_image import ProcessImageWriter
+        image = ProcessImageWriter(args.process_image, tags)
+
+    def on_sample(tag, values, timestamp):
+        logger.debug("%s = %s", tag.name, values[0])
+        if image is not None:
+            image.update(tag, values, timestamp)
+
+    on_scan = image.publish if image is not None else None
+    loop = None
+    if args.event_loop:
+        from serial_loop import LoopPoller, SerialEventLoop
+        loop = SerialEventLoop(actuator)
+        loop.start()
+        poller = LoopPoller(loop, tags, interval=args.interval, on_sample=on_sample, on_scan=on_scan)
+    elif args.process_per_bus:
+        from bus_process import ProcessPoller
+        poller = ProcessPoller(actuator, tags, interval=args.interval, on_sample=on_sample, on_scan=on_scan,
+                               on_state=on_state)
+    else:
+        poller = Poller(actuator, tags, interval=args.interval, on_sample=on_sample, on_scan=on_scan)
+    metrics.add_gauge("modbus_scan_cycle_seconds", "Duração do último ciclo de leitura do poller.",
+                      lambda: {(("port", port),): round(duration, 6)
+                               for port, duration in list(poller.last_scan_duration.items())})
+
+    server = None
+    if args.metrics_port:
+        server = MetricsServer(metrics, args.metrics_host, args.metrics_port)
+        server.start()
+
+    logger.info("Daemon iniciado: %d dispositivos, %d tags", len(registry.devices), len(tags))
+    poller.start()
+    try:
+        _wait_for_signal()
+    finally:
+        poller.stop()
+        if loop is not None:
+            loop.stop()
+        if server is not None:
+            server.stop()
+        if recorder is not None:
+            actuator.remove_transaction_listener(recorder)
+            recorder.close()
+        if image is not None:
+            image.close()
+        logger.info("Daemon encerrado")
+    return 0
+
+
+def cmd_run_recipe(args) -> int:
+    """Run a recipe file (see Sequencer); Ctrl+C or SIGTERM stops it between steps."""
+    from sequencer import SequenceError, Sequencer, load_recipe
+
+    actuator = _actuator(args)
+    try:
+        recipe = load_recipe(args.recipe)
+    except (OSError, ValueError, SequenceError) as e:
+        print(f"Receita inválida: {e}", file=sys.stderr)
+        return 2
+    sequencer = Sequencer(actuator, _registry(args))
+    sequencer.on_step = lambda elapsed, description: print(f"{elapsed:9.3f} s  {description}", flush=True)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: sequencer.stop())
+    try:
+        result = sequencer.run(recipe)
+    except SequenceError as e:
+        print(f"Receita inválida: {e}", file=sys.stderr)
+        return 2
+    if not result.ok:
+        print(f"Receita {result.name} falhou após {result.duration:.1f} s: {result.error}", file=sys.stderr)
+        return 1
+    print(f"Receita {result.name} concluída em {result.duration:.1f} s")
+    return 0
+
+
+def cmd_gateway(args) -> int:
+    """Serve Modbus TCP clients on the RTU buses until SIGINT/SIGTERM."""
+    from modbus_gateway import ModbusGateway, routes_from_registry
+
+    actuator = _actuator(args)
+    routes = routes_from_registry(_registry(args)) if args.devices else {}
+    gateway = ModbusGateway(actuator, routes, default_port=None if args.devices else args.port,
+                            host=args.host, port=args.tcp_port, max_age=args.max_age,
+                            priority_clients=args.priority_client)
+
+    server = None
+    if args.metrics_port:
+        from metrics import BusMetrics, MetricsServer
+        metrics = BusMetrics(actuator)
+        actuator.add_transaction_listener(metrics)
+        actuator.on_retry = metrics.count_retry
+        metrics.add_gauge("modbus_gateway_requests", "Requisições recebidas pelo gateway, por destino.",
+                          lambda: {(("result", name),): value for name, value in gateway.counters.items()})
+        metrics.add_gauge("modbus_gateway_connections", "Clientes Modbus TCP conectados.",
+                          lambda: {(): gateway.connections})
+        metrics.add_gauge("modbus_gateway_queue_depth", "Requisições aguardando o barramento.",
+                          lambda: {(("port", port),): depth for port, depth in gateway.queue_depths().items()})
+        server = MetricsServer(metrics, args.metrics_host, args.metrics_port)
+        server.start()
+
+    gateway.start()
+    try:
+        _wait_for_signal()
+    finally:
+        gateway.stop()
+        if server is not None:
+            server.stop()
+        get_logger().info("Gateway encerrado")
+    return 0
+
+
+def cmd_api(args) -> int:
+    """Serve the HTTP/WebSocket API until SIGINT/SIGTERM; devices are polled while a stream is open."""
+    from actuator_data import actuators_registers
+    from api_server import ApiServer
+    from poller import Poller, PollTag
+
+    actuator = _actuator(args)
+    registry = _registry(args) if args.devices else None
+    api = ApiServer(actuator, registry, args.host, args.http_port, default_port=args.port)
+    actuator.health.on_change = api.publish_state
+
+    tags = [PollTag(f"{device.name}/{quantity}", device.port, device.slave_id, address)
+            for device in (registry.devices.values() if registry else ())
+            for quantity, address in actuators_registers.get(device.model, {}).items()]
+    poller = Poller(actuator, tags, interval=args.interval, on_sample=api.publish)
+    api.on_watch = lambda active: poller.start() if active else poller.stop()
+
+    api.start()
+    try:
+        _wait_for_signal()
+    finally:
+        api.stop()
+        poller.stop()
+        get_logger().info("API encerrada")
+    return 0
+
+
+def _wait_for_signal() -> None:
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        while not stop.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="modbus_cli", description="Comandos Modbus RTU sem interface gráfica.")
+    parser.add_argument("--port", default=os.environ.get("MODBUS_PORT", "COM5"), help="porta serial (MODBUS_PORT)")
+    parser.add_argument("--slave", type=_number, default=1, help="endereço do escravo (padrão: 1)")
+    parser.add_argument("--baudrate", type=int, default=9600)
+    parser.add_argument("--parity", choices="NEO", default="E")
+    parser.add_argument("--timeout", type=float, help="timeout de resposta fixo em segundos")
+    parser.add_argument("--low-latency", action="store_true",
+                        help="ASYNC_LOW_LATENCY e latency_timer do adaptador USB (Linux)")
+    parser.add_argument("--latency-timer", type=int, default=1, metavar="MS",
+                        help="latency_timer de adaptadores FTDI com --low-latency (padrão: 1 ms)")
+    parser.add_argument("--rs485", action="store_true", help="o kernel controla o RTS do transceptor RS-485 (Linux)")
+    parser.add_argument("--rts-on-send", choices=("high", "low"), default="high",
+                        help="nível do RTS durante o envio com --rs485")
+    parser.add_argument("--rts-delay-before", type=int, default=0, metavar="MS")
+    parser.add_argument("--rts-delay-after", type=int, default=0, metavar="MS")
+    parser.add_argument("--rx-during-tx", action="store_true",
+                        help="mantém a recepção ativa durante o envio com --rs485 (eco local)")
+    parser.add_argument("--log-level", default=os.environ.get("MODBUS_LOG_LEVEL", "WARNING"))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in (("open", "abre a válvula"), ("close", "fecha a válvula")):
+        valve = commands.add_parser(name, help=help_text)
+        valve.add_argument("model", nargs="?", default="TOP-E Module", help="modelo do atuador")
+        valve.add_argument("--group", help="grupo de dispositivos (requer --devices)")
+        valve.add_argument("--devices", help="arquivo JSON de dispositivos e grupos")
+        valve.add_argument("--force", action="store_true", help="envia mesmo que o valor já esteja confirmado")
+        valve.set_defaults(handler=cmd_valve)
+
+    read = commands.add_parser("read", help="lê registradores")
+    read.add_argument("address", type=_word)
+    read.add_argument("-n", "--count", type=_number, default=1)
+    read.add_argument("--function", type=_number, choices=(3, 4), default=3)
+    read.set_defaults(handler=cmd_read)
+
+    write = commands.add_parser("write", help="escreve um registrador (função 6) ou bobina (função 5)")
+    write.add_argument("address", type=_word)
+    write.add_argument("value", type=_word)
+    write.add_argument("--function", type=_number, choices=(5, 6), default=6)
+    write.add_argument("--force", action="store_true")
+    write.set_defaults(handler=cmd_write)
+
+    scan = commands.add_parser("scan", help="procura escravos na porta")
+    scan.add_argument("--first", type=_number, default=1)
+    scan.add_argument("--last", type=_number, default=247)
+    scan.set_defaults(handler=cmd_scan)
+
+    port_info = commands.add_parser("port-info", help="aplica --low-latency/--rs485 e mostra a configuração efetiva")
+    port_info.set_defaults(handler=cmd_port_info)
+
+    poll = commands.add_parser("poll", help="lê registradores periodicamente até Ctrl+C")
+    poll.add_argument("address", type=_number)
+    poll.add_argument("-n", "--count", type=_number, default=1)
+    poll.add_argument("--function", type=_number, choices=(3, 4), default=3)
+    poll.add_argument("--interval", type=float, default=1.0)
+    poll.set_defaults(handler=cmd_poll)
+
+    daemon = commands.add_parser("daemon", help="leitura contínua de todos os dispositivos, com métricas")
+    daemon.add_argument("--devices", required=True, help="arquivo JSON de dispositivos e grupos")
+    daemon.add_argument("--interval", type=float, default=1.0)
+    daemon.add_argument("--metrics-port", type=int, default=int(os.environ.get("MODBUS_METRICS_PORT") or 0))
+    daemon.add_argument("--metrics-host", default=os.environ.get("MODBUS_METRICS_HOST", "127.0.0.1"))
+    daemon.add_argument("--record", action="store_true", help="grava as transações em storage/transactions.csv")
+    daemon.add_argument("--process-per-bus", action="store_true",
+                        help="lê cada porta num processo próprio (métricas de transação ficam nos processos filhos)")
+    daemon.add_argument("--event-loop", action="store_true",
+                        help="lê todas as portas numa única thread com E/S não bloqueante (Linux/macOS)")
+    daemon.add_argument("--process-image", metavar="NOME",
+                        help="publica os valores num bloco de memória compartilhada (veja process_image.py)")
+    daemon.set_defaults(handler=cmd_daemon)
+
+    run_recipe = commands.add_parser("run-recipe", help="executa uma receita JSON (veja sequencer.py)")
+    run_recipe.add_argument("recipe", help="arquivo da receita")
+    run_recipe.add_argument("--devices", required=True, help="arquivo JSON de dispositivos")
+    run_recipe.set_defaults(handler=cmd_run_recipe)
+
+    gateway = commands.add_parser("gateway", help="servidor Modbus TCP que encaminha os clientes aos barramentos RTU")
+    gateway.add_argument("--devices", help="arquivo JSON de dispositivos (unit id = endereço do escravo); "
+                                           "sem ele, todos os units vão para --port")
+    gateway.add_argument("--host", default="0.0.0.0")
+    gateway.add_argument("--tcp-port", type=int, default=502)
+    gateway.add_argument("--max-age", type=float, default=0.25,
+                         help="idade máxima (s) de uma leitura em cache servida aos clientes")
+    gateway.add_argument("--priority-client", action="append", default=[], metavar="HOST",
+                         help="endereço IP cujas leituras têm prioridade (pode repetir)")
+    gateway.add_argument("--metrics-port", type=int, default=int(os.environ.get("MODBUS_METRICS_PORT") or 0))
+    gateway.add_argument("--metrics-host", default=os.environ.get("MODBUS_METRICS_HOST", "127.0.0.1"))
+    gateway.set_defaults(handler=cmd_gateway)
+
+    api = commands.add_parser("api", help="API HTTP com lotes de leituras/escritas e fluxo WebSocket")
+    api.add_argument("--devices", help="arquivo JSON de dispositivos (permite \"device\" nas operações)")
+    api.add_argument("--host", default="127.0.0.1")
+    api.add_argument("--http-port", type=int, default=8080)
+    api.add_argument("--interval", type=float, default=0.5, help="período de leitura enquanto há clientes do fluxo")
+    api.set_defaults(handler=cmd_api)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    setup_logging(args.log_level, log_file=os.environ.get("MODBUS_LOG_FILE"))
+    try:
+        return args.handler(args)
+    finally:
+        stop_logging()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+import struct
+from dataclasses import dataclass, field
+
+FUNCTION_NAMES = {
+    0x01: "Read Coils",
+    0x02: "Read Discrete Inputs",
+    0x03: "Read Holding Registers",
+    0x04: "Read Input Registers",
+    0x05: "Write Single Coil",
+    0x06: "Write Single Register",
+    0x07: "Read Exception Status",
+    0x08: "Diagnostics",
+    0x0B: "Get Comm Event Counter",
+    0x0C: "Get Comm Event Log",
+    0x0F: "Write Multiple Coils",
+    0x10: "Write Multiple Registers",
+    0x11: "Report Server ID",
+    0x14: "Read File Record",
+    0x15: "Write File Record",
+    0x16: "Mask Write Register",
+    0x17: "Read/Write Multiple Registers",
+    0x18: "Read FIFO Queue",
+    0x2B: "Encapsulated Interface Transport",
+}
+
+WRITE_FUNCTIONS = frozenset({0x05, 0x06, 0x0F, 0x10, 0x15, 0x16, 0x17})
+
+EXCEPTION_NAMES = {
+    0x01: "Illegal Function",
+    0x02: "Illegal Data Address",
+    0x03: "Illegal Data Value",
+    0x04: "Slave Device Failure",
+    0x05: "Acknowledge",
+    0x06: "Slave Device Busy",
+    0x07: "Negative Acknowledge",
+    0x08: "Memory Parity Error",
+    0x0A: "Gateway Path Unavailable",
+    0x0B: "Gateway Target Device Failed to Respond",
+}
+
+
+def _build_crc_table():
+    table = []
+    for value in range(256):
+        crc = value
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 0x0001 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC_TABLE = _build_crc_table()
+
+
+def crc16(data, crc: int = 0xFFFF) -> int:
+    """CRC-16 Modbus calculado por tabela (um lookup por byte)."""
+    table = _CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def crc16_update(crc: int, byte: int) -> int:
+    """Avança o CRC em um byte (para cálculo incremental sobre um fluxo)."""
+    return (crc >> 8) ^ _CRC_TABLE[(crc ^ byte) & 0xFF]
+
+
+def append_crc(frame: bytes) -> bytes:
+    return frame + struct.pack('<H', crc16(frame))
+
+
+def check_crc(frame) -> bool:
+    """True se os dois últimos bytes do frame são o CRC correto do restante."""
+    return len(frame) >= 4 and crc16(frame[:-2]) == (frame[-2] | (frame[-1] << 8))
+
+
+def decode_register_values(raw_data):
+    """Extrai os valores de registradores de uma resposta de leitura (funções 3 e 4)."""
+    if not raw_data or len(raw_data) <= 3 or raw_data[1] not in (3, 4):
+        return []
+
+    data_len = raw_data[2]  # Byte count
+    if data_len == 0 or len(raw_data) < 3 + data_len:
+        return []
+
+    data_bytes = raw_data[3:3 + data_len]
+    # Registradores de 16 bits (2 bytes por registrador, big-endian)
+    return [(data_bytes[i] << 8) + data_bytes[i + 1] for i in range(0, len(data_bytes) - 1, 2)]
+
+
+def exception_code(frame):
+    """Código de exceção de uma resposta (função | 0x80), ou None se não for uma exceção."""
+    if frame and len(frame) >= 3 and frame[1] & 0x80:
+        return frame[2]
+    return None
+
+
+def exception_name(code: int) -> str:
+    return EXCEPTION_NAMES.get(code, f"Exceção {code:#04x}")
+
+
+# Tamanho fixo dos frames (com CRC) por função; None = depende de um byte count
+_REQUEST_LENGTHS = {0x01: 8, 0x02: 8, 0x03: 8, 0x04: 8, 0x05: 8, 0x06: 8, 0x07: 4, 0x08: 8, 0x0B: 4,
+                    0x0C: 4, 0x11: 4, 0x16: 10, 0x18: 6}
+_RESPONSE_LENGTHS = {0x05: 8, 0x06: 8, 0x07: 5, 0x08: 8, 0x0B: 8, 0x0F: 8, 0x10: 8, 0x16: 10}
+# Posição do byte count e bytes fixos além dele (endereço, função, cabeçalho, CRC)
+_REQUEST_BYTE_COUNT = {0x0F: (6, 9), 0x10: (6, 9), 0x14: (2, 5), 0x15: (2, 5), 0x17: (10, 13)}
+_RESPONSE_BYTE_COUNT = {0x01: (2, 5), 0x02: (2, 5), 0x03: (2, 5), 0x04: (2, 5), 0x0C: (2, 5),
+                        0x11: (2, 5), 0x14: (2, 5), 0x15: (2, 5), 0x17: (2, 5)}
+
+
+def expected_frame_length(frame, is_request: bool):
+    """Tamanho total esperado de um frame RTU a partir dos seus primeiros bytes.
+
+    Retorna 0 se ainda faltam bytes para determinar o tamanho e None quando a
+    função não tem tamanho previsível.
+    """
+    if len(frame) < 2:
+        return 0
+    function = frame[1]
+    if function & 0x80:
+        return None if is_request else 5
+
+    lengths, byte_counts = (_REQUEST_LENGTHS, _REQUEST_BYTE_COUNT) if is_request \
+        else (_RESPONSE_LENGTHS, _RESPONSE_BYTE_COUNT)
+    if function in lengths:
+        return lengths[function]
+    if function in byte_counts:
+        index, fixed = byte_counts[function]
+        return frame[index] + fixed if len(frame) > index else 0
+    if function == 0x18 and not is_request:
+        return ((frame[2] << 8) | frame[3]) + 6 if len(frame) > 3 else 0
+    return None
+
+
+def expected_response_length(function: int, data: int) -> int:
+    """Tamanho esperado da resposta a uma requisição de 8 bytes (função, endereço, dado).
+
+    Para leituras `data` é a quantidade; funções desconhecidas retornam o máximo do RTU.
+    """
+    if function in (0x01, 0x02):
+        return 5 + (data + 7) // 8
+    if function in (0x03, 0x04):
+        return 5 + 2 * data
+    if function in _RESPONSE_LENGTHS:
+        return _RESPONSE_LENGTHS[function]
+    return 256
+
+
+@dataclass
+class DecodedFrame:
+    """Conteúdo de um frame Modbus RTU decodificado."""
+    slave: int
+    function: int
+    name: str
+    is_request: bool
+    crc_ok: bool
+    fields: dict = field(default_factory=dict)
+    exception_code: int = None
+
+    def summary(self) -> str:
+        kind = "REQ" if self.is_request else "RSP"
+        details = ", ".join(f"{key}={value}" for key, value in self.fields.items())
+        crc = "" if self.crc_ok else " [CRC inválido]"
+        if self.exception_code is not None:
+            return f"{kind} slave={self.slave} {self.name} EXCEÇÃO {self.exception_code:#04x} ({exception_name(self.exception_code)}){crc}"
+        return f"{kind} slave={self.slave} {self.name} {details}{crc}"
+
+
+def _words(payload):
+    return [(payload[i] << 8) | payload[i + 1] for i in range(0, len(payload) - 1, 2)]
+
+
+def _bits(payload, quantity=None):
+    bits = [(byte >> bit) & 1 for byte in payload for bit in range(8)]
+    return bits[:quantity] if quantity is not None else bits
+
+
+def _decode_request(function, body):
+    if function in (0x01, 0x02, 0x03, 0x04) and len(body) >= 4:
+        return {"start": _words(body)[0], "quantity": _words(body)[1]}
+    if function in (0x05, 0x06) and len(body) >= 4:
+        return {"address": _words(body)[0], "value": _words(body)[1]}
+    if function == 0x08 and len(body) >= 2:
+        return {"subfunction": _words(body)[0], "data": body[2:].hex()}
+    if function == 0x0F and len(body) >= 5:
+        start, quantity = _words(body[:4])
+        return {"start": start, "quantity": quantity, "values": _bits(body[5:5 + body[4]], quantity)}
+    if function == 0x10 and len(body) >= 5:
+        start, quantity = _words(body[:4])
+        return {"start": start, "quantity": quantity, "values": _words(body[5:5 + body[4]])}
+    if function == 0x16 and len(body) >= 6:
+        address, and_mask, or_mask = _words(body[:6])
+        return {"address": address, "and_mask": and_mask, "or_mask": or_mask}
+    if function == 0x17 and len(body) >= 9:
+        read_start, read_quantity, write_start, write_quantity = _words(body[:8])
+        return {"read_start": read_start, "read_quantity": read_quantity, "write_start": write_start,
+                "write_quantity": write_quantity, "values": _words(body[9:9 + body[8]])}
+    if function == 0x18 and len(body) >= 2:
+        return {"fifo_address": _words(body)[0]}
+    if function == 0x2B and body:
+        return {"mei_type": body[0], "data": body[1:].hex()}
+    if function in (0x07, 0x0B, 0x0C, 0x11) and not body:
+        return {}
+    return {"data": body.hex()}
+
+
+def _decode_response(function, body):
+    if function in (0x01, 0x02) and body:
+        return {"byte_count": body[0], "values": _bits(body[1:1 + body[0]])}
+    if function in (0x03, 0x04, 0x17) and body:
+        return {"byte_count": body[0], "values": _words(body[1:1 + body[0]])}
+    if function in (0x05, 0x06) and len(body) >= 4:
+        return {"address": _words(body)[0], "value": _words(body)[1]}
+    if function == 0x07 and body:
+        return {"status": body[0]}
+    if function == 0x08 and len(body) >= 2:
+        return {"subfunction": _words(body)[0], "data": body[2:].hex()}
+    if function == 0x0B and len(body) >= 4:
+        return {"status": _words(body)[0], "event_count": _words(body)[1]}
+    if function in (0x0F, 0x10) and len(body) >= 4:
+        return {"start": _words(body)[0], "quantity": _words(body)[1]}
+    if function == 0x16 and len(body) >= 6:
+        address, and_mask, or_mask = _words(body[:6])
+        return {"address": address, "and_mask": and_mask, "or_mask": or_mask}
+    if function == 0x18 and len(body) >= 4:
+        return {"byte_count": _words(body)[0], "fifo_count": _words(body)[1], "values": _words(body[4:])}
+    if function in (0x0C, 0x11, 0x14, 0x15) and body:
+        return {"byte_count": body[0], "data": body[1:].hex()}
+    return {"data": body.hex()}
+
+
+def decode_frame(frame, is_request: bool) -> DecodedFrame:
+    """Decodifica um frame RTU completo (com CRC) de requisição ou resposta."""
+    frame = bytes(frame)
+    if len(frame) < 4:
+        raise ValueError(f"Frame muito curto: {frame.hex()}")
+
+    slave, function = frame[0], frame[1]
+    body = frame[2:-2]
+    crc_ok = check_crc(frame)
+
+    if function & 0x80:
+        base_function = function & 0x7F
+        return DecodedFrame(slave, base_function, FUNCTION_NAMES.get(base_function, f"Função {base_function}"),
+                            is_request, crc_ok, exception_code=body[0] if body else None)
+
+    name = FUNCTION_NAMES.get(function, f"Função {function}")
+    fields = _decode_request(function, body) if is_request else _decode_response(function, body)
+    return DecodedFrame(slave, function, name, is_request, crc_ok, fields)
@@ -0,0 +1,368 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from modbus_frames import check_crc, exception_code
+from modbus_logging import get_logger
+
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_ADDRESS = 0x02
+ILLEGAL_DATA_VALUE = 0x03
+SLAVE_DEVICE_BUSY = 0x06
+GATEWAY_PATH_UNAVAILABLE = 0x0A
+GATEWAY_TARGET_FAILED = 0x0B
+
+# Funções de leitura e a maior quantidade de uma requisição (bits ou registradores)
+READ_FUNCTIONS = {0x01: 2000, 0x02: 2000, 0x03: 125, 0x04: 125}
+WRITE_FUNCTIONS = (0x05, 0x06)
+
+_MBAP = struct.Struct(">HHHB")  # transação, protocolo, tamanho, unit id
+_MAX_IN_FLIGHT = 16  # Requisições pendentes por conexão (clientes podem enviar várias sem esperar)
+
+
+def routes_from_registry(registry) -> dict:
+    """Unit id -> (port, slave): every registry device is reachable through its own slave id."""
+    routes = {}
+    for device in registry.devices.values():
+        if device.slave_id in routes:
+            get_logger().warning("Gateway: unit %d já aponta para %s; %s (%s) não será acessível",
+                                 device.slave_id, routes[device.slave_id][0], device.name, device.port)
+            continue
+        routes[device.slave_id] = (device.port, device.slave_id)
+    return routes
+
+
+def _exception_pdu(function: int, code: int) -> bytes:
+    return bytes([function | 0x80, code])
+
+
+def _bits(payload):
+    return [(byte >> bit) & 1 for byte in payload for bit in range(8)]
+
+
+def _pack_bits(bits) -> bytes:
+    return bytes(sum(bit << n for n, bit in enumerate(bits[i:i + 8])) for i in range(0, len(bits), 8))
+
+
+def read_pdu(function: int, response, start: int, address: int, count: int) -> bytes:
+    """TCP response PDU for a read of address..address+count-1 taken from an RTU `response` starting at `start`."""
+    if not response or not check_crc(response):
+        return _exception_pdu(function, GATEWAY_TARGET_FAILED)
+    if exception_code(response) is not None:
+        return bytes(response[1:3])
+    data = response[3:3 + response[2]]
+    offset = address - start
+    if function in (0x01, 0x02):
+        bits = _bits(data)[offset:offset + count]
+        if len(bits) < count:
+            return _exception_pdu(function, GATEWAY_TARGET_FAILED)
+        payload = _pack_bits(bits)
+    else:
+        payload = data[2 * offset:2 * (offset + count)]
+        if len(payload) < 2 * count:
+            return _exception_pdu(function, GATEWAY_TARGET_FAILED)
+    return bytes([function, len(payload)]) + payload
+
+
+class _Request:
+    __slots__ = ("slave", "function", "address", "value", "future", "taken")
+
+    def __init__(self, slave, function, address, value, future):
+        self.slave = slave
+        self.function = function
+        self.address = address
+        self.value = value  # Quantidade nas leituras
+        self.future = future
+        self.taken = False
+
+    def resolve(self, pdu: bytes) -> None:
+        if not self.future.done():  # O cliente pode ter desconectado enquanto esperava
+            self.future.set_result(pdu)
+
+
+class _BusQueue:
+    """Requests waiting for one serial port, highest priority (lowest value) first.
+
+    Queued reads are also indexed by (slave, function) so the bus worker can take
+    every read overlapping the one it is about to send.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self._heap = []
+        self._reads = {}
+        self._counter = itertools.count()  # Ordem de chegada entre requisições de mesma prioridade
+        self._ready = asyncio.Event()
+
+    def put(self, request: _Request, priority) -> None:
+        heapq.heappush(self._heap, (priority, next(self._counter), request))
+        if request.function in READ_FUNCTIONS:
+            self._reads.setdefault((request.slave, request.function), []).append(request)
+        self.size += 1
+        self._ready.set()
+
+    async def get(self) -> _Request:
+        while True:
+            while self._heap:
+                request = heapq.heappop(self._heap)[2]
+                if request.taken:
+                    continue  # Já atendida junto com outra leitura
+                self._take(request)
+                if not request.future.cancelled():
+                    return request
+            self._ready.clear()
+            await self._ready.wait()
+
+    def _take(self, request: _Request) -> None:
+        request.taken = True
+        self.size -= 1
+        if request.function in READ_FUNCTIONS:
+            key = (request.slave, request.function)
+            self._reads[key].remove(request)
+            if not self._reads[key]:
+                del self._reads[key]
+
+    def take_overlapping(self, request: _Request):
+        """`request` plus the queued reads that overlap or touch its range, within one RTU read."""
+        limit = READ_FUNCTIONS[request.function]
+        group = [request]
+        start, end = request.address, request.address + request.value
+        candidates = sorted(self._reads.get((request.slave, request.function), ()), key=lambda r: r.address)
+        grown = True
+        while grown:  # A faixa unida pode alcançar leituras que antes não a tocavam
+            grown = False
+            for other in candidates:
+                if other.taken or other.address > end or other.address + other.value < start:
+                    continue
+                if max(end, other.address + other.value) - min(start, other.address) > limit:
+                    continue
+                self._take(other)
+                group.append(other)
+                start, end = min(start, other.address), max(end, other.address + other.value)
+                grown = True
+        return group
+
+
+class ModbusGateway:
+    """Modbus TCP server forwarding client requests to the RTU buses of a ModbusProtocol.
+
+    An RTU bus has a single master, so every TCP client (SCADA, historian, this
+    app) shares one queue per serial port, served by one worker:
+
+    - writes go before reads, then clients in `priority_clients`, then arrival order;
+    - a read whose registers are covered by a response younger than `max_age`
+      is answered from the read cache without being queued;
+    - reads of the same slave and function that overlap or touch are sent as a
+      single RTU read when the worker reaches them, and each client gets its slice.
+
+    Unit ids are mapped to (port, slave) by `routes`; unknown units go to
+    `default_port` with the same slave id, or are answered with exception 0x0A.
+    Functions 1-6 are supported (the RTU layer only builds address/value frames).
+    Connections are handled by asyncio, so hundreds of idle or polling clients
+    cost no threads; start()/stop() run the event loop in a background thread.
+    """
+
+    def __init__(self, protocol, routes=None, default_port=None, host: str = "0.0.0.0", port: int = 502,
+                 max_age: float = 0.25, priority_clients=(), max_queue: int = 1000,
+                 max_connections: int = 1000):
+        self.protocol = protocol
+        self.routes = dict(routes or {})
+        self.default_port = default_port
+        self.host = host
+        self.port = port
+        self.max_age = max_age
+        self.priority_clients = set(priority_clients)
+        self.max_queue = max_queue
+        self.max_connections = max_connections
+
+        self.connections = 0
+        self.counters = {"request": 0, "cache": 0, "merged": 0, "bus_read": 0, "bus_write": 0, "busy": 0,
+                         "exception": 0}
+        self._queues = {}
+        self._executors = {}
+        self._workers = []
+        self._server = None
+        self._loop = None
+        self._stopping = None
+        self._started = threading.Event()
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.sockets[0].getsockname()[:2] if self._server else (self.host, self.port)
+
+    def route(self, unit: int):
+        """(port, slave) for a unit id, or None."""
+        if unit in self.routes:
+            return self.routes[unit]
+        if self.default_port and 1 <= unit <= 247:
+            return self.default_port, unit
+        return None
+
+    def queue_depths(self) -> dict:
+        return {port: queue.size for port, queue in self._queues.items()}
+
+    # Ciclo de vida
+
+    async def serve(self) -> None:
+        """Accept clients until stop() is called."""
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port, backlog=512)
+        get_logger().info("Gateway Modbus TCP em %s:%d", *self.address)
+        self._started.set()
+        try:
+            await self._stopping.wait()
+        finally:
+            self._server.close()
+            await self._server.wait_closed()
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            for executor in self._executors.values():
+                executor.shutdown(wait=True)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=asyncio.run, args=(self.serve(),), name="modbus-gateway",
+                                        daemon=True)
+        self._thread.start()
+        while not self._started.wait(0.1):
+            if not self._thread.is_alive():
+                raise OSError(f"Não foi possível iniciar o gateway em {self.host}:{self.port}")
+
+    def stop(self) -> None:
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread is not None:
+            self._thread.join()
+
+    # Conexões
+
+    async def _handle_client(self, reader, writer) -> None:
+        if self.connections >= self.max_connections:
+            writer.close()
+            return
+        self.connections += 1
+        host = (writer.get_extra_info("peername") or ("",))[0]
+        priority = 0 if host in self.priority_clients else 1
+        pending = set()
+        try:
+            while True:
+                header = await reader.readexactly(_MBAP.size)
+                transaction_id, protocol_id, length, unit = _MBAP.unpack(header)
+                if protocol_id != 0 or not 2 <= length <= 254:
+                    get_logger().warning("Gateway: cabeçalho MBAP inválido de %s; conexão encerrada", host)
+                    break
+                pdu = await reader.readexactly(length - 1)
+                task = asyncio.create_task(self._answer(writer, transaction_id, unit, pdu, priority))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                if len(pending) >= _MAX_IN_FLIGHT:
+                    await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # Cliente desconectou
+        finally:
+            for task in pending:
+                task.cancel()
+            self.connections -= 1
+            writer.close()
+
+    async def _answer(self, writer, transaction_id: int, unit: int, pdu: bytes, priority: int) -> None:
+        response = await self.process(unit, pdu, priority)
+        if response[0] & 0x80:
+            self.counters["exception"] += 1
+        writer.write(_MBAP.pack(transaction_id, 0, len(response) + 1, unit) + response)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def process(self, unit: int, pdu: bytes, priority: int = 1) -> bytes:
+        """Response PDU for a request PDU addressed to `unit`."""
+        self.counters["request"] += 1
+        function = pdu[0]
+        route = self.route(unit)
+        if route is None:
+            return _exception_pdu(function, GATEWAY_PATH_UNAVAILABLE)
+        if function not in READ_FUNCTIONS and function not in WRITE_FUNCTIONS:
+            return _exception_pdu(function, ILLEGAL_FUNCTION)
+        if len(pdu) != 5:
+            return _exception_pdu(function, ILLEGAL_DATA_VALUE)
+        address, value = struct.unpack_from(">HH", pdu, 1)
+        port, slave = route
+
+        if function in READ_FUNCTIONS:
+            if not 1 <= value <= READ_FUNCTIONS[function]:
+                return _exception_pdu(function, ILLEGAL_DATA_VALUE)
+            if address + value > 0x10000:
+                return _exception_pdu(function, ILLEGAL_DATA_ADDRESS)  # Faixa passaria do fim do espaço de endereços
+            cached = self.protocol.read_cache.covering(port, slave, function, address, value, self.max_age)
+            if cached is not None:
+                self.counters["cache"] += 1
+                response, start = cached
+                return read_pdu(function, response, start, address, value)
+        elif function == 0x05 and value not in (0x0000, 0xFF00):
+            return _exception_pdu(function, ILLEGAL_DATA_VALUE)
+
+        queue = self._queue(port)
+        if queue.size >= self.max_queue:
+            self.counters["busy"] += 1
+            return _exception_pdu(function, SLAVE_DEVICE_BUSY)
+        request = _Request(slave, function, address, value, asyncio.get_running_loop().create_future())
+        queue.put(request, (0 if function in WRITE_FUNCTIONS else 1, priority))
+        return await request.future
+
+    # Barramentos
+
+    def _queue(self, port) -> _BusQueue:
+        queue = self._queues.get(port)
+        if queue is None:
+            queue = self._queues[port] = _BusQueue()
+            self._executors[port] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"gateway-{port}")
+            self._workers.append(asyncio.create_task(self._run_bus(port, queue)))
+        return queue
+
+    async def _run_bus(self, port, queue: _BusQueue) -> None:
+        """Send the queued requests of one port, one transaction at a time."""
+        loop = asyncio.get_running_loop()
+        executor = self._executors[port]
+        while True:
+            request = await queue.get()
+            group = queue.take_overlapping(request) if request.function in READ_FUNCTIONS else [request]
+            try:
+                if request.function in READ_FUNCTIONS:
+                    await self._read(loop, executor, port, group)
+                else:
+                    self.counters["bus_write"] += 1
+                    # force: o gateway é transparente; a escrita do SCADA sempre chega ao dispositivo
+                    response = await loop.run_in_executor(executor, functools.partial(
+                        self.protocol.exchange, port, request.slave, request.function, request.address,
+                        request.value, force=True))
+                    if response and check_crc(response):
+                        request.resolve(bytes(response[1:-2]))
+                    else:
+                        request.resolve(_exception_pdu(request.function, GATEWAY_TARGET_FAILED))
+            except Exception:
+                get_logger(port, request.slave).exception("Gateway: erro ao atender requisição")
+                for pending in group:
+                    pending.resolve(_exception_pdu(request.function, GATEWAY_TARGET_FAILED))
+
+    async def _read(self, loop, executor, port, group) -> None:
+        first = group[0]
+        start = min(request.address for request in group)
+        count = max(request.address + request.value for request in group) - start
+        self.counters["bus_read"] += 1
+        self.counters["merged"] += len(group) - 1
+        response = await loop.run_in_executor(executor, self.protocol.read_response, port, first.slave, start,
+                                              count, first.function, self.max_age)
+        if len(group) > 1 and response and check_crc(response) and exception_code(response) is not None:
+            # A exceção pode ser causada por só uma das faixas: cada cliente recebe a resposta da sua
+            for request in group:
+                await self._read(loop, executor, port, [request])
+            return
+        for request in group:
+            request.resolve(read_pdu(first.function, response, start, request.address, request.value))
@@ -0,0 +1,119 @@
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+ROOT_LOGGER = "modbus"
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+_listener = None
+
+
+class HexBytes:
+    """Wrap a frame so `.hex()` formatting only happens if a handler actually emits the record."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return self.data.hex(" ").upper() if self.data else "-"
+
+
+def _logger_name(port=None, device_id=None) -> str:
+    name = ROOT_LOGGER
+    if port is not None:
+        name += "." + str(port).replace(".", "_")
+        if device_id is not None:
+            name += f".{device_id}"
+    return name
+
+
+def get_logger(port=None, device_id=None) -> logging.Logger:
+    """Logger for a port/device ("modbus.COM5.1"); levels are inherited port -> device."""
+    key = (port, device_id)
+    logger = _loggers.get(key)
+    if logger is None:
+        with _loggers_lock:
+            logger = _loggers.setdefault(key, logging.getLogger(_logger_name(port, device_id)))
+    return logger
+
+
+def set_level(level, port=None, device_id=None) -> None:
+    """Set verbosity globally, for one port or for one device on a port."""
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    get_logger(port, device_id).setLevel(level)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including the transaction fields passed via `extra`."""
+
+    FIELDS = ("port", "device_id", "function", "address", "data", "elapsed_ms")
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name in self.FIELDS:
+            if hasattr(record, name):
+                entry[name] = getattr(record, name)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread.
+
+    The stock prepare() calls format() in the caller's thread; here the record is
+    queued as-is (its args are immutable), so the hot path only pays for the put().
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level=logging.INFO, handlers=None, json_format: bool = False,
+                  log_file: str = None) -> logging.handlers.QueueListener:
+    """Route all "modbus.*" logging through a queue drained by a background thread.
+
+    Returns the QueueListener; call stop_logging() at exit to flush pending records.
+    """
+    global _listener
+    stop_logging()
+
+    if handlers is None:
+        handlers = [logging.StreamHandler(sys.stderr)]
+        if log_file:
+            handlers.append(logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8"))
+    formatter = JsonFormatter() if json_format else logging.Formatter(
+        "%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    for handler in handlers:
+        if handler.formatter is None:
+            handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = get_logger()
+    root.handlers[:] = [_DeferredQueueHandler(log_queue)]
+    root.propagate = False
+    set_level(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,6 +1,41 @@
+import logging
 import struct
+import threading
 import serial
 import time
+from dataclasses import dataclass, field
+
+from adaptive_timeout import AdaptiveTimeouts
+from device_health import DeviceHealth
+from modbus_frames import (check_crc, crc16, decode_register_values, exception_code, exception_name,
+                           expected_frame_length, expected_response_length, WRITE_FUNCTIONS)
+from modbus_logging import HexBytes, get_logger
+from read_cache import ReadCache
+from retry_policy import RetryPolicy
+from serial_tuning import SerialTuning
+from timing import StageTimer, TimingRegistry
+from write_tracker import WriteTracker
+
+
+@dataclass
+class Transaction:
+    """Registro de uma transação Modbus (requisição enviada e resposta recebida)."""
+    timestamp: float
+    port: str
+    device_id: int
+    function: int
+    address: int
+    data: int
+    request: bytes = b""
+    response: bytes = b""
+    error: str = ""
+    tx_time_ns: int = 0
+    rx_time_ns: int = 0
+    stages: dict = field(default_factory=dict)  # Duração de cada etapa em ns
+    crc_ok: bool = None  # None enquanto não há resposta
+    exception_code: int = None  # Código da resposta de exceção (função | 0x80)
+    attempt: int = 0  # 0 = primeira tentativa, 1.. = retransmissões
+
 
 class ModbusProtocol:
     def __init__(self, device_id=1, baudrate=9600, bytesize=8, parity="E", stopbits=1):
@@ -12,20 +47,57 @@ class ModbusProtocol:
         self.__stopbits = stopbits
 
         self.received_data = None
+        self.transaction_listeners = []
+        self.timings = TimingRegistry()
+        self.timeouts = AdaptiveTimeouts()
+        self.health = DeviceHealth()
+        self.retry_policy = RetryPolicy()
+        self.read_cache = ReadCache()
+        self.writes = WriteTracker()
+        self.tuning = SerialTuning()  # Latência baixa e RS-485 do kernel (desativados por padrão)
+        self.broadcast_delay = 0.1  # Tempo de processamento de um broadcast pelos escravos (s)
+        self.on_retry = None  # Chamado com (port, device_id) antes de cada retransmissão
+
+        # Um lock por porta: a UI e o poller compartilham o mesmo barramento
+        self.__port_locks = {}
+        self.__port_locks_guard = threading.Lock()
+        self.pending_requests = {}  # Requisições aguardando a porta (profundidade da fila)
+
+    @property
+    def baudrate(self):
+        return self.__baudrate
+
+    @property
+    def serial_settings(self) -> dict:
+        """Argumentos do construtor que reproduzem esta configuração serial (ex.: em outro processo)."""
+        return {"device_id": self.__device_id, "baudrate": self.__baudrate, "bytesize": self.__bytesize,
+                "parity": self.__parity, "stopbits": self.__stopbits}
+
+    @property
+    def bits_per_char(self):
+        """Bits por caractere na linha: start + dados + paridade + stop."""
+        return 1 + self.__bytesize + (0 if self.__parity == "N" else 1) + self.__stopbits
+
+    def add_transaction_listener(self, listener):
+        """Registra uma função chamada com cada Transaction concluída."""
+        if listener not in self.transaction_listeners:
+            self.transaction_listeners.append(listener)
+
+    def remove_transaction_listener(self, listener):
+        """Remove uma função registrada com add_transaction_listener."""
+        if listener in self.transaction_listeners:
+            self.transaction_listeners.remove(listener)
+
+    def _notify_transaction(self, transaction):
+        for listener in self.transaction_listeners:
+            try:
+                listener(transaction)
+            except Exception:
+                get_logger().exception("Erro no ouvinte de transações")
 
     def __calculate_crc(self, data):
         """Calcula o CRC-16 Modbus"""
-        crc = 0xFFFF
-        for byte in data:
-            crc ^= byte
-            for _ in range(8):
-                if crc & 0x0001:
-                    crc >>= 1
-                    crc ^= 0xA001
-                else:
-                    crc >>= 1
-
-        return struct.pack('<H', crc)  # Retorna o CRC em formato correto (2 bytes, little-endian)
+        return struct.pack('<H', crc16(data))  # Retorna o CRC em formato correto (2 bytes, little-endian)
 
 
     def __getHighLowByte(self, data):
@@ -35,41 +107,222 @@ class ModbusProtocol:
         byte_baixo = valor_convertido & 0xFF
         return [byte_alto, byte_baixo]  # Retorna lista [Hi, Lo]
 
-    def sendRequest(self, port, device_id, function, address, data):
+    def port_lock(self, port):
+        """Retorna o lock que serializa as transações de uma porta."""
+        with self.__port_locks_guard:
+            if port not in self.__port_locks:
+                self.__port_locks[port] = threading.Lock()
+            return self.__port_locks[port]
+
+    def sendRequest(self, port, device_id, function, address, data, force=False):
+        self.received_data = self.exchange(port, device_id, function, address, data, force=force)
+        return self.received_data
+
+    def read_response(self, port, device_id, address, count=1, function=0x03, max_age=None):
+        """Frame de resposta de uma leitura (funções 1 a 4) através do cache; None sem resposta."""
+        return self.read_cache.fetch(
+            (port, device_id, function, address, count),
+            lambda: self.exchange(port, device_id, function, address, count),
+            max_age, valid=lambda r: check_crc(r) and exception_code(r) is None)
+
+    def read_registers(self, port, device_id, address, count=1, function=0x03, max_age=None):
+        """Lê `count` registradores (funções 3 ou 4) e retorna a lista de valores.
+
+        Uma resposta com menos de `max_age` segundos (padrão: read_cache.default_ttl) é
+        reaproveitada do cache; leituras idênticas simultâneas compartilham uma só transação.
+        """
+        response = self.read_response(port, device_id, address, count, function, max_age)
+        if response is None:
+            return []
+        started = time.perf_counter_ns()
+        values = decode_register_values(response)
+        if function == 0x03:
+            self.writes.observe_registers(port, device_id, address, values)
+        self.timings.record(port, device_id, function, "parse", time.perf_counter_ns() - started)
+        return values
+
+    def exchange(self, port, device_id, function, address, data, retry_policy=None, force=False):
+        """Envia uma requisição e retorna a resposta sem alterar received_data (None em caso de erro).
+
+        Falhas transitórias são repetidas conforme `retry_policy` (padrão: self.retry_policy).
+        Dispositivos offline não ocupam o barramento: a requisição só é enviada quando
+        é a vez de sondá-los (veja DeviceHealth). A escrita de um valor que o dispositivo
+        já confirmou não é reenviada, a menos que `force` seja True (veja WriteTracker).
+        """
+        if not self.health.allow_request(port, device_id):
+            return None
+        if not force:
+            echo = self.writes.redundant_echo(port, device_id, function, address, data)
+            if echo is not None:
+                return echo
+
+        policy = retry_policy or self.retry_policy
+        state = self.health.state(port, device_id)
+        lock = self.port_lock(port)
+        attempt = 0
+        while True:
+            with self.__port_locks_guard:
+                self.pending_requests[port] = self.pending_requests.get(port, 0) + 1
+            with lock:
+                with self.__port_locks_guard:
+                    self.pending_requests[port] -= 1
+                transaction = self.__exchange(port, device_id, function, address, data, attempt)
+
+            if not policy.should_retry(transaction, attempt, state):
+                break
+            attempt += 1
+            if self.on_retry:
+                self.on_retry(port, device_id)
+            delay = policy.delay(transaction)
+            if delay:
+                time.sleep(delay)  # Fora do lock: o barramento fica livre enquanto o escravo está ocupado
+
+        if function in WRITE_FUNCTIONS:
+            # Mesmo sem confirmação o escravo pode ter aplicado a escrita; broadcast atinge a porta toda
+            self.read_cache.invalidate(port, device_id if device_id else None)
+            if device_id:
+                self.writes.commanded(port, device_id, function, address, data,
+                                      transaction.request, transaction.response)
+            else:
+                self.writes.forget(port)
+
+        if device_id == 0:
+            return None  # Broadcast: não há resposta nem estado de saúde a atualizar
+        if transaction.error or not transaction.response or not transaction.crc_ok:
+            self.writes.forget(port, device_id)  # O dispositivo pode ter reiniciado sem que se perceba
+            self.health.record_failure(port, device_id)
+        else:
+            self.health.record_success(port, device_id)
+        return transaction.response or None
+
+    def __read_response(self, ser, timeout, timer, silence):
+        """Lê um frame de resposta até completar o tamanho esperado ou estourar o timeout."""
+        deadline = time.perf_counter() + timeout
+        response = bytearray()
+        needed = 5  # Menor resposta possível (exceção); suficiente para saber o tamanho total
+        while len(response) < needed:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            ser.timeout = remaining
+            chunk = ser.read(needed - len(response))
+            if not chunk:
+                break
+            if not response:
+                timer.mark("wait")
+            response += chunk
+
+            expected = expected_frame_length(response, False)
+            if expected is None:
+                # Função sem tamanho previsível: lê até o silêncio entre frames
+                ser.timeout = silence
+                while True:
+                    chunk = ser.read(256)
+                    if not chunk:
+                        break
+                    response += chunk
+                break
+            if expected:
+                needed = expected
+
+        return bytes(response)
+
+    def __exchange(self, port, device_id, function, address, data, attempt=0):
+        transaction = Transaction(time.time(), port, device_id, function, address, data, attempt=attempt)
+        timer = StageTimer()
+        response = None
+        ser = None
         try:
-            # Construção de dados para a comunicação serial
+            # Construção do frame Modbus RTU
+            frameRTU = bytes([device_id, function, *self.__getHighLowByte(address), *self.__getHighLowByte(data)])
+
+            # Cálculo e adição do CRC ao frame
+            frameRTU += self.__calculate_crc(frameRTU)
+            transaction.request = frameRTU
+            timer.mark("build")
+
+            # Construção de dados para a comunicação serial (o construtor já abre a porta)
             ser = serial.Serial(
                 port=port,
                 baudrate=self.__baudrate,
                 bytesize=self.__bytesize,
                 parity=self.__parity,
                 stopbits=self.__stopbits,
-                timeout=1
+                timeout=self.timeouts.initial_timeout
             )
 
-            # Construção do frame Modbus RTU
-            frameRTU = bytes([device_id, function, *self.__getHighLowByte(address), *self.__getHighLowByte(data)])
-
-            # Cálculo e adição do CRC ao frame
-            frameRTU += self.__calculate_crc(frameRTU)
-
             # Abertura da porta serial
             if not ser.is_open:
                 ser.open()
+            self.tuning.ensure(port, ser)
+            timer.mark("open")
 
             # Envio da requisição
             ser.write(frameRTU)
+            transaction.tx_time_ns = time.time_ns()
+            timer.mark("write")
+
+            char_time = self.bits_per_char / self.__baudrate
+            if device_id == 0:
+                # Broadcast: nenhum escravo responde; o barramento só é liberado depois do
+                # frame e do tempo que os escravos precisam para executar o comando
+                time.sleep(len(frameRTU) * char_time + self.broadcast_delay)
+                timer.mark("wait")
+            else:
+                # Espera da resposta com timeout adaptativo por dispositivo
+                expected_length = expected_response_length(function, data)
+                wire_time = (len(frameRTU) + expected_length) * char_time
+                sent_at = time.perf_counter()
+                response = self.__read_response(ser, self.timeouts.timeout(port, device_id, wire_time), timer,
+                                                max(3.5 * char_time, 0.005))
+                transaction.response = response
+                transaction.rx_time_ns = time.time_ns()
+                timer.mark("read")
 
-            # Espera Modbus
-            time.sleep(0.1)
+                if response and len(response) == expected_frame_length(response, False):
+                    self.timeouts.observe(port, device_id,
+                                          time.perf_counter() - sent_at - (len(frameRTU) + len(response)) * char_time)
+                elif not response:
+                    self.timeouts.observe_timeout(port, device_id)
 
-            # Recebendo a resposta
-            self.received_data = ser.read(ser.in_waiting)
+            if response:
+                transaction.crc_ok = check_crc(response)
+                if not transaction.crc_ok:
+                    get_logger(port, device_id).warning("CRC inválido na resposta do dispositivo")
+                else:
+                    transaction.exception_code = exception_code(response)
+                    if transaction.exception_code is not None:
+                        get_logger(port, device_id).warning(
+                            "Resposta de exceção %#04x (%s) à função %d", transaction.exception_code,
+                            exception_name(transaction.exception_code), function)
+            timer.mark("crc")
 
-            print(f"Requisição Enviada: {frameRTU.hex()}")
-            print(f"Resposta do Equipamento: {self.received_data.hex()}\n")
+            # O dump hexadecimal só é gerado (na thread de log) se o nível DEBUG estiver ativo
+            logger = get_logger(port, device_id)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Requisição Enviada: %s | Resposta do Equipamento: %s",
+                             HexBytes(frameRTU), HexBytes(response),
+                             extra={"port": port, "device_id": device_id, "function": function,
+                                    "address": address, "data": data})
 
+            timer.skip()
             ser.close()
+            timer.mark("close")
         except Exception as e:
-            print(f"Erro ao enviar dados: {e}")
+            transaction.error = str(e)
+            self.tuning.forget(port)  # O adaptador pode ter sido reconectado: reaplica na próxima abertura
+            get_logger(port, device_id).warning(
+                "Erro ao enviar dados: %s", e,
+                extra={"port": port, "device_id": device_id, "function": function, "address": address})
+            if ser is not None:
+                try:
+                    ser.close()  # Não deixa o handle da porta aberto depois de uma falha
+                except Exception:
+                    pass
+
+        transaction.stages = timer.stages
+        self.timings.record_stages(port, device_id, function, timer.stages)
+        self._notify_transaction(transaction)
+        return transaction
+
 
@@ -0,0 +1,111 @@
+import threading
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class PollTag:
+    """A register (or block of registers) read periodically by the Poller."""
+    name: str
+    port: str
+    device_id: int
+    address: int
+    count: int = 1
+    function: int = 0x03
+    max_age: float = None  # Idade máxima aceitável de um valor em cache (None = padrão do cache)
+
+
+def merge_tags(tags):
+    """Group tags of the same device and function with contiguous addresses into block reads.
+
+    Returns a list of (PollTag block, [(tag, offset), ...]) so one transaction serves
+    several tags (e.g. position and torque in adjacent registers).
+    """
+    blocks = []
+    ordered = sorted(tags, key=lambda t: (t.port, t.device_id, t.function, t.address))
+    for tag in ordered:
+        if blocks:
+            block, members = blocks[-1]
+            if (block.port, block.device_id, block.function) == (tag.port, tag.device_id, tag.function) \
+                    and block.address <= tag.address <= block.address + block.count \
+                    and tag.address + tag.count - block.address <= 125:
+                block.count = max(block.count, tag.address + tag.count - block.address)
+                if tag.max_age is not None:
+                    block.max_age = tag.max_age if block.max_age is None else min(block.max_age, tag.max_age)
+                members.append((tag, tag.address - block.address))
+                continue
+        block = PollTag(f"{tag.port}/{tag.device_id}/{tag.address}", tag.port, tag.device_id,
+                        tag.address, tag.count, tag.function, tag.max_age)
+        blocks.append((block, [(tag, 0)]))
+    return blocks
+
+
+class Poller:
+    """Read a set of tags periodically, one worker thread per serial port.
+
+    `on_sample(tag, values, timestamp)` is called from the worker threads for every
+    tag read successfully, and `on_scan(port)` after each complete scan of a port.
+    """
+
+    def __init__(self, protocol, tags, interval: float = 0.1, on_sample=None, on_scan=None):
+        self.protocol = protocol
+        self.interval = interval
+        self.on_sample = on_sample
+        self.on_scan = on_scan
+        self.last_scan_duration = {}
+
+        self._stop = threading.Event()
+        self._threads = []
+        self._blocks_by_port = {}
+        self.set_tags(tags)
+
+    def set_tags(self, tags) -> None:
+        blocks_by_port = {}
+        for block, members in merge_tags(tags):
+            blocks_by_port.setdefault(block.port, []).append((block, members))
+        self._blocks_by_port = blocks_by_port
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._run, args=(port,), name=f"poller-{port}", daemon=True)
+                         for port in self._blocks_by_port]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def scan_port(self, port: str) -> None:
+        """Read every block of `port` once."""
+        for block, members in self._blocks_by_port.get(port, []):
+            if self._stop.is_set():
+                return
+            values = self.protocol.read_registers(block.port, block.device_id, block.address,
+                                                  block.count, block.function, block.max_age)
+            if len(values) < block.count or not self.on_sample:
+                continue
+            timestamp = time.time()
+            for tag, offset in members:
+                self.on_sample(tag, values[offset:offset + tag.count], timestamp)
+
+    def _run(self, port: str) -> None:
+        next_scan = time.monotonic()
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.scan_port(port)
+            self.last_scan_duration[port] = time.monotonic() - started
+            if self.on_scan:
+                self.on_scan(port)
+
+            # Mantém a cadência sem acumular atraso quando o ciclo estoura o intervalo
+            next_scan = max(next_scan + self.interval, time.monotonic())
+            self._stop.wait(next_scan - time.monotonic())
@@ -0,0 +1,245 @@
+"""Imagem de processo em memória compartilhada (somente biblioteca padrão).
+
+O processo que lê os barramentos publica os últimos valores de cada tag num bloco
+nomeado; outros processos locais (soft-PLC, registradores de dados) leem direto da
+memória, sem chamada ao serviço:
+
+    from process_image import ProcessImageReader
+
+    with ProcessImageReader("modbus_image") as image:
+        position, timestamp = image.read("V-101/position")
+        values, timestamps = image.snapshot()  # Todos os tags do mesmo ciclo de publicação
+
+Layout do bloco (little-endian):
+
+    0   magic b"MBPI", versão u16, reservado u16
+    8   quantidade de tags u32, quantidade de valores u32, tamanho do índice u32, buffer ativo u32
+    24  sequência do buffer 0 u64, sequência do buffer 1 u64, publicações u64
+    64  índice JSON [[tag, primeiro valor, quantidade], ...], completado até múltiplo de 8
+    ... buffer 0: valores int32[quantidade de valores] (até múltiplo de 8), horários float64[quantidade de tags]
+    ... buffer 1: idem
+
+Cada buffer tem um seqlock: a sequência é ímpar enquanto o escritor o preenche. O
+escritor só escreve no buffer inativo e depois o torna ativo, então um leitor só
+precisa repetir a leitura se o escritor publicar duas vezes enquanto ele lê.
+"""
+import json
+import struct
+import threading
+import time
+from array import array
+from multiprocessing import shared_memory
+
+from modbus_logging import get_logger
+
+MAGIC = b"MBPI"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHIIIIQQQ")
+_HEADER_SIZE = 64
+_ACTIVE = 20  # Deslocamento do índice do buffer ativo
+_SEQUENCES = 24  # Deslocamento das sequências dos buffers (u64 cada)
+_PUBLISHED = 40
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _attach(name: str):
+    """Open an existing block without handing it to this process's resource tracker."""
+    try:
+        return shared_memory.SharedMemory(name, track=False)  # Python 3.13+
+    except TypeError:
+        memory = shared_memory.SharedMemory(name)
+        try:
+            # Antes do 3.13 o resource tracker apagaria o bloco quando o leitor terminasse
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(memory._name, "shared_memory")
+        except (ImportError, AttributeError, KeyError):
+            pass
+        return memory
+
+
+class _Layout:
+    def __init__(self, index):
+        self.index = index  # [[tag, primeiro valor, quantidade], ...]
+        self.tag_count = len(index)
+        self.value_count = sum(count for _, _, count in index)
+        self.index_bytes = json.dumps(index, ensure_ascii=False).encode("utf-8")
+        self.buffers = _HEADER_SIZE + _align(len(self.index_bytes))
+        self.stamps = _align(4 * self.value_count)  # Deslocamento dos horários dentro de um buffer
+        self.buffer_size = self.stamps + 8 * self.tag_count
+        self.size = self.buffers + 2 * self.buffer_size
+        self.values_format = struct.Struct(f"<{self.value_count}i")
+        self.stamps_format = struct.Struct(f"<{self.tag_count}d")
+
+    def buffer(self, number: int) -> int:
+        return self.buffers + number * self.buffer_size
+
+
+class ProcessImageWriter:
+    """Publish the latest tag values into a named shared-memory block.
+
+    update() is a Poller on_sample callback and only changes a private copy;
+    publish() (a Poller on_scan callback) copies it into the inactive buffer and
+    makes that buffer active, so readers always see whole scans. Tags read
+    `count` registers and get `count` int32 slots; a timestamp of 0 means "never read".
+    """
+
+    def __init__(self, name: str, tags):
+        index, offset = [], 0
+        for tag in tags:
+            if any(entry[0] == tag.name for entry in index):
+                continue
+            index.append([tag.name, offset, tag.count])
+            offset += tag.count
+        self.name = name
+        self.layout = _Layout(index)
+        self._slots = {entry[0]: (position, entry[1], entry[2]) for position, entry in enumerate(index)}
+        self._values = array("i", bytes(4 * self.layout.value_count))
+        self._stamps = array("d", bytes(8 * self.layout.tag_count))
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        self.memory = self._create(name, self.layout.size)
+        buffer = self.memory.buf
+        _HEADER.pack_into(buffer, 0, MAGIC, VERSION, 0, self.layout.tag_count, self.layout.value_count,
+                          len(self.layout.index_bytes), 0, 0, 0, 0)
+        buffer[_HEADER_SIZE:_HEADER_SIZE + len(self.layout.index_bytes)] = self.layout.index_bytes
+
+    @staticmethod
+    def _create(name: str, size: int):
+        try:
+            return shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            pass
+        # Bloco deixado por um escritor que terminou sem close() (ex.: processo morto): remove e recria.
+        # Leitores que ainda o tenham aberto continuam com o bloco antigo até reabrir.
+        get_logger().warning("Imagem de processo %s já existia; recriando o bloco", name)
+        stale = shared_memory.SharedMemory(name)
+        stale.close()
+        try:
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        return shared_memory.SharedMemory(name, create=True, size=size)
+
+    def update(self, tag, values, timestamp: float) -> None:
+        slot = self._slots.get(tag.name)
+        if slot is None:
+            return
+        position, offset, count = slot
+        with self._lock:
+            for i, value in enumerate(values[:count]):
+                self._values[offset + i] = value
+            self._stamps[position] = timestamp
+            self._dirty = True
+
+    def publish(self, port=None) -> bool:
+        """Make the pending updates visible to readers; False if there was nothing new."""
+        layout = self.layout
+        buffer = self.memory.buf
+        with self._lock:
+            if not self._dirty:
+                return False
+            target = 1 - struct.unpack_from("<I", buffer, _ACTIVE)[0]
+            sequence_offset = _SEQUENCES + 8 * target
+            sequence = struct.unpack_from("<Q", buffer, sequence_offset)[0] + 1
+            struct.pack_into("<Q", buffer, sequence_offset, sequence)  # Ímpar: buffer em escrita
+
+            start = layout.buffer(target)
+            values = memoryview(self._values).cast("B")
+            buffer[start:start + len(values)] = values
+            stamps = memoryview(self._stamps).cast("B")
+            buffer[start + layout.stamps:start + layout.stamps + len(stamps)] = stamps
+
+            struct.pack_into("<Q", buffer, sequence_offset, sequence + 1)
+            struct.pack_into("<I", buffer, _ACTIVE, target)
+            struct.pack_into("<Q", buffer, _PUBLISHED, struct.unpack_from("<Q", buffer, _PUBLISHED)[0] + 1)
+            self._dirty = False
+        return True
+
+    def close(self) -> None:
+        """Release and remove the block (readers that still have it open keep their mapping)."""
+        self.memory.close()
+        try:
+            self.memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class ProcessImageReader:
+    """Read consistent values from a block published by ProcessImageWriter.
+
+    Values are unpacked straight from the shared mapping; a read is retried only
+    when the writer replaced the buffer while it was being read.
+    """
+
+    def __init__(self, name: str):
+        self.memory = _attach(name)
+        magic, version, _, tag_count, value_count, index_size, *_ = _HEADER.unpack_from(self.memory.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.memory.close()
+            raise ValueError(f"{name} não é uma imagem de processo (versão {VERSION})")
+        index = json.loads(bytes(self.memory.buf[_HEADER_SIZE:_HEADER_SIZE + index_size]).decode("utf-8"))
+        self.layout = _Layout(index)
+        self._slots = {entry[0]: (position, entry[1], entry[2]) for position, entry in enumerate(index)}
+        self.retries = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def tags(self):
+        return list(self._slots)
+
+    @property
+    def publications(self) -> int:
+        """Number of publications so far; poll it to know when there is something new."""
+        return struct.unpack_from("<Q", self.memory.buf, _PUBLISHED)[0]
+
+    def _consistent(self, read):
+        buffer = self.memory.buf
+        while True:
+            active = struct.unpack_from("<I", buffer, _ACTIVE)[0]
+            sequence_offset = _SEQUENCES + 8 * active
+            sequence = struct.unpack_from("<Q", buffer, sequence_offset)[0]
+            if not sequence & 1:
+                result = read(buffer, self.layout.buffer(active))
+                if struct.unpack_from("<Q", buffer, sequence_offset)[0] == sequence:
+                    return result
+            self.retries += 1
+            time.sleep(0)  # Cede a vez ao escritor
+
+    def read(self, tag: str):
+        """(value, timestamp) of a tag; the value is a tuple for tags of more than one register."""
+        position, offset, count = self._slots[tag]
+        stamps = self.layout.stamps
+
+        def read(buffer, start):
+            values = struct.unpack_from(f"<{count}i", buffer, start + 4 * offset)
+            timestamp = struct.unpack_from("<d", buffer, start + stamps + 8 * position)[0]
+            return values[0] if count == 1 else values, timestamp
+
+        return self._consistent(read)
+
+    def snapshot(self):
+        """({tag: value}, {tag: timestamp}) of every tag, all from the same publication."""
+        layout = self.layout
+
+        def read(buffer, start):
+            return (layout.values_format.unpack_from(buffer, start),
+                    layout.stamps_format.unpack_from(buffer, start + layout.stamps))
+
+        values, stamps = self._consistent(read)
+        result, timestamps = {}, {}
+        for name, (position, offset, count) in self._slots.items():
+            result[name] = values[offset] if count == 1 else values[offset:offset + count]
+            timestamps[name] = stamps[position]
+        return result, timestamps
+
+    def close(self) -> None:
+        self.memory.close()
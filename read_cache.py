@@ -0,0 +1,114 @@
+import threading
+import time
+
+
+class _Flight:
+    """A read in progress; concurrent identical reads wait on it instead of using the bus."""
+
+    __slots__ = ("done", "response")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+
+
+class ReadCache:
+    """Read responses keyed by (port, device, function, address, count), with single-flight.
+
+    A response younger than the caller's `max_age` is returned without touching the
+    bus. Otherwise the first caller performs the read while identical concurrent
+    callers wait for its result, so N tabs refreshing the same registers cost one
+    transaction. Only valid responses are cached; writes invalidate the device.
+
+    Every invalidation starts a new generation. A read that was already in flight
+    when it happened may return the value from before the write, so its response
+    is handed to the callers waiting on it but not cached, and reads that start
+    after the invalidation do not join it.
+    """
+
+    def __init__(self, default_ttl: float = 0.1):
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (time.monotonic(), response)
+        self._blocks = {}  # (port, device, function) -> chaves em cache, para busca por faixa
+        self._flights = {}  # key -> _Flight
+        self._generation = 0  # Incrementada a cada invalidação
+
+    def fetch(self, key, read, max_age: float = None, valid=bool):
+        """Cached response for `key`, or the result of `read()` shared with concurrent callers.
+
+        `valid(response)` decides whether a fresh response may be cached.
+        """
+        max_age = self.default_ttl if max_age is None else max_age
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and max_age > 0 and time.monotonic() - entry[0] <= max_age:
+                self.hits += 1
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self._generation
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            return flight.response
+
+        response = None
+        try:
+            response = read()
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                # Uma escrita invalidou o cache durante a leitura: a resposta pode ser anterior a ela
+                if response is not None and generation == self._generation and valid(response):
+                    self._entries[key] = (time.monotonic(), response)
+                    self._blocks.setdefault(key[:3], set()).add(key)
+            flight.response = response
+            flight.done.set()
+        return response
+
+    def covering(self, port, device_id, function, address: int, count: int, max_age: float = None):
+        """A cached read that contains registers address..address+count-1, as (response, its first address).
+
+        Returns None unless some entry no older than `max_age` covers the whole range.
+        """
+        max_age = self.default_ttl if max_age is None else max_age
+        if max_age <= 0:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            for key in self._blocks.get((port, device_id, function), ()):
+                if key[3] <= address and address + count <= key[3] + key[4]:
+                    cached_at, response = self._entries[key]
+                    if now - cached_at <= max_age:
+                        self.hits += 1
+                        return response, key[3]
+        return None
+
+    def invalidate(self, port=None, device_id=None) -> None:
+        """Drop cached reads of one device, of a whole port (device_id None) or of everything."""
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._flights
+                        if port is None or (key[0] == port and device_id in (None, key[1]))]:
+                del self._flights[key]  # Leituras novas não aproveitam uma leitura anterior à escrita
+            if port is None:
+                self._entries.clear()
+                self._blocks.clear()
+                return
+            for block in [block for block in self._blocks if block[0] == port and device_id in (None, block[1])]:
+                for key in self._blocks.pop(block):
+                    del self._entries[key]
+
+    def stats(self) -> dict:
+        return {"hit": self.hits, "miss": self.misses, "coalesced": self.coalesced,
+                "entries": len(self._entries)}
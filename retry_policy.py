@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+
+from device_health import OFFLINE, SUSPECT
+
+# Resultado de uma tentativa
+OK = "ok"
+TIMEOUT = "timeout"
+CRC = "crc"
+EXCEPTION = "exception"
+ERROR = "error"
+
+# Exceções Modbus transitórias: o escravo (ou o gateway) pode atender numa nova tentativa.
+# As demais (função, endereço ou valor ilegal, falha do dispositivo...) se repetem sempre.
+# 0x05 (Acknowledge) não entra: o escravo aceitou o comando e o está executando; repeti-lo
+# enviaria o comando de novo.
+RETRYABLE_EXCEPTIONS = frozenset({
+    0x06,  # Slave Device Busy
+    0x08,  # Memory Parity Error
+    0x0B,  # Gateway Target Device Failed to Respond
+})
+
+
+def classify(transaction) -> str:
+    """Resultado de uma Transaction: OK, TIMEOUT, CRC, EXCEPTION ou ERROR."""
+    if transaction.error:
+        return ERROR
+    if not transaction.response:
+        return TIMEOUT
+    if not transaction.crc_ok:
+        return CRC
+    if transaction.exception_code is not None:
+        return EXCEPTION
+    return OK
+
+
+@dataclass
+class RetryPolicy:
+    """Which failed attempts are repeated, and how soon.
+
+    Timeouts and CRC errors are line noise or a missed frame and are retried
+    immediately; busy exceptions are retried after `busy_delay`, since the slave is
+    still working. Deterministic failures (illegal address, port that cannot be
+    opened...) fail fast: repeating them only wastes bus time.
+
+    A timeout from a device that is already suspect or offline is not retried:
+    it most likely is dead, and each retry would cost another full timeout.
+    """
+    max_retries: int = 2
+    retry_timeouts: bool = True
+    retry_crc_errors: bool = True
+    retry_errors: bool = False  # Falhas de E/S locais (porta inexistente, permissão)
+    retryable_exceptions: frozenset = RETRYABLE_EXCEPTIONS
+    busy_delay: float = 0.05
+
+    def should_retry(self, transaction, attempt: int, state: str = None) -> bool:
+        """True if the attempt number `attempt` (0 = first) should be repeated.
+
+        `state` is the device's DeviceHealth state before this exchange.
+        """
+        if attempt >= self.max_retries or transaction.device_id == 0:
+            return False  # Broadcast não tem resposta para confirmar
+        outcome = classify(transaction)
+        if outcome == TIMEOUT:
+            return self.retry_timeouts and state not in (SUSPECT, OFFLINE)
+        if outcome == CRC:
+            return self.retry_crc_errors
+        if outcome == EXCEPTION:
+            return transaction.exception_code in self.retryable_exceptions
+        if outcome == ERROR:
+            return self.retry_errors
+        return False
+
+    def delay(self, transaction) -> float:
+        """Seconds to wait before the next attempt."""
+        return self.busy_delay if classify(transaction) == EXCEPTION else 0.0
+
+
+NO_RETRY = RetryPolicy(max_retries=0)
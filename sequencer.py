@@ -0,0 +1,277 @@
+import json
+import operator
+import threading
+import time
+from dataclasses import dataclass, field
+
+from actuator_data import actuators_data, actuators_registers
+from modbus_logging import get_logger
+
+_OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+_COMMANDS = {"open": "data_open", "close": "data_close"}
+
+
+class SequenceError(Exception):
+    """A recipe is invalid, or one of its steps failed while running."""
+
+
+class SequenceAborted(SequenceError):
+    """The sequence was stopped (Sequencer.stop or a failed parallel branch)."""
+
+
+@dataclass
+class SequenceResult:
+    name: str
+    ok: bool = False
+    duration: float = 0.0
+    error: str = ""
+    log: list = field(default_factory=list)  # (segundos desde o início, descrição)
+
+
+def load_recipe(path: str) -> dict:
+    """Read a recipe file; raises SequenceError if its structure or value types are wrong."""
+    with open(path, "r", encoding="utf-8") as recipe_file:
+        recipe = json.load(recipe_file)
+    if not isinstance(recipe, dict) or not isinstance(recipe.get("steps"), list):
+        raise SequenceError("Receita sem lista de passos (\"steps\")")
+    _check_types(recipe["steps"], "steps")
+    return recipe
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_types(steps, path: str) -> None:
+    """Type checks that need no device registry (values, timeouts, nesting)."""
+    for index, step in enumerate(steps):
+        where = f"{path}[{index}]"
+        if not isinstance(step, dict):
+            raise SequenceError(f"{where}: passo inválido {step!r}")
+        if "write" in step:
+            spec = step["write"]
+            if not isinstance(spec, dict):
+                raise SequenceError(f"{where}: escrita inválida {spec!r}")
+            for key in ("address", "value"):
+                if key in spec and (not isinstance(spec[key], int) or isinstance(spec[key], bool)):
+                    raise SequenceError(f"{where}: \"{key}\" deve ser inteiro, não {spec[key]!r}")
+        elif "wait_until" in step:
+            condition = step["wait_until"]
+            if not isinstance(condition, dict):
+                raise SequenceError(f"{where}: condição inválida {condition!r}")
+            if "value" in condition and not _is_number(condition["value"]):
+                raise SequenceError(f"{where}: \"value\" deve ser numérico, não {condition['value']!r}")
+            if "timeout" in condition and (not _is_number(condition["timeout"]) or not condition["timeout"] >= 0):
+                raise SequenceError(f"{where}: timeout inválido {condition['timeout']!r}")
+        elif "parallel" in step:
+            branches = step["parallel"]
+            if not isinstance(branches, list) or not all(isinstance(branch, list) for branch in branches):
+                raise SequenceError(f"{where}: \"parallel\" deve ser uma lista de listas de passos")
+            for branch_index, branch in enumerate(branches):
+                _check_types(branch, f"{where}.parallel[{branch_index}]")
+        elif "repeat" in step:
+            if not isinstance(step.get("steps", []), list):
+                raise SequenceError(f"{where}: \"steps\" deve ser uma lista")
+            _check_types(step.get("steps", []), f"{where}.steps")
+
+
+class Sequencer:
+    """Run recipes: timed sequences of writes, condition waits and parallel branches.
+
+    A recipe is JSON with a name and a list of steps:
+
+        {"name": "ciclo A/B",
+         "steps": [
+            {"write": {"device": "V-101", "command": "open"}},
+            {"wait_until": {"device": "V-101", "register": "position", "op": ">=", "value": 900,
+                            "timeout": 30}},
+            {"parallel": [[{"write": {"device": "V-102", "command": "close"}}],
+                          [{"write": {"device": "V-201", "address": 5, "value": 100}}]]},
+            {"hold": 5},
+            {"repeat": 3, "steps": [...]}
+         ]}
+
+    Writes are sent immediately (bypassing redundant-write suppression) and must be
+    confirmed by the device's echo. Waits poll the register through the read cache
+    every `poll_interval` seconds, so they end as soon as the condition holds instead
+    of after a worst-case sleep. Parallel branches run in their own threads; branches
+    on different ports run concurrently, branches on the same port share its lock.
+    """
+
+    def __init__(self, protocol, registry, poll_interval: float = 0.05):
+        self.protocol = protocol
+        self.registry = registry
+        self.poll_interval = poll_interval
+        self.on_step = None  # Chamado com (segundos desde o início, descrição) a cada passo
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def validate(self, recipe: dict) -> None:
+        """Raise SequenceError for an invalid recipe before anything is sent to the devices."""
+        if not isinstance(recipe.get("steps"), list):
+            raise SequenceError("Receita sem lista de passos (\"steps\")")
+        _check_types(recipe["steps"], "steps")
+        self._validate_steps(recipe["steps"], "steps")
+
+    def _validate_steps(self, steps, path: str) -> None:
+        for index, step in enumerate(steps):
+            where = f"{path}[{index}]"
+            if not isinstance(step, dict) or len(step.keys() - {"steps"}) != 1:
+                raise SequenceError(f"{where}: passo inválido {step!r}")
+            if "write" in step:
+                self._write_target(step["write"], where)
+            elif "wait_until" in step:
+                condition = step["wait_until"]
+                self._read_target(condition, where)
+                if condition.get("op", "==") not in _OPERATORS or "value" not in condition:
+                    raise SequenceError(f"{where}: condição inválida {condition!r}")
+            elif "hold" in step:
+                if not _is_number(step["hold"]) or not step["hold"] >= 0:  # bool é int; NaN falha em >=
+                    raise SequenceError(f"{where}: tempo inválido {step['hold']!r}")
+            elif "parallel" in step:
+                for branch_index, branch in enumerate(step["parallel"]):
+                    self._validate_steps(branch, f"{where}.parallel[{branch_index}]")
+            elif "repeat" in step:
+                if not isinstance(step["repeat"], int) or isinstance(step["repeat"], bool) or step["repeat"] < 0:
+                    raise SequenceError(f"{where}: repetição inválida {step['repeat']!r}")
+                self._validate_steps(step.get("steps", []), f"{where}.steps")
+            else:
+                raise SequenceError(f"{where}: tipo de passo desconhecido {list(step)!r}")
+
+    def _device(self, spec: dict, where: str):
+        device = self.registry.devices.get(spec.get("device"))
+        if device is None:
+            raise SequenceError(f"{where}: dispositivo desconhecido {spec.get('device')!r}")
+        return device
+
+    def _write_target(self, spec: dict, where: str):
+        """(device, address, value) of a write step."""
+        device = self._device(spec, where)
+        if "command" in spec:
+            if spec["command"] not in _COMMANDS:
+                raise SequenceError(f"{where}: comando desconhecido {spec['command']!r}")
+            model = actuators_data[device.model]
+            return device, model["address"], model[_COMMANDS[spec["command"]]]
+        if "address" not in spec or "value" not in spec:
+            raise SequenceError(f"{where}: escrita sem \"command\" ou \"address\"/\"value\"")
+        return device, int(spec["address"]), int(spec["value"])
+
+    def _read_target(self, spec: dict, where: str):
+        """(device, address) of a wait condition."""
+        device = self._device(spec, where)
+        if "register" in spec:
+            registers = actuators_registers.get(device.model, {})
+            if spec["register"] not in registers:
+                raise SequenceError(f"{where}: registrador desconhecido {spec['register']!r}")
+            return device, registers[spec["register"]]
+        if "address" not in spec:
+            raise SequenceError(f"{where}: condição sem \"register\" ou \"address\"")
+        return device, int(spec["address"])
+
+    def run(self, recipe: dict) -> SequenceResult:
+        """Validate and run a recipe; never raises for step failures (see SequenceResult.error)."""
+        result = SequenceResult(recipe.get("name", "receita"))
+        self.validate(recipe)
+        self._stop.clear()
+        started = time.monotonic()
+
+        def log(description: str) -> None:
+            entry = (time.monotonic() - started, description)
+            result.log.append(entry)
+            get_logger().info("[%s] %.3f s: %s", result.name, *entry)
+            if self.on_step:
+                self.on_step(*entry)
+
+        try:
+            self._run_steps(recipe["steps"], log)
+            result.ok = True
+        except SequenceError as e:
+            result.error = str(e)
+            log(f"ERRO: {e}")
+        except Exception as e:
+            get_logger().exception("Erro inesperado na receita %s", result.name)
+            result.error = f"{type(e).__name__}: {e}"
+            log(f"ERRO: {result.error}")
+        finally:
+            result.duration = time.monotonic() - started
+        return result
+
+    def _run_steps(self, steps, log) -> None:
+        for step in steps:
+            if self._stop.is_set():
+                raise SequenceAborted("Sequência interrompida")
+            if "write" in step:
+                self._write(step["write"], log)
+            elif "wait_until" in step:
+                self._wait_until(step["wait_until"], log)
+            elif "hold" in step:
+                if self._stop.wait(step["hold"]):
+                    raise SequenceAborted("Sequência interrompida")
+                log(f"aguardou {step['hold']} s")
+            elif "parallel" in step:
+                self._parallel(step["parallel"], log)
+            elif "repeat" in step:
+                for _ in range(step["repeat"]):
+                    self._run_steps(step.get("steps", []), log)
+
+    def _write(self, spec: dict, log) -> None:
+        device, address, value = self._write_target(spec, "write")
+        self.protocol.exchange(device.port, device.slave_id, 0x06, address, value, force=True)
+        if self.protocol.writes.last_confirmed(device.port, device.slave_id, 0x06, address) != value:
+            raise SequenceError(f"{device.name} não confirmou a escrita de {value} em {address}")
+        log(f"{device.name}[{address}] = {value}")
+
+    def _wait_until(self, condition: dict, log) -> None:
+        device, address = self._read_target(condition, "wait_until")
+        compare = _OPERATORS[condition.get("op", "==")]
+        expected = condition["value"]
+        timeout = condition.get("timeout", 60.0)
+        deadline = time.monotonic() + timeout
+        while True:
+            next_poll = time.monotonic() + self.poll_interval
+            values = self.protocol.read_registers(device.port, device.slave_id, address, 1,
+                                                  max_age=self.poll_interval)
+            if values and compare(values[0], expected):
+                log(f"{device.name}[{address}] = {values[0]} {condition.get('op', '==')} {expected}")
+                return
+            if time.monotonic() >= deadline:
+                raise SequenceError(f"{device.name}[{address}] não atingiu {condition.get('op', '==')} "
+                                    f"{expected} em {timeout} s (último valor: {values[0] if values else '-'})")
+            if self._stop.wait(max(next_poll - time.monotonic(), 0)):
+                raise SequenceAborted("Sequência interrompida")
+
+    def _parallel(self, branches, log) -> None:
+        errors = []
+
+        def run_branch(steps):
+            try:
+                self._run_steps(steps, log)
+            except SequenceError as e:
+                errors.append(e)
+                self._stop.set()  # Uma ramificação com falha interrompe as demais
+            except Exception as e:
+                # Sem isto a thread morreria calada e a sequência terminaria como bem-sucedida
+                get_logger().exception("Erro inesperado numa ramificação paralela")
+                errors.append(SequenceError(f"Ramificação falhou: {type(e).__name__}: {e}"))
+                self._stop.set()
+
+        threads = [threading.Thread(target=run_branch, args=(branch,), name="sequence-branch", daemon=True)
+                   for branch in branches]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            # A causa original, não o SequenceAborted das ramificações interrompidas
+            failures = [e for e in errors if not isinstance(e, SequenceAborted)]
+            raise (failures or errors)[0]
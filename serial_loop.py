@@ -0,0 +1,525 @@
+import collections
+import os
+import select
+import selectors
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+from modbus_frames import (append_crc, check_crc, decode_register_values, exception_code, exception_name,
+                           expected_frame_length, expected_response_length, WRITE_FUNCTIONS)
+from modbus_logging import get_logger
+from poller import merge_tags
+
+
+class _Timer:
+    __slots__ = ("due", "callback", "cancelled")
+
+    def __init__(self, due, callback):
+        self.due = due
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) schedule and cancel, expiry rounded up to `tick` seconds.
+
+    Timers more than `slots` ticks away stay in their slot until the wheel has
+    turned enough times; cancelled timers are dropped when their slot is visited.
+    """
+
+    def __init__(self, tick: float = 0.001, slots: int = 512):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.pending = 0
+        self._origin = time.monotonic()
+        self._current = 0  # Último tick processado
+
+    def _tick_at(self, when: float) -> int:
+        return int((when - self._origin) / self.tick)
+
+    def schedule(self, delay: float, callback) -> _Timer:
+        due = max(self._tick_at(time.monotonic() + delay) + 1, self._current + 1)
+        timer = _Timer(due, callback)
+        self.slots[due % len(self.slots)].append(timer)
+        self.pending += 1
+        return timer
+
+    def next_timeout(self):
+        """Seconds until the next occupied tick (None if there are no timers)."""
+        if not self.pending:
+            return None
+        count = len(self.slots)
+        for ahead in range(1, count + 1):
+            if self.slots[(self._current + ahead) % count]:
+                due = self._current + ahead
+                break
+        else:
+            due = self._current + count
+        return max(self._origin + due * self.tick - time.monotonic(), 0.0)
+
+    def advance(self) -> None:
+        """Run the callbacks of every timer due by now."""
+        now_tick = self._tick_at(time.monotonic())
+        count = len(self.slots)
+        while self._current < now_tick and self.pending:
+            self._current += 1
+            slot = self.slots[self._current % count]
+            if not slot:
+                continue
+            expired = [timer for timer in slot if timer.due <= self._current]
+            if not expired:
+                continue
+            slot[:] = [timer for timer in slot if timer.due > self._current]
+            self.pending -= len(expired)
+            for timer in expired:
+                if not timer.cancelled:
+                    timer.callback()
+        self._current = max(self._current, now_tick)
+
+
+class _Request:
+    __slots__ = ("device_id", "function", "address", "data", "future", "callback", "frame", "transaction",
+                 "sent_at")
+
+    def __init__(self, device_id, function, address, data, future, callback):
+        self.device_id = device_id
+        self.function = function
+        self.address = address
+        self.data = data
+        self.future = future
+        self.callback = callback
+        self.frame = append_crc(struct.pack(">BBHH", device_id, function, address & 0xFFFF, data & 0xFFFF))
+        self.transaction = None
+        self.sent_at = 0.0
+
+
+class _Bus:
+    __slots__ = ("port", "serial", "fd", "queue", "current", "pending_write", "response", "timer", "ready_at",
+                 "events", "closed")
+
+    def __init__(self, port, serial_port):
+        self.port = port
+        self.serial = serial_port
+        self.fd = serial_port.fileno()
+        self.queue = collections.deque()
+        self.current = None
+        self.pending_write = b""
+        self.response = bytearray()
+        self.timer = None
+        self.ready_at = 0.0  # Fim do silêncio entre frames
+        self.events = selectors.EVENT_READ
+        self.closed = False  # Porta perdida (adaptador desconectado): o próximo pedido abre outra
+
+
+def _hung_up(fd: int) -> bool:
+    """True if the descriptor reports a hang-up or error (a read of 0 bytes alone can be spurious on a tty)."""
+    poller = select.poll()
+    poller.register(fd, select.POLLIN)
+    return any(events & (select.POLLHUP | select.POLLERR | select.POLLNVAL) for _, events in poller.poll(0))
+
+
+class SerialEventLoop:
+    """One thread driving many serial ports with non-blocking I/O and a selector (epoll on Linux).
+
+    Each port is opened once and kept open; its file descriptor is non-blocking
+    and registered in the selector. Requests wait in a queue per port and are
+    sent only after the previous exchange and the 3.5-character silence, so
+    ports run concurrently while each bus keeps a single master. Response
+    timeouts, inter-frame gaps and broadcast delays are timer-wheel entries, so
+    a mostly idle loop does not wake up unless something is due.
+
+    The protocol's adaptive timeouts, device health and transaction listeners
+    are used as in ModbusProtocol.exchange (retries and the read cache are not).
+    A port that reports end of file, an I/O error or a hang-up (USB adapter
+    unplugged) is closed and its requests fail; the next request reopens it.
+    While the loop owns a port, other code must send through request()/submit().
+    POSIX only: pyserial has no file descriptor on Windows.
+    """
+
+    def __init__(self, protocol, tick: float = 0.001):
+        self.protocol = protocol
+        self.wheel = TimerWheel(tick)
+        self.selector = selectors.DefaultSelector()
+        self.buses = {}
+        self._inbox = collections.deque()
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        os.set_blocking(self._wake_write, False)
+        self.selector.register(self._wake_read, selectors.EVENT_READ, None)
+        self._thread = None
+        self._running = False
+
+        self.char_time = protocol.bits_per_char / protocol.baudrate
+        self.gap = max(3.5 * self.char_time, 0.00175)  # O padrão fixa 1,75 ms acima de 19200 bps
+        self.silence = max(3.5 * self.char_time, 0.005)  # Fim de frame de tamanho imprevisível (como em exchange)
+
+    # Ciclo de vida
+
+    def start(self) -> None:
+        self._running = True
+        self._thread = threading.Thread(target=self.run, name="serial-loop", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.call_soon_threadsafe(self._shutdown)
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self) -> None:
+        self._running = True
+        while self._running:
+            for key, events in self.selector.select(self.wheel.next_timeout()):
+                if key.data is None:
+                    self._drain_inbox()
+                    continue
+                bus = key.data
+                # Um hang-up chega como leitura e escrita, mesmo sem escrita pendente
+                if events & selectors.EVENT_WRITE and bus.pending_write and not bus.closed:
+                    self._write(bus)
+                if events & selectors.EVENT_READ and not bus.closed:
+                    self._read(bus)
+            self.wheel.advance()
+        for bus in self.buses.values():
+            self.selector.unregister(bus.fd)
+            bus.serial.close()
+        self.buses = {}
+
+    def _shutdown(self) -> None:
+        self._running = False
+        for bus in self.buses.values():
+            for request in [bus.current, *bus.queue]:
+                if request is not None:
+                    self._resolve(request, None)
+            bus.queue.clear()
+            bus.current = None
+
+    def call_soon_threadsafe(self, callback) -> None:
+        self._inbox.append(callback)
+        try:
+            os.write(self._wake_write, b"\0")
+        except BlockingIOError:
+            pass  # O pipe já tem bytes: o loop vai acordar de qualquer forma
+
+    def call_later(self, delay: float, callback) -> _Timer:
+        """Schedule `callback` on the loop (loop thread only)."""
+        return self.wheel.schedule(delay, callback)
+
+    def _drain_inbox(self) -> None:
+        try:
+            while os.read(self._wake_read, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        while self._inbox:
+            self._inbox.popleft()()
+
+    # Requisições
+
+    def submit(self, port, device_id, function, address, data, callback=None) -> Future:
+        """Queue a request (any thread); `callback(response)` runs on the loop thread when it completes."""
+        request = _Request(device_id, function, address, data, Future(), callback)
+        self.call_soon_threadsafe(lambda: self._enqueue(port, request))
+        return request.future
+
+    def request(self, port, device_id, function, address, data, timeout: float = None):
+        """Blocking submit(); returns the response frame or None."""
+        return self.submit(port, device_id, function, address, data).result(timeout)
+
+    def _bus(self, port) -> _Bus:
+        bus = self.buses.get(port)
+        if bus is None:
+            import serial
+            settings = self.protocol.serial_settings
+            serial_port = serial.Serial(port=port, baudrate=settings["baudrate"], bytesize=settings["bytesize"],
+                                        parity=settings["parity"], stopbits=settings["stopbits"], timeout=0)
+            os.set_blocking(serial_port.fileno(), False)
+            self.protocol.tuning.ensure(port, serial_port)
+            bus = self.buses[port] = _Bus(port, serial_port)
+            self.selector.register(bus.fd, selectors.EVENT_READ, bus)
+        return bus
+
+    def _enqueue(self, port, request: _Request) -> None:
+        if not self._running:
+            self._resolve(request, None)
+            return
+        try:
+            bus = self._bus(port)
+        except Exception as e:
+            get_logger(port).warning("Não foi possível abrir a porta: %s", e)
+            self._resolve(request, None)
+            return
+        bus.queue.append(request)
+        self._start_next(bus)
+
+    def _start_next(self, bus: _Bus) -> None:
+        while bus.current is None and bus.queue:
+            wait = bus.ready_at - time.monotonic()
+            if wait > 0:
+                if bus.timer is None:
+                    bus.timer = self.wheel.schedule(wait, lambda: self._gap_elapsed(bus))
+                return
+            request = bus.queue.popleft()
+            if not self.protocol.health.allow_request(bus.port, request.device_id):
+                self._resolve(request, None)
+                continue
+            self._send(bus, request)
+
+    def _gap_elapsed(self, bus: _Bus) -> None:
+        bus.timer = None
+        self._start_next(bus)
+
+    def _send(self, bus: _Bus, request: _Request) -> None:
+        from modbus_protocol import Transaction
+
+        try:
+            while os.read(bus.fd, 4096):  # Descarta bytes atrasados da transação anterior
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        bus.current = request
+        bus.response = bytearray()
+        request.transaction = Transaction(time.time(), bus.port, request.device_id, request.function,
+                                          request.address, request.data, request=request.frame)
+        bus.pending_write = request.frame
+        self._write(bus)
+
+    def _write(self, bus: _Bus) -> None:
+        request = bus.current
+        try:
+            written = os.write(bus.fd, bus.pending_write)
+        except BlockingIOError:
+            written = 0
+        except OSError as e:
+            request.transaction.error = str(e)
+            self._close_bus(bus, str(e))
+            return
+        bus.pending_write = bus.pending_write[written:]
+        if bus.pending_write:
+            self._set_events(bus, selectors.EVENT_READ | selectors.EVENT_WRITE)
+            return
+        self._set_events(bus, selectors.EVENT_READ)
+
+        request.transaction.tx_time_ns = time.time_ns()
+        request.sent_at = time.monotonic()
+        frame_time = len(request.frame) * self.char_time  # O write retorna antes de o frame sair pela linha
+        if request.device_id == 0:
+            bus.timer = self.wheel.schedule(frame_time + self.protocol.broadcast_delay, lambda: self._complete(bus))
+            return
+        wire_time = (len(request.frame) + expected_response_length(request.function, request.data)) * self.char_time
+        timeout = self.protocol.timeouts.timeout(bus.port, request.device_id, wire_time)
+        bus.timer = self.wheel.schedule(timeout, lambda: self._timed_out(bus))
+
+    def _set_events(self, bus: _Bus, events: int) -> None:
+        if bus.events != events:
+            self.selector.modify(bus.fd, events, bus)
+            bus.events = events
+
+    def _read(self, bus: _Bus) -> None:
+        try:
+            data = os.read(bus.fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._close_bus(bus, str(e))  # EIO: o dispositivo sumiu
+            return
+        if not data:
+            if _hung_up(bus.fd):
+                self._close_bus(bus, "desconectada")
+            return
+        request = bus.current
+        if request is None or request.device_id == 0 or bus.pending_write:
+            return  # Ruído ou eco fora de uma transação
+        bus.response += data
+        expected = expected_frame_length(bus.response, False)
+        if expected is None:
+            # Tamanho imprevisível: o frame termina no silêncio entre caracteres
+            if bus.timer is not None:
+                bus.timer.cancel()
+            bus.timer = self.wheel.schedule(self.silence, lambda: self._complete(bus))
+        elif expected and len(bus.response) >= expected:
+            self._complete(bus)
+
+    def _timed_out(self, bus: _Bus) -> None:
+        bus.timer = None
+        self._complete(bus)
+
+    def _complete(self, bus: _Bus) -> None:
+        request = bus.current
+        if request is None:
+            return
+        if bus.timer is not None:
+            bus.timer.cancel()
+            bus.timer = None
+        bus.current = None
+        bus.pending_write = b""
+        if not bus.closed:
+            self._set_events(bus, selectors.EVENT_READ)
+        transaction = request.transaction
+        response = bytes(bus.response)
+        port, device_id = bus.port, request.device_id
+
+        if device_id:
+            transaction.response = response
+            transaction.rx_time_ns = time.time_ns()
+            expected = expected_frame_length(response, False) if response else 0
+            if response and len(response) == expected:
+                self.protocol.timeouts.observe(port, device_id, time.monotonic() - request.sent_at
+                                               - (len(request.frame) + len(response)) * self.char_time)
+            elif not response:
+                self.protocol.timeouts.observe_timeout(port, device_id)
+            if response:
+                transaction.crc_ok = check_crc(response)
+                if transaction.crc_ok:
+                    transaction.exception_code = exception_code(response)
+                    if transaction.exception_code is not None:
+                        get_logger(port, device_id).warning(
+                            "Resposta de exceção %#04x (%s) à função %d", transaction.exception_code,
+                            exception_name(transaction.exception_code), request.function)
+                else:
+                    get_logger(port, device_id).warning("CRC inválido na resposta do dispositivo")
+            if transaction.error or not response or not transaction.crc_ok:
+                self.protocol.health.record_failure(port, device_id)
+            else:
+                self.protocol.health.record_success(port, device_id)
+        if request.function in WRITE_FUNCTIONS:
+            self.protocol.read_cache.invalidate(port, device_id or None)
+            if device_id:
+                self.protocol.writes.commanded(port, device_id, request.function, request.address, request.data,
+                                               transaction.request, transaction.response)
+            else:
+                self.protocol.writes.forget(port)
+
+        self.protocol._notify_transaction(transaction)
+        bus.ready_at = time.monotonic() + self.gap
+        self._resolve(request, response if device_id and response else None)
+        if not bus.closed:
+            self._start_next(bus)
+
+    def _close_bus(self, bus: _Bus, reason: str) -> None:
+        """Drop a port that stopped working: fail its requests; the next request reopens it."""
+        if bus.closed:
+            return
+        bus.closed = True
+        get_logger(bus.port).warning("Porta fechada pelo loop serial: %s", reason)
+        if self.buses.get(bus.port) is bus:
+            del self.buses[bus.port]
+        try:
+            self.selector.unregister(bus.fd)
+        except (KeyError, ValueError):
+            pass
+        try:
+            bus.serial.close()
+        except Exception:
+            pass
+        self.protocol.tuning.forget(bus.port)  # Um adaptador reconectado precisa do ajuste de novo
+        if bus.current is not None:
+            bus.current.transaction.error = bus.current.transaction.error or reason
+            self._complete(bus)
+        elif bus.timer is not None:
+            bus.timer.cancel()
+            bus.timer = None
+        queued = list(bus.queue)
+        bus.queue.clear()
+        for request in queued:
+            self._resolve(request, None)
+
+    def _resolve(self, request: _Request, response) -> None:
+        if request.callback is not None:
+            try:
+                request.callback(response)
+            except Exception:
+                get_logger().exception("Erro no retorno de uma requisição do loop serial")
+        if not request.future.done():
+            request.future.set_result(response)
+
+
+class LoopPoller:
+    """Poller running on a SerialEventLoop: every port is scanned from the loop thread.
+
+    Same interface as Poller. A scan queues all block reads of a port at once
+    (they go out back to back, separated only by the inter-frame gap); the next
+    scan is a timer `interval` after the previous one started. on_sample and
+    on_scan are called from the loop thread.
+    """
+
+    def __init__(self, loop: SerialEventLoop, tags, interval: float = 0.1, on_sample=None, on_scan=None):
+        self.loop = loop
+        self.interval = interval
+        self.on_sample = on_sample
+        self.on_scan = on_scan
+        self.last_scan_duration = {}
+        self._blocks_by_port = {}
+        self._timers = {}
+        self._running = False
+        self._generation = 0  # Cada start() começa uma nova cadeia de varreduras; as antigas param sozinhas
+        self.set_tags(tags)
+
+    def set_tags(self, tags) -> None:
+        blocks_by_port = {}
+        for block, members in merge_tags(tags):
+            blocks_by_port.setdefault(block.port, []).append((block, members))
+        self._blocks_by_port = blocks_by_port
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._generation += 1
+        generation = self._generation
+        for port in self._blocks_by_port:
+            self.loop.call_soon_threadsafe(lambda port=port: self._scan(port, generation))
+
+    def stop(self) -> None:
+        self._running = False
+        done = threading.Event()
+
+        def cancel():
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers = {}
+            done.set()
+
+        self.loop.call_soon_threadsafe(cancel)
+        done.wait(1.0)
+
+    def _scan(self, port, generation: int) -> None:
+        if not self._running or generation != self._generation:
+            return
+        blocks = self._blocks_by_port.get(port, [])
+        started = time.monotonic()
+        remaining = [len(blocks)]
+
+        def finished():
+            self.last_scan_duration[port] = time.monotonic() - started
+            if self.on_scan:
+                self.on_scan(port)
+            # Respostas de uma varredura anterior a stop()/start() não agendam uma segunda cadeia
+            if self._running and generation == self._generation:
+                self._timers[port] = self.loop.call_later(
+                    max(started + self.interval - time.monotonic(), 0), lambda: self._scan(port, generation))
+
+        def on_response(block, members, response):
+            values = decode_register_values(response) if response and check_crc(response) else []
+            if len(values) >= block.count and self.on_sample:
+                timestamp = time.time()
+                for tag, offset in members:
+                    self.on_sample(tag, values[offset:offset + tag.count], timestamp)
+            remaining[0] -= 1
+            if not remaining[0]:
+                finished()
+
+        if not blocks:
+            return
+        for block, members in blocks:
+            self.loop.submit(port, block.device_id, block.function, block.address, block.count,
+                             callback=lambda response, block=block, members=members:
+                             on_response(block, members, response))
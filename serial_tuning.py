@@ -0,0 +1,173 @@
+import importlib.util
+import os
+import struct
+import threading
+
+from modbus_logging import get_logger
+
+# ioctls do Linux (x86/ARM; alpha, mips, powerpc e sparc usam outros números)
+TIOCGSERIAL = 0x541E
+TIOCSSERIAL = 0x541F
+TIOCGRS485 = 0x542E
+TIOCSRS485 = 0x542F
+
+ASYNC_LOW_LATENCY = 1 << 13
+_SERIAL_FLAGS = 16  # Deslocamento de `flags` em struct serial_struct (type, line, port, irq, flags, ...)
+_SERIAL_STRUCT_SIZE = 128  # Maior que a struct em qualquer arquitetura; o kernel só usa o início
+
+SER_RS485_ENABLED = 1 << 0
+SER_RS485_RTS_ON_SEND = 1 << 1
+SER_RS485_RTS_AFTER_SEND = 1 << 2
+SER_RS485_RX_DURING_TX = 1 << 4
+_RS485 = struct.Struct("=IIII16x")  # flags, atraso antes do envio (ms), atraso depois do envio (ms), reservado
+
+
+def _fileno(port_or_fd) -> int:
+    return port_or_fd if isinstance(port_or_fd, int) else port_or_fd.fileno()
+
+
+def _latency_timer_path(port: str) -> str:
+    # /dev/serial/by-id/... é um link para /dev/ttyUSBn
+    return f"/sys/class/tty/{os.path.basename(os.path.realpath(port))}/device/latency_timer"
+
+
+class SerialTuning:
+    """Linux driver settings for low-latency, half-duplex RS-485 serial ports.
+
+    With `low_latency` the port gets ASYNC_LOW_LATENCY (TIOCSSERIAL), so the
+    driver pushes received bytes to the reader at once instead of batching them,
+    and USB adapters that expose a `latency_timer` in sysfs (FTDI: 16 ms by
+    default) get `latency_timer` ms. With `rs485` the kernel drives RTS for the
+    transceiver (TIOCSRS485): RTS is asserted while sending (or the opposite with
+    `rts_on_send=False`) with `delay_before`/`delay_after` ms around the frame.
+
+    Settings are applied once per port, when it is first opened, and stay in the
+    driver while the device exists; forget() makes the next open apply them again
+    (e.g. after the adapter was unplugged). Drivers and platforms without support
+    (Windows, macOS, ptys) leave the port as it is; effective() reports what the
+    driver actually accepted.
+    """
+
+    def __init__(self, low_latency: bool = False, latency_timer: int = 1, rs485: bool = False,
+                 rts_on_send: bool = True, delay_before: int = 0, delay_after: int = 0, rx_during_tx: bool = False):
+        self.low_latency = low_latency
+        self.latency_timer = latency_timer
+        self.rs485 = rs485
+        self.rts_on_send = rts_on_send
+        self.delay_before = delay_before
+        self.delay_after = delay_after
+        self.rx_during_tx = rx_during_tx
+        self._lock = threading.Lock()
+        self._effective = {}  # porta -> configuração lida do driver depois de aplicar
+
+    @property
+    def enabled(self) -> bool:
+        return self.low_latency or self.rs485
+
+    def options(self) -> dict:
+        """Constructor arguments reproducing these settings (e.g. in another process)."""
+        return {"low_latency": self.low_latency, "latency_timer": self.latency_timer, "rs485": self.rs485,
+                "rts_on_send": self.rts_on_send, "delay_before": self.delay_before,
+                "delay_after": self.delay_after, "rx_during_tx": self.rx_during_tx}
+
+    def ensure(self, port: str, serial_port) -> None:
+        """Apply the settings to an open port unless that port was already tuned (cheap when disabled)."""
+        if not self.enabled or port in self._effective:
+            return
+        with self._lock:
+            if port not in self._effective:
+                self._effective[port] = self.apply(port, serial_port)
+
+    def forget(self, port=None) -> None:
+        with self._lock:
+            if port is None:
+                self._effective.clear()
+            else:
+                self._effective.pop(port, None)
+
+    def effective(self, port=None) -> dict:
+        """Settings read back from the driver ({port: settings} without `port`)."""
+        if port is None:
+            return dict(self._effective)
+        return self._effective.get(port)
+
+    def apply(self, port: str, serial_port) -> dict:
+        """Apply the settings to an open port (pyserial object or fd) and return the effective settings."""
+        fd = _fileno(serial_port)
+        logger = get_logger(port)
+        if importlib.util.find_spec("fcntl") is None:  # Só existe em sistemas POSIX
+            logger.info("Ajuste de latência e RS-485 do kernel só existe no Linux")
+            return read_settings(port, fd)
+        if self.low_latency:
+            try:
+                set_low_latency(fd, True)
+            except OSError as e:
+                logger.info("Porta sem suporte a ASYNC_LOW_LATENCY: %s", os.strerror(e.errno))
+            try:
+                with open(_latency_timer_path(port), "w") as latency_timer:
+                    latency_timer.write(str(self.latency_timer))
+            except OSError:
+                pass  # Adaptador sem latency_timer (não FTDI) ou sem permissão de escrita
+        if self.rs485:
+            try:
+                set_rs485(fd, True, self.rts_on_send, self.delay_before, self.delay_after, self.rx_during_tx)
+            except OSError as e:
+                logger.warning("Porta sem suporte a RS-485 no kernel (TIOCSRS485): %s", os.strerror(e.errno))
+        settings = read_settings(port, fd)
+        logger.info("Configuração efetiva da porta: %s", settings)
+        return settings
+
+
+def set_low_latency(fd: int, enabled: bool = True) -> None:
+    import fcntl
+
+    buffer = bytearray(_SERIAL_STRUCT_SIZE)
+    fcntl.ioctl(fd, TIOCGSERIAL, buffer, True)
+    flags = struct.unpack_from("=i", buffer, _SERIAL_FLAGS)[0]
+    flags = flags | ASYNC_LOW_LATENCY if enabled else flags & ~ASYNC_LOW_LATENCY
+    struct.pack_into("=i", buffer, _SERIAL_FLAGS, flags)
+    fcntl.ioctl(fd, TIOCSSERIAL, buffer)
+
+
+def set_rs485(fd: int, enabled: bool = True, rts_on_send: bool = True, delay_before: int = 0,
+              delay_after: int = 0, rx_during_tx: bool = False) -> None:
+    import fcntl
+
+    flags = 0
+    if enabled:
+        flags = SER_RS485_ENABLED | (SER_RS485_RTS_ON_SEND if rts_on_send else SER_RS485_RTS_AFTER_SEND)
+        if rx_during_tx:
+            flags |= SER_RS485_RX_DURING_TX
+    fcntl.ioctl(fd, TIOCSRS485, _RS485.pack(flags, delay_before, delay_after, 0))
+
+
+def read_settings(port: str, fd: int) -> dict:
+    """Low-latency, latency timer and RS-485 settings as the driver reports them (None = not supported)."""
+    settings = {"low_latency": None, "latency_timer_ms": None, "rs485": None}
+    try:
+        import fcntl
+    except ImportError:
+        return settings  # Windows
+    buffer = bytearray(_SERIAL_STRUCT_SIZE)
+    try:
+        fcntl.ioctl(fd, TIOCGSERIAL, buffer, True)
+        settings["low_latency"] = bool(struct.unpack_from("=i", buffer, _SERIAL_FLAGS)[0] & ASYNC_LOW_LATENCY)
+    except OSError:
+        pass  # Driver sem TIOCGSERIAL (ex.: pty)
+    try:
+        with open(_latency_timer_path(port)) as latency_timer:
+            settings["latency_timer_ms"] = int(latency_timer.read())
+    except (OSError, ValueError):
+        pass
+    buffer = bytearray(_RS485.size)
+    try:
+        fcntl.ioctl(fd, TIOCGRS485, buffer, True)
+        flags, before, after, _ = _RS485.unpack(buffer)
+        settings["rs485"] = {"enabled": bool(flags & SER_RS485_ENABLED),
+                             "rts_on_send": bool(flags & SER_RS485_RTS_ON_SEND),
+                             "rts_after_send": bool(flags & SER_RS485_RTS_AFTER_SEND),
+                             "rx_during_tx": bool(flags & SER_RS485_RX_DURING_TX),
+                             "delay_before_ms": before, "delay_after_ms": after}
+    except OSError:
+        pass
+    return settings
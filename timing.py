@@ -0,0 +1,155 @@
+import threading
+import time
+
+# 2^SUB_BITS sub-buckets por potência de 2: erro relativo máximo de ~3%
+SUB_BITS = 5
+_SUB_COUNT = 1 << SUB_BITS
+_LINEAR_LIMIT = _SUB_COUNT << 1
+
+STAGES = ("build", "open", "write", "wait", "read", "crc", "close", "parse", "ui")
+
+
+def _bucket_index(value: int) -> int:
+    if value < _LINEAR_LIMIT:
+        return max(value, 0)
+    shift = value.bit_length() - SUB_BITS - 1
+    return _LINEAR_LIMIT + (shift - 1) * _SUB_COUNT + ((value >> shift) - _SUB_COUNT)
+
+
+def _bucket_value(index: int) -> int:
+    """Upper bound of the values that fall into bucket `index`."""
+    if index < _LINEAR_LIMIT:
+        return index
+    shift = (index - _LINEAR_LIMIT) // _SUB_COUNT + 1
+    mantissa = (index - _LINEAR_LIMIT) % _SUB_COUNT + _SUB_COUNT
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """HDR-style histogram of nanosecond durations with log-linear buckets.
+
+    Recording is a dict increment, memory is bounded by the bucket count (a few
+    hundred up to minutes), and percentiles are within ~3% of the true value.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value_ns: int) -> None:
+        index = _bucket_index(value_ns)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value_ns
+        if self.min is None or value_ns < self.min:
+            self.min = value_ns
+        if value_ns > self.max:
+            self.max = value_ns
+
+    def percentile(self, percent: float) -> int:
+        if not self.count:
+            return 0
+        target = max(1, round(self.count * percent / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(_bucket_value(index), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+
+class StageTimer:
+    """Marks consecutive stages of one transaction with perf_counter_ns."""
+
+    __slots__ = ("stages", "_last")
+
+    def __init__(self):
+        self.stages = {}
+        self._last = time.perf_counter_ns()
+
+    def mark(self, stage: str) -> None:
+        """Close the stage that started at the previous mark."""
+        now = time.perf_counter_ns()
+        self.stages[stage] = self.stages.get(stage, 0) + now - self._last
+        self._last = now
+
+    def skip(self) -> None:
+        """Restart the clock without attributing the elapsed time to any stage."""
+        self._last = time.perf_counter_ns()
+
+
+class TimingRegistry:
+    """Latency histograms per (port, device, function, stage), plus a "total" stage."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, port, device_id, function, stage: str, value_ns: int) -> None:
+        self.record_stages(port, device_id, function, {stage: value_ns}, total=False)
+
+    def record_stages(self, port, device_id, function, stages: dict, total: bool = True) -> None:
+        """Record every stage of one transaction under a single lock acquisition."""
+        with self._lock:
+            for stage, value_ns in stages.items():
+                self._histogram((port, device_id, function, stage)).record(value_ns)
+            if total and stages:
+                self._histogram((port, device_id, function, "total")).record(sum(stages.values()))
+
+    def _histogram(self, key) -> LatencyHistogram:
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = LatencyHistogram()
+        return histogram
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+    def histogram(self, port=None, device_id=None, function=None, stage: str = "total") -> LatencyHistogram:
+        """Merged histogram for any combination of filters (None = all)."""
+        merged = LatencyHistogram()
+        with self._lock:
+            for (h_port, h_device, h_function, h_stage), histogram in self._histograms.items():
+                if h_stage == stage and port in (None, h_port) and device_id in (None, h_device) \
+                        and function in (None, h_function):
+                    merged.merge(histogram)
+        return merged
+
+    def snapshot(self):
+        """List of per-key statistics in milliseconds, ordered by port, device, function and stage."""
+        order = {stage: index for index, stage in enumerate(STAGES + ("total",))}
+        with self._lock:
+            items = [(key, histogram) for key, histogram in self._histograms.items() if histogram.count]
+            rows = [{
+                "port": port,
+                "device_id": device_id,
+                "function": function,
+                "stage": stage,
+                "count": histogram.count,
+                "mean_ms": histogram.mean / 1e6,
+                "p50_ms": histogram.percentile(50) / 1e6,
+                "p90_ms": histogram.percentile(90) / 1e6,
+                "p99_ms": histogram.percentile(99) / 1e6,
+                "max_ms": histogram.max / 1e6,
+            } for (port, device_id, function, stage), histogram in items]
+        rows.sort(key=lambda row: (str(row["port"]), row["device_id"] is None, row["device_id"] or 0,
+                                   row["function"] is None, row["function"] or 0,
+                                   order.get(row["stage"], len(order))))
+        return rows
@@ -0,0 +1,252 @@
+import glob
+import os
+import queue
+import struct
+import threading
+import time
+from dataclasses import dataclass
+
+from modbus_frames import check_crc, decode_frame
+
+MAGIC = b"MBCAP\x00\x01\x00"
+RECORD = struct.Struct("<QBBH")  # timestamp_ns, direction, port index, length
+
+TX = 0
+RX = 1
+BUS = 2  # Frame capturado passivamente (sniffer), direção desconhecida
+PORT_DEFINITION = 0xFF
+
+DIRECTION_NAMES = {TX: "TX", RX: "RX", BUS: "BUS"}
+
+
+@dataclass
+class CaptureRecord:
+    timestamp_ns: int
+    direction: int
+    port: str
+    frame: bytes
+
+
+class CaptureWriter:
+    """Record frames into rotating compact binary files from a background thread.
+
+    Each file starts with MAGIC, followed by records of RECORD header + payload. Port
+    names are written once per file as PORT_DEFINITION records and referenced by index.
+    At most `max_files` files of `max_bytes` are kept, so the capture is a bounded ring.
+    """
+
+    def __init__(self, directory: str = os.path.join("storage", "captures"),
+                 max_bytes: int = 16 * 1024 * 1024, max_files: int = 8, prefix: str = "capture"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.prefix = prefix
+        self.dropped = 0
+
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._ports = {}
+        self._sequence = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, direction: int, port: str, frame: bytes, timestamp_ns: int = None) -> None:
+        """Queue a frame; the caller never touches the disk."""
+        self._queue.put((timestamp_ns or time.time_ns(), direction, port, bytes(frame)))
+
+    def __call__(self, transaction) -> None:
+        """Listener for ModbusProtocol.add_transaction_listener."""
+        if transaction.request:
+            self.record(TX, transaction.port, transaction.request, transaction.tx_time_ns or None)
+        if transaction.response:
+            self.record(RX, transaction.port, transaction.response, transaction.rx_time_ns or None)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def files(self):
+        return sorted(glob.glob(os.path.join(self.directory, f"{self.prefix}_*.mbcap")))
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._sequence += 1
+        # Horário UTC: o anel é podado pela ordem dos nomes, que não pode voltar atrás no fim do horário de verão
+        name = f"{self.prefix}_{time.strftime('%Y%m%d_%H%M%S', time.gmtime())}_{self._sequence:04d}.mbcap"
+        self._file = open(os.path.join(self.directory, name), "wb", buffering=64 * 1024)
+        self._file.write(MAGIC)
+        self._ports = {}
+
+        for old in self.files()[:-self.max_files]:
+            os.remove(old)
+
+    def _write(self, timestamp_ns, direction, port, frame) -> None:
+        if self._file is None or self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+        index = self._ports.get(port)
+        if index is None:
+            if len(self._ports) >= PORT_DEFINITION:
+                self.dropped += 1
+                return
+            index = self._ports[port] = len(self._ports)
+            name = port.encode("utf-8")
+            self._file.write(RECORD.pack(0, PORT_DEFINITION, index, len(name)) + name)
+
+        self._file.write(RECORD.pack(timestamp_ns, direction, index, len(frame)) + frame)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            # Drena tudo o que já está na fila antes de dar flush
+            while item is not None:
+                self._write(*item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if self._file is not None:
+                self._file.flush()
+            if item is None:
+                if self._file is not None:
+                    self._file.close()
+                return
+
+
+def read_capture(path: str):
+    """Yield CaptureRecords from one capture file."""
+    with open(path, "rb") as capture:
+        data = capture.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"Arquivo de captura inválido: {path}")
+
+    ports = {}
+    offset = len(MAGIC)
+    header_size = RECORD.size
+    while offset + header_size <= len(data):
+        timestamp_ns, direction, index, length = RECORD.unpack_from(data, offset)
+        offset += header_size
+        payload = data[offset:offset + length]
+        offset += length
+        if len(payload) < length:
+            break  # Arquivo truncado (captura interrompida)
+        if direction == PORT_DEFINITION:
+            ports[index] = payload.decode("utf-8")
+            continue
+        yield CaptureRecord(timestamp_ns, direction, ports.get(index, str(index)), payload)
+
+
+def read_captures(paths):
+    for path in paths:
+        yield from read_capture(path)
+
+
+class DecoderSink:
+    """Replay sink that decodes every frame and keeps simple statistics.
+
+    BUS records (sniffer captures) carry no direction, so they are classified as
+    request or response by an RtuFrameSplitter per port, in capture order. Frames
+    that cannot be decoded at all (e.g. a partial response shorter than 4 bytes)
+    are counted and reported with decoded=None instead of aborting the replay.
+    """
+
+    def __init__(self, on_frame=None):
+        self.on_frame = on_frame
+        self.frames = 0
+        self.crc_errors = 0
+        self.exceptions = 0
+        self.undecodable = 0
+        self._splitters = {}  # porta -> RtuFrameSplitter (só classificação de frames BUS)
+
+    def _is_request(self, record: CaptureRecord) -> bool:
+        if record.direction != BUS:
+            return record.direction == TX
+        if not check_crc(record.frame):
+            return False
+        splitter = self._splitters.get(record.port)
+        if splitter is None:
+            from bus_sniffer import RtuFrameSplitter  # bus_sniffer importa este módulo
+
+            splitter = self._splitters[record.port] = RtuFrameSplitter()
+        return splitter.classify(record.frame)
+
+    def __call__(self, record: CaptureRecord) -> None:
+        self.frames += 1
+        try:
+            decoded = decode_frame(record.frame, is_request=self._is_request(record))
+        except ValueError:
+            decoded = None
+            self.undecodable += 1
+        else:
+            self.crc_errors += not decoded.crc_ok
+            self.exceptions += decoded.exception_code is not None
+        if self.on_frame:
+            self.on_frame(record, decoded)
+
+
+class SlaveSink:
+    """Replay sink that sends captured requests to a FakeSlave and compares its answers."""
+
+    def __init__(self, slave):
+        self.slave = slave
+        self.requests = 0
+        self.mismatches = []
+        self._expected = None
+
+    def __call__(self, record: CaptureRecord) -> None:
+        if record.direction == TX:
+            self.requests += 1
+            self._expected = (record, self.slave.handle(record.frame))
+        elif record.direction == RX and self._expected is not None:
+            request, answer = self._expected
+            if answer != record.frame:
+                self.mismatches.append((request, record, answer))
+            self._expected = None
+
+
+def replay(records, sink, speed: float = 1.0) -> dict:
+    """Feed records to `sink` at `speed` times real time (0 = as fast as possible)."""
+    started = time.perf_counter_ns()
+    first_ns = None
+    count = 0
+
+    for record in records:
+        if speed > 0:
+            if first_ns is None:
+                first_ns = record.timestamp_ns
+            target = started + (record.timestamp_ns - first_ns) / speed
+            delay = (target - time.perf_counter_ns()) / 1e9
+            if delay > 0:
+                time.sleep(delay)
+        sink(record)
+        count += 1
+
+    elapsed = (time.perf_counter_ns() - started) / 1e9
+    return {"frames": count, "seconds": elapsed, "frames_per_second": count / elapsed if elapsed else 0.0}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reproduz capturas de tráfego Modbus.")
+    parser.add_argument("files", nargs="+", help="Arquivos .mbcap")
+    parser.add_argument("--speed", type=float, default=0.0, help="1 = tempo real, 0 = o mais rápido possível")
+    parser.add_argument("--quiet", action="store_true", help="Não imprime os frames, apenas as estatísticas")
+    args = parser.parse_args()
+
+    def show(record, decoded):
+        summary = decoded.summary() if decoded is not None else f"NÃO DECODIFICÁVEL {record.frame.hex()}"
+        print(f"{record.timestamp_ns / 1e9:.6f} {record.port} "
+              f"{DIRECTION_NAMES.get(record.direction, '?')} {summary}")
+
+    sink = DecoderSink(None if args.quiet else show)
+    stats = replay(read_captures(args.files), sink, args.speed)
+    print(f"{stats['frames']} frames em {stats['seconds']:.3f} s ({stats['frames_per_second']:.0f} frames/s), "
+          f"{sink.crc_errors} CRC inválidos, {sink.exceptions} exceções, {sink.undecodable} não decodificáveis")
+
+
+if __name__ == "__main__":
+    main()
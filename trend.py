@@ -0,0 +1,48 @@
+class TrendSeries:
+    """Time series decimated incrementally to a fixed number of min/max buckets.
+
+    Samples are folded into the current bucket as they arrive; each completed bucket
+    yields its min and max once, so a chart only appends the new points instead of
+    re-decimating (and re-sending) the whole window.
+    """
+
+    def __init__(self, window: float = 60.0, width: int = 600):
+        self.window = window
+        self.buckets = max(width // 2, 1)
+        self.bucket_span = window / self.buckets
+        self._latest = None
+        self._pending = []
+        self._bucket = None
+        self._low = self._high = None
+
+    def append(self, timestamp: float, value: float) -> None:
+        point = (timestamp, value)
+        self._latest = point
+
+        bucket = int(timestamp // self.bucket_span)
+        if bucket != self._bucket:
+            self._close_bucket()
+            self._bucket, self._low, self._high = bucket, point, point
+        elif value < self._low[1]:
+            self._low = point
+        elif value > self._high[1]:
+            self._high = point
+
+    def _close_bucket(self) -> None:
+        if self._low is None:
+            return
+        if self._low is self._high:
+            self._pending.append(self._low)
+        else:
+            self._pending.extend(sorted((self._low, self._high)))
+        # Sem consumidor, mantém apenas o equivalente a uma janela
+        if len(self._pending) > 2 * self.buckets:
+            del self._pending[:-2 * self.buckets]
+
+    def take_new_points(self):
+        """Return decimated points of buckets completed since the last call."""
+        points, self._pending = self._pending, []
+        return points
+
+    def latest(self):
+        return self._latest
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import flet as ft
+
+from modbus_logging import get_logger
+from trend import TrendSeries
+
+
+class TrendChart:
+    """Flet line chart fed by a TrendSeries; only newly decimated points are sent to the client."""
+
+    def __init__(self, title: str, window: float = 60.0, width: int = 420, height: int = 180,
+                 color=ft.Colors.BLUE):
+        self.series = TrendSeries(window=window, width=width)
+        self.window = window
+        self._lock = threading.Lock()
+        self._origin = None
+
+        self.line = ft.LineChartData(data_points=[], color=color, stroke_width=2, curved=False)
+        self.chart = ft.LineChart(
+            data_series=[self.line],
+            width=width,
+            height=height,
+            min_x=0,
+            max_x=window,
+            left_axis=ft.ChartAxis(labels_size=40),
+            bottom_axis=ft.ChartAxis(labels_size=20, labels_interval=window / 4),
+            horizontal_grid_lines=ft.ChartGridLines(color=ft.Colors.GREY_200, width=1),
+            animate=0,
+        )
+        self.value_text = ft.Text("—", size=14, weight=ft.FontWeight.BOLD, color=color)
+        self.control = ft.Container(
+            content=ft.Column([
+                ft.Row([ft.Text(title, size=14, weight=ft.FontWeight.W_500), self.value_text],
+                       alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                self.chart,
+            ], spacing=5),
+            padding=10,
+            border=ft.border.all(1, ft.Colors.GREY_300),
+            border_radius=8,
+            bgcolor=ft.Colors.WHITE,
+        )
+
+    def add_sample(self, timestamp: float, value: float) -> None:
+        """Thread-safe; called from the poller threads."""
+        with self._lock:
+            if self._origin is None:
+                self._origin = timestamp
+            self.series.append(timestamp - self._origin, value)
+
+    def flush(self) -> bool:
+        """Apply pending points to the chart controls; returns True if anything changed."""
+        with self._lock:
+            new_points = self.series.take_new_points()
+            latest = self.series.latest()
+        if not new_points:
+            return False
+
+        points = self.line.data_points
+        points.extend(ft.LineChartDataPoint(x, y) for x, y in new_points)
+
+        # Remove do início os pontos que saíram da janela
+        end = new_points[-1][0]
+        start = end - self.window
+        drop = 0
+        while drop < len(points) and points[drop].x < start:
+            drop += 1
+        if drop:
+            del points[:drop]
+
+        self.chart.min_x = max(start, 0)
+        self.chart.max_x = max(end, self.window)
+        if latest is not None:
+            self.value_text.value = f"{latest[1]:g}"
+        return True
+
+
+class TrendUpdater:
+    """Push chart changes to the page at most `max_rate` times per second, batched in one update."""
+
+    def __init__(self, page: ft.Page, charts, max_rate: float = 2.0):
+        self.page = page
+        self.charts = list(charts)
+        self.period = 1.0 / max_rate
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="trend-updater", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.period):
+            started = time.monotonic()
+            changed = [chart.control for chart in self.charts if chart.flush()]
+            if changed:
+                try:
+                    self.page.update(*changed)
+                except Exception as e:
+                    get_logger().warning("Erro ao atualizar tendências: %s", e)
+            # Se o envio demorou mais que o período, espera um período inteiro antes do próximo
+            if time.monotonic() - started > self.period:
+                self._stop.wait(self.period)
@@ -0,0 +1,85 @@
+import threading
+import time
+
+# Escritas de um único valor: a resposta normal é o eco da requisição
+SINGLE_WRITE_FUNCTIONS = frozenset({0x05, 0x06})
+
+
+class _Register:
+    __slots__ = ("commanded", "confirmed", "confirmed_at", "echo")
+
+    def __init__(self):
+        self.commanded = None
+        self.confirmed = None
+        self.confirmed_at = 0.0
+        self.echo = None
+
+
+class WriteTracker:
+    """Last-commanded and last-confirmed values of single writes (FC05/FC06), per register.
+
+    A write is redundant when the same value was confirmed by the device (echo
+    response) less than `reassert_interval` seconds ago and no read has shown a
+    different value since; the caller can then skip the round trip. After the
+    interval the value is written again, so a device that was reset or changed
+    locally is brought back to the commanded state.
+
+    Read-back only contradicts a confirmation when the command register itself
+    is read; position registers say nothing about it. Writes an operator asks for
+    explicitly (UI buttons, manual requests) are therefore sent with force=True.
+    """
+
+    def __init__(self, reassert_interval: float = 60.0):
+        self.reassert_interval = reassert_interval
+        self.suppressed = 0
+        self._lock = threading.Lock()
+        self._registers = {}  # (port, device, function, address) -> _Register
+
+    def redundant_echo(self, port, device_id, function, address, value):
+        """Echo of the confirmed write when writing `value` again would change nothing, else None."""
+        if function not in SINGLE_WRITE_FUNCTIONS or not device_id:
+            return None
+        with self._lock:
+            register = self._registers.get((port, device_id, function, address))
+            if register is None or register.confirmed != value \
+                    or time.monotonic() - register.confirmed_at > self.reassert_interval:
+                return None
+            self.suppressed += 1
+            return register.echo
+
+    def commanded(self, port, device_id, function, address, value, request, response) -> None:
+        """Record a write that was sent; it only counts as confirmed if the device echoed it."""
+        if function not in SINGLE_WRITE_FUNCTIONS or not device_id:
+            return
+        with self._lock:
+            register = self._registers.setdefault((port, device_id, function, address), _Register())
+            register.commanded = value
+            if response and response == request:
+                register.confirmed = value
+                register.confirmed_at = time.monotonic()
+                register.echo = response
+            else:
+                register.confirmed = None  # Estado do dispositivo desconhecido
+
+    def observe_registers(self, port, device_id, address, values) -> None:
+        """Forget confirmations contradicted by holding registers read back from the device."""
+        with self._lock:
+            for offset, value in enumerate(values):
+                register = self._registers.get((port, device_id, 0x06, address + offset))
+                if register is not None and register.confirmed is not None and register.confirmed != value:
+                    register.confirmed = None
+
+    def forget(self, port=None, device_id=None) -> None:
+        """Drop the confirmations of one device, of a whole port (device_id None) or of everything."""
+        with self._lock:
+            for key in [key for key in self._registers
+                        if port is None or (key[0] == port and device_id in (None, key[1]))]:
+                del self._registers[key]
+
+    def last_commanded(self, port, device_id, function, address):
+        register = self._registers.get((port, device_id, function, address))
+        return register.commanded if register is not None else None
+
+    def last_confirmed(self, port, device_id, function, address):
+        register = self._registers.get((port, device_id, function, address))
+        return register.confirmed if register is not None else None